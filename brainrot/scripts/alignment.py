@@ -0,0 +1,320 @@
+# scripts/alignment.py
+#
+# Word timing for voiceovers, split into sentence-sized chunks. Aligning the whole
+# voiceover as one segment makes wav2vec2's cost grow with its length, and one
+# failure loses every timestamp. Here the text is split into sentences, chunk
+# boundaries are placed in the pauses the voice makes between them, and each chunk
+# is aligned (and if need be retried) on its own. Output is the same word list
+# WhisperX produces: [{"word", "start", "end", "score"}, ...] in seconds.
+
+import re
+import sys
+import json
+import time
+import wave
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from duration_predictor import text_features
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+AUDIO_DIR = ROOT_DIR / "data" / "audio"
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.01           # Energy envelope resolution
+SILENCE_DB = -32               # Quieter than this, relative to the loud speech level, is a pause
+MIN_GAP_SECONDS = 0.12         # Shorter dips are just consonants
+MIN_CHUNK_SYLLABLES = 12       # Shorter sentences are joined to the next one
+ALIGN_WORKERS = 2              # Chunks aligned at once (1 on GPU: it's already parallel)
+ALIGN_RETRIES = 1              # Extra tries per chunk, each with a wider window
+RETRY_PAD_SECONDS = 0.4
+WORD_OVERHEAD_SYLLABLES = 0.4  # Heuristic timing: every word costs a little beyond its syllables
+SNAP_SECONDS = 0.25            # Heuristic timing: word boundaries this close to a pause move onto it
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+
+
+# ─── Audio ─────────────────────────────────────────────────────────────────────
+def load_wav(path):
+    """16-bit PCM wav (what convert_to_wav writes) as mono float32 in [-1, 1]."""
+    with wave.open(str(path)) as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit PCM")
+        rate = wf.getframerate()
+        samples = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+        if wf.getnchannels() > 1:
+            samples = samples.reshape(-1, wf.getnchannels()).mean(axis=1)
+    return samples, rate
+
+def energy_envelope(samples, rate, frame_seconds=FRAME_SECONDS):
+    """RMS level per frame in dB relative to the loud (95th percentile) speech level."""
+    frame = max(1, int(rate * frame_seconds))
+    n = len(samples) // frame
+    if n == 0:
+        return np.zeros(0)
+    rms = np.sqrt(np.mean(samples[:n * frame].reshape(n, frame) ** 2, axis=1) + 1e-12)
+    return 20 * np.log10(rms / max(np.percentile(rms, 95), 1e-9))
+
+def find_silences(envelope_db, frame_seconds=FRAME_SECONDS, threshold_db=SILENCE_DB, min_gap=MIN_GAP_SECONDS):
+    """[(start, end), ...] in seconds for every run of quiet frames at least min_gap long."""
+    quiet = np.concatenate([[False], envelope_db < threshold_db, [False]])
+    edges = np.flatnonzero(quiet[1:] != quiet[:-1])
+    silences = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if (end - start) * frame_seconds >= min_gap:
+            silences.append((start * frame_seconds, end * frame_seconds))
+    return silences
+
+
+# ─── Chunk planning ────────────────────────────────────────────────────────────
+def split_sentences(text, min_syllables=MIN_CHUNK_SYLLABLES):
+    """Sentences of `text`, with very short ones joined to the next so every chunk has context."""
+    sentences = [s for s in _SENTENCE_END.split(text.strip()) if s.strip()]
+    chunks, pending = [], ""
+    for sentence in sentences:
+        pending = f"{pending} {sentence}".strip()
+        if text_features(pending)[0] >= min_syllables:
+            chunks.append(pending)
+            pending = ""
+    if pending:
+        if chunks:
+            chunks[-1] = f"{chunks[-1]} {pending}"
+        else:
+            chunks.append(pending)
+    return chunks
+
+def _voiced_time_map(silences, duration):
+    """Maps 'seconds of speech so far' to wall-clock time, skipping the pauses."""
+    edges_wall, edges_voiced, voiced, last = [0.0], [0.0], 0.0, 0.0
+    for start, end in silences:
+        voiced += max(0.0, start - last)
+        edges_wall += [start, end]
+        edges_voiced += [voiced, voiced]
+        last = end
+    voiced += max(0.0, duration - last)
+    edges_wall.append(duration)
+    edges_voiced.append(voiced)
+    return np.array(edges_voiced), np.array(edges_wall)
+
+def plan_chunks(text, silences, duration):
+    """
+    [{"text", "start", "end"}, ...] covering the audio. Each sentence's expected end
+    comes from its share of the syllables spread over the speaking time; boundaries
+    are then the pauses that best match those estimates, in order (a small dynamic
+    program, preferring longer pauses when two are about equally close).
+    """
+    sentences = split_sentences(text)
+    # Pauses at the very start and end aren't between sentences
+    inner = [(s, e) for s, e in silences if s > 0.05 and e < duration - 0.05]
+
+    # Not enough pauses: merge the shortest neighbouring pair until there are
+    while len(sentences) - 1 > len(inner):
+        sizes = [text_features(a)[0] + text_features(b)[0] for a, b in zip(sentences, sentences[1:])]
+        i = int(np.argmin(sizes))
+        sentences[i:i + 2] = [f"{sentences[i]} {sentences[i + 1]}"]
+    if len(sentences) == 1:
+        return [{"text": sentences[0], "start": 0.0, "end": duration}]
+
+    voiced_axis, wall_axis = _voiced_time_map(silences, duration)
+    syllables = np.array([text_features(s)[0] for s in sentences], dtype=float)
+    shares = np.cumsum(syllables)[:-1] / syllables.sum()
+    expected = np.interp(shares * voiced_axis[-1], voiced_axis, wall_axis)
+
+    mids = np.array([(s + e) / 2 for s, e in inner])
+    lengths = np.array([e - s for s, e in inner])
+    cost = np.abs(mids[None, :] - expected[:, None]) - 0.5 * np.minimum(lengths, 0.6)[None, :]
+
+    # best[i, g]: cheapest placement of boundaries 0..i with boundary i at pause g
+    k, g = cost.shape
+    best = np.full((k, g), np.inf)
+    choice = np.zeros((k, g), dtype=int)
+    best[0] = cost[0]
+    for i in range(1, k):
+        prefix_min = np.minimum.accumulate(best[i - 1])
+        prefix_arg = np.zeros(g, dtype=int)
+        for j in range(1, g):
+            prefix_arg[j] = j if best[i - 1][j] < prefix_min[j - 1] else prefix_arg[j - 1]
+        best[i, 1:] = cost[i, 1:] + prefix_min[:-1]
+        choice[i, 1:] = prefix_arg[:-1]
+    picks = [int(np.argmin(best[-1]))]
+    for i in range(k - 1, 0, -1):
+        picks.append(int(choice[i, picks[-1]]))
+    cuts = [float(mids[p]) for p in reversed(picks)]
+
+    bounds = [0.0, *cuts, duration]
+    return [{"text": sentence, "start": bounds[i], "end": bounds[i + 1]} for i, sentence in enumerate(sentences)]
+
+
+# ─── Heuristic timing ──────────────────────────────────────────────────────────
+def _to_wall(values, voiced_axis, wall_axis, side):
+    """
+    Inverse of the voiced time map. Where a pause sits exactly at `values`, side="left"
+    gives the moment the pause starts (a word's end) and side="right" the moment it
+    ends (the next word's start).
+    """
+    i = np.clip(np.searchsorted(voiced_axis, values, side=side), 1, len(voiced_axis) - 1)
+    v0, v1 = voiced_axis[i - 1], voiced_axis[i]
+    w0, w1 = wall_axis[i - 1], wall_axis[i]
+    moving = v1 > v0
+    return np.where(moving, w0 + (values - v0) * (w1 - w0) / np.where(moving, v1 - v0, 1.0), w0)
+
+def distribute_words(text, start, end, silences, snap=SNAP_SECONDS):
+    """
+    Word timings for `text` spoken between start and end: the speaking time (the
+    window minus its pauses) is shared out in proportion to syllables, and word
+    boundaries that land close to a pause are moved onto it.
+    """
+    words = text.split()
+    if not words:
+        return []
+    inside = [(max(s, start) - start, min(e, end) - start) for s, e in silences if e > start and s < end]
+    voiced_axis, wall_axis = _voiced_time_map(inside, end - start)
+
+    weights = np.array([text_features(w)[0] + WORD_OVERHEAD_SYLLABLES for w in words], dtype=float)
+    bounds = np.concatenate([[0.0], np.cumsum(weights)]) / weights.sum() * voiced_axis[-1]
+
+    pauses = voiced_axis[1:-1:2]
+    if len(pauses):
+        inner = bounds[1:-1]
+        nearest = pauses[np.argmin(np.abs(inner[:, None] - pauses[None, :]), axis=1)]
+        bounds[1:-1] = np.where(np.abs(inner - nearest) <= snap, nearest, inner)
+        bounds = np.maximum.accumulate(bounds)
+
+    starts = _to_wall(bounds[:-1], voiced_axis, wall_axis, "right") + start
+    ends = _to_wall(bounds[1:], voiced_axis, wall_axis, "left") + start
+    return [{"word": w, "start": round(float(s), 3), "end": round(float(max(s, e)), 3)}
+            for w, s, e in zip(words, starts, ends)]
+
+def heuristic_alignment(wav_path, text):
+    """
+    Torch-free word timing from the audio's pauses and the text's syllables: sentences
+    are placed like chunked_alignment places them, then words are spread over each
+    sentence's speaking time. Takes milliseconds; good enough for drafts, and the
+    fallback when WhisperX isn't available.
+    """
+    samples, rate, duration, silences = analyze(wav_path)
+    words = []
+    for chunk in plan_chunks(text, silences, duration):
+        words.extend(distribute_words(chunk["text"], chunk["start"], chunk["end"], silences))
+    return words
+
+
+# ─── Alignment ─────────────────────────────────────────────────────────────────
+def analyze(wav_path):
+    """(samples, rate, duration, pauses) for a 16 kHz voiceover wav."""
+    samples, rate = load_wav(wav_path)
+    return samples, rate, len(samples) / rate, find_silences(energy_envelope(samples, rate))
+
+def _untimed(text):
+    return [{"word": w} for w in text.split()]
+
+def align_chunks(chunks, samples, align_segment, duration, workers=ALIGN_WORKERS, retries=ALIGN_RETRIES,
+                 fallback=None):
+    """
+    Aligns each chunk with align_segment(segment, samples) -> word list (absolute
+    times) and stitches the results in order. A chunk that fails is retried with
+    its window widened; if it still fails its words come from fallback(chunk), or
+    are kept without timings for fill_missing_timestamps to interpolate, so one bad
+    sentence doesn't cost the rest.
+    """
+    def run(chunk):
+        for attempt in range(retries + 1):
+            pad = attempt * RETRY_PAD_SECONDS
+            segment = {"text": chunk["text"],
+                       "start": max(0.0, chunk["start"] - pad),
+                       "end": min(duration, chunk["end"] + pad)}
+            try:
+                words = align_segment(segment, samples)
+                if any("start" in w for w in words):
+                    return words, attempt, None
+                error = "no words aligned"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+        return (fallback or (lambda c: _untimed(c["text"])))(chunk), attempt, error
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(run, chunks))
+
+    words, failed, retried = [], 0, 0
+    for chunk, (chunk_words, attempts, error) in zip(chunks, results):
+        if error:
+            failed += 1
+            print(f"[WARN] Chunk {chunk['start']:.1f}-{chunk['end']:.1f}s failed to align ({error})")
+        elif attempts:
+            retried += 1
+        words.extend(chunk_words)
+    print(f"[INFO] Aligned {len(chunks) - failed}/{len(chunks)} chunk(s)"
+          + (f", {retried} after a retry" if retried else ""))
+    return words
+
+def chunked_alignment(wav_path, text, align_segment, workers=ALIGN_WORKERS):
+    """
+    Plans sentence chunks from the wav's pauses and aligns them with align_segment.
+    Chunks that can't be aligned get heuristic timings.
+    """
+    samples, rate, duration, silences = analyze(wav_path)
+    chunks = plan_chunks(text, silences, duration)
+    fallback = lambda chunk: distribute_words(chunk["text"], chunk["start"], chunk["end"], silences)
+    return align_chunks(chunks, samples, align_segment, duration, workers=workers, fallback=fallback)
+
+
+# ─── Accuracy check ────────────────────────────────────────────────────────────
+def _wav_for(mp3_path, tmp_dir):
+    """The 16 kHz wav convert_to_wav left next to the mp3, or a fresh one in tmp_dir."""
+    wav_path = mp3_path.with_suffix(".wav")
+    if wav_path.exists():
+        return wav_path
+    wav_path = Path(tmp_dir) / wav_path.name
+    subprocess.run(["ffmpeg", "-y", "-i", str(mp3_path), "-ar", str(SAMPLE_RATE), "-ac", "1", str(wav_path)],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return wav_path
+
+def compare_with_whisperx(audio_dir=None, limit=None):
+    """
+    Re-times every voiceover in audio_dir whose <id>.json came from WhisperX with
+    heuristic_alignment, and reports how far the word starts land from WhisperX's.
+    """
+    errors, seconds, items = [], 0.0, 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for json_path in sorted(Path(audio_dir or AUDIO_DIR).glob("*.json"))[:limit]:
+            mp3_path = json_path.with_suffix(".mp3")
+            with open(json_path) as f:
+                reference = json.load(f)
+            # Heuristic output has no scores: don't grade it against itself
+            if not mp3_path.exists() or not any("score" in w for w in reference):
+                continue
+            text = " ".join(w["word"] for w in reference)
+            wav_path = _wav_for(mp3_path, tmp_dir)
+
+            started = time.perf_counter()
+            estimate = heuristic_alignment(wav_path, text)
+            seconds += time.perf_counter() - started
+            items += 1
+            for ref, est in zip(reference, estimate):
+                if "start" in ref:
+                    errors.append(abs(ref["start"] - est["start"]))
+
+    if not errors:
+        return {"items": 0}
+    errors = np.array(errors)
+    return {
+        "items": items,
+        "words": len(errors),
+        "mean_start_error_ms": round(float(errors.mean()) * 1000, 1),
+        "median_start_error_ms": round(float(np.median(errors)) * 1000, 1),
+        "p90_start_error_ms": round(float(np.percentile(errors, 90)) * 1000, 1),
+        "within_100ms": round(float((errors <= 0.1).mean()), 3),
+        "within_250ms": round(float((errors <= 0.25).mean()), 3),
+        "ms_per_item": round(seconds / items * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    # python3 alignment.py [audio_dir] [limit]
+    audio_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(json.dumps(compare_with_whisperx(audio_dir, limit), indent=2))
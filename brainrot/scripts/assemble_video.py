@@ -5,27 +5,101 @@ from pathlib import Path
 import pyphen
 from PIL import Image, ImageDraw, ImageFont
 import random
-
-from moviepy import AudioFileClip, CompositeVideoClip, ImageClip, VideoFileClip, vfx, TextClip, ColorClip, clips_array
+import shutil
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+from moviepy import AudioFileClip, ImageClip, VideoFileClip, vfx, TextClip, ColorClip, clips_array
+from moviepy.config import FFMPEG_BINARY
 from moviepy.video.fx import Crop, MultiplySpeed
 
+from caption_compositor import CaptionCompositor
+from render_profiler import RenderProfiler
+from resource_monitor import MEMORY_BUDGET_MB, MemoryBudgetExceeded, ResourceMonitor, ensure_memory_budget, release_memory
+
 # ─── Paths ─────────────────────────────────────────────────────────────────────
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 AUDIO_DIR = os.path.join(ROOT_DIR, "data", "audio")
 SCRIPT_DIR = os.path.join(ROOT_DIR, "data", "processed", "scripts")
 VIDEO_DIR = os.path.join(ROOT_DIR, "data", "videos")
 FINAL_DIR = os.path.join(ROOT_DIR, "data", "final")
+DRAFT_DIR = os.path.join(ROOT_DIR, "data", "drafts")
 SYSTEM_ARIAL = Path("/Users/Dylan/Library/Fonts/LuckiestGuy-Regular.ttf")
+TITLE_FONT_BOLD = "/System/Library/Fonts/SF-Pro-Text-Bold.otf"
+TITLE_FONT_REGULAR = "/System/Library/Fonts/SF-Pro-Text-Regular.otf"
 
 os.makedirs(FINAL_DIR, exist_ok=True)
 dic = pyphen.Pyphen(lang='en')
 
+# ─── Render Profiles ───────────────────────────────────────────────────────────
+# "draft" is for checking caption timing: half resolution, low fps, ultrafast x264.
+# "scale" is applied when the timeline is built (see build_timeline), not per frame.
+# "final" is what gets uploaded: CRF-capped quality, a maxrate so files stay small,
+# and faststart so YouTube can start processing before the upload completes.
+RENDER_PROFILES = {
+    "draft": {
+        "scale": 0.5,
+        "fps": 15,
+        "preset": "ultrafast",
+        "audio_bitrate": "64k",
+        "ffmpeg_params": ["-crf", "32"],
+    },
+    "standard": {
+        "scale": 1.0,
+        "fps": 30,
+        "preset": "medium",
+        "audio_bitrate": None,
+        "ffmpeg_params": [],
+    },
+    "final": {
+        "scale": 1.0,
+        "fps": 30,
+        "preset": "slow",
+        "audio_bitrate": "128k",
+        "ffmpeg_params": ["-crf", "23", "-maxrate", "6M", "-bufsize", "12M", "-movflags", "+faststart"],
+    },
+}
+
+
+# Each post is uploaded three ways; the folder name under data/final is the variant
+VARIANTS = {
+    "1": {"use_split_videos": True, "hide_title_card": False},
+    "2": {"use_split_videos": True, "hide_title_card": True},
+    "3": {"use_split_videos": False, "hide_title_card": False},
+}
+
 
 # ─── Utilities ─────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def load_font(font_path, size):
+    # Every caption group asks for the same one or two fonts
+    return ImageFont.truetype(str(font_path), size)
+
+@lru_cache(maxsize=8)
+def load_overlay(bg_image_path, target_width):
+    """Title card background scaled to target_width. Callers draw on it, so copy() it first."""
+    base_img = Image.open(bg_image_path).convert("RGBA")
+    aspect_ratio = base_img.height / base_img.width
+    return base_img.resize((target_width, int(target_width * aspect_ratio)))
+
+def scaled(pixels, scale, even=False):
+    """A full-size (1080x1920) pixel measure at `scale`; frame sizes are kept even for x264."""
+    if even:
+        return max(2, round(pixels * scale / 2) * 2)
+    return max(1, round(pixels * scale))
+
+def get_profile(profile):
+    if profile not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile '{profile}' (expected one of {', '.join(RENDER_PROFILES)})")
+    return RENDER_PROFILES[profile]
+
 def count_syllables(word):
     return dic.inserted(word).count('-') + 1
 
-def group_words_by_syllables(words_data, target_syllables=4):
+def group_words_by_syllables(words_data, target_syllables=4, rng=random):
     groups = []
     current_group = []
     current_syllables = 0
@@ -34,8 +108,8 @@ def group_words_by_syllables(words_data, target_syllables=4):
     target_words = [w for w in words_data if w["word"].isalpha() and 12.0 > w["start"] > 8.0 and len(w["word"]) > 3]
 
     if target_words:
-        replacement = random.choice(replacement_words)
-        target = random.choice(target_words)
+        replacement = rng.choice(replacement_words)
+        target = rng.choice(target_words)
         print(f"[DEBUG] Replacing '{target['word']}' with '{replacement}' at {target['start']}s")
         target["word"] = replacement
 
@@ -69,7 +143,7 @@ def make_highlight_clips(group, font_path, video_size):
     clips = []
     words = [w["word"] for w in group]
     font_size = 65
-    font = ImageFont.truetype(font_path, font_size)
+    font = load_font(font_path, font_size)
     w_img, _ = video_size
 
     total_text_width = sum(ImageDraw.Draw(Image.new("RGBA", (1, 1))).textlength(word + " ", font=font) for word in words) #word.upper() + " "
@@ -103,17 +177,15 @@ def make_highlight_clips(group, font_path, video_size):
 
 def create_imessage_style_title_clip(subreddit, title_text, words_data, video_size,
                                      font_path="/System/Library/Fonts/HelveticaNeue.ttc",
-                                     bg_image_path="iMessageBubble.png"):
+                                     bg_image_path="iMessageBubble.png", scale=1.0):
     # Load and resize background image to 80% width
-    base_img = Image.open(bg_image_path).convert("RGBA")
     target_width = int(video_size[0] * 0.8)
-    aspect_ratio = base_img.height / base_img.width
-    resized_height = int(target_width * aspect_ratio)
-    base_img = base_img.resize((target_width, resized_height))
+    base_img = load_overlay(bg_image_path, target_width).copy()
+    resized_height = base_img.height
 
     draw = ImageDraw.Draw(base_img)
-    title_font = ImageFont.truetype("/System/Library/Fonts/SF-Pro-Text-Bold.otf", 48)
-    meta_font = ImageFont.truetype("/System/Library/Fonts/SF-Pro-Text-Regular.otf", 32)
+    title_font = load_font(TITLE_FONT_BOLD, scaled(48, scale))
+    meta_font = load_font(TITLE_FONT_REGULAR, scaled(32, scale))
 
     # Wrap the title text within 90% of container width
     max_text_width = int(target_width * 0.9)
@@ -130,19 +202,19 @@ def create_imessage_style_title_clip(subreddit, title_text, words_data, video_si
         lines.append(current_line)
 
     # Title lines: left-align, slightly below the top bar
-    left_padding = 50
-    top_padding = 135
-    line_spacing = 50
+    left_padding = scaled(50, scale)
+    top_padding = scaled(135, scale)
+    line_spacing = scaled(50, scale)
     for line in lines:
         draw.text((left_padding, top_padding), line, font=title_font, fill="black")
         top_padding += line_spacing
 
     # Top left subreddit label
-    draw.text((left_padding, 60), f"{subreddit}", font=meta_font, fill="black")
+    draw.text((left_padding, scaled(60, scale)), f"{subreddit}", font=meta_font, fill="black")
 
     # Footer bar
     footer = f"From the {subreddit} community on Reddit"
-    draw.text((left_padding, resized_height - 80), footer, font=meta_font, fill="gray")
+    draw.text((left_padding, resized_height - scaled(80, scale)), footer, font=meta_font, fill="gray")
 
     # Estimate title display time
     last_title_word = title_text.strip().split()[-1].lower().rstrip(".!?")
@@ -168,8 +240,11 @@ def create_imessage_style_title_clip(subreddit, title_text, words_data, video_si
 
     return clip, title_duration
 
-def make_group_caption_clip_with_highlight(group, font_path, video_size, fontsize=120, start=0, end=1):
-    font = ImageFont.truetype(font_path, fontsize)
+def make_group_caption_clip_with_highlight(group, font_path, video_size, fontsize=120, start=0, end=1, scale=1.0):
+    # fontsize and the other pixel measures are for a full-size frame
+    fontsize = scaled(fontsize, scale)
+    h_caption = scaled(400, scale)
+    font = load_font(font_path, fontsize)
     w_img, h_img = video_size
     max_width = int(w_img * 0.7)
 
@@ -236,35 +311,37 @@ def make_group_caption_clip_with_highlight(group, font_path, video_size, fontsiz
         if current_line:
             lines.append(current_line)
 
-        img = Image.new("RGBA", (w_img, 400), (0, 0, 0, 0))
+        img = Image.new("RGBA", (w_img, h_caption), (0, 0, 0, 0))
         draw = ImageDraw.Draw(img)
         line_positions = {}
-        y_start = 50
+        y_start = scaled(50, scale)
 
         for line_num, line_words in enumerate(lines):
             total_line_width = sum(ImageDraw.Draw(Image.new("RGBA", (1, 1))).textlength(word + " ", font=font) for word in line_words)
             x = (w_img - total_line_width) // 2.2
-            y = y_start + line_num * (fontsize + 20)
+            y = y_start + line_num * (fontsize + scaled(20, scale))
 
             for word_base in line_words:
                 word = word_base
-                for ox, oy in [(2, 2), (1, 1)]:
+                for ox, oy in [(scaled(2, scale),) * 2, (scaled(1, scale),) * 2]:
                     draw.text((x + ox, y + oy), word, font=font, fill="black")
                 draw.text((x, y), word, font=font, fill="white")
                 line_positions[word] = (x, y)
                 x += draw.textlength(word + " ", font=font)
 
         base_clip = ImageClip(np.array(img)).with_position(("center", "center")).with_start(sub[0]["start"]).with_duration(sub[-1]["end"] - sub[0]["start"])
+        base_clip.profile_kind, base_clip.profile_label = "caption", " ".join(words)
         highlights = []
         for word_info in sub:
             word = word_info["word"]
             if word not in line_positions:
                 continue
             x, y = line_positions[word]
-            w_overlay = Image.new("RGBA", (w_img, 400), (0, 0, 0, 0))
+            w_overlay = Image.new("RGBA", (w_img, h_caption), (0, 0, 0, 0))
             d = ImageDraw.Draw(w_overlay)
             d.text((x, y), word, font=font, fill="yellow")
             highlight = ImageClip(np.array(w_overlay)).with_position(("center", "center")).with_start(word_info["start"]).with_duration(word_info["end"] - word_info["start"])
+            highlight.profile_kind, highlight.profile_label = "highlight", word
             highlights.append(highlight)
 
         clips.extend([base_clip] + highlights)
@@ -284,13 +361,181 @@ def center_crop_to_shorts(clip, target_width=886, target_height=1920):
     return crop_fx.apply(clip).resized((target_width, target_height))
 
 # ─── Main Logic ────────────────────────────────────────────────────────────────
-def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_videos=False, hide_title_card=False):
-    audio_path = os.path.join(AUDIO_DIR, audio_fn)
-    ts_path = audio_path.replace(".mp3", ".json")
-    audio = AudioFileClip(audio_path)
-    audio_duration = audio.duration
-
-    # Select a random video and starting point
+@contextmanager
+def publishing(out):
+    """
+    Yields the path to encode `out` to: a dot-prefixed .part file next to it that
+    the uploader and the daemon don't pick up. It is moved onto `out` only once
+    the encode finished, and removed if anything (including an interrupt) stops
+    it first.
+    """
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    part = os.path.join(os.path.dirname(out), f".{os.path.basename(out)}.part")
+    try:
+        yield part
+        os.replace(part, out)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+
+def split_movflags(ffmpeg_params):
+    """(params without -movflags, the -movflags pair or [])."""
+    params, movflags = list(ffmpeg_params), []
+    if "-movflags" in params:
+        i = params.index("-movflags")
+        movflags = params[i:i + 2]
+        del params[i:i + 2]
+    return params, movflags
+
+def write_with_profile(clip, out, profile="final", segment=False):
+    """
+    Encodes `clip` to `out` using one of RENDER_PROFILES and reports encode speed
+    (seconds of video per second of wall time) and output size. `clip` must
+    already be at the profile's scale (build_timeline(scale=...)).
+
+    A segment is video only, with closed GOPs and no faststart, ready to be joined
+    to its neighbours by stream copy (see render_segmented).
+    """
+    settings = get_profile(profile)
+    ffmpeg_params = settings["ffmpeg_params"]
+    if segment:
+        ffmpeg_params = split_movflags(ffmpeg_params)[0] + ["-flags", "+cgop"]
+
+    started = time.perf_counter()
+    with publishing(out) as part:
+        clip.write_videofile(
+            part,
+            codec="libx264",
+            audio=not segment,
+            audio_codec="aac",
+            audio_bitrate=settings["audio_bitrate"],
+            fps=settings["fps"],
+            preset=settings["preset"],
+            # The .part name says nothing about the container
+            ffmpeg_params=[*ffmpeg_params, "-f", "mp4"],
+        )
+    elapsed = time.perf_counter() - started
+
+    out_bytes = os.path.getsize(out)
+    speed = clip.duration / elapsed if elapsed > 0 else 0.0
+    print(f"[RENDER] {os.path.basename(out)} profile={profile} "
+          f"{speed:.2f}x realtime ({elapsed:.1f}s for {clip.duration:.1f}s), {out_bytes / 1_000_000:.2f} MB")
+    return {"profile": profile, "seconds": elapsed, "speed": speed, "bytes": out_bytes}
+
+def plan_segments(words_data, duration, segments, fps, seed=None):
+    """
+    [(start frame, end frame), ...] splitting the video into up to `segments`
+    pieces of about equal length. Cuts go where a caption group starts, when one
+    is near, so no caption is split; times are whole frames so the pieces add up
+    to exactly the frames of a single render. The last end is None (the end of
+    the video). `seed` must be the one the segments render with: the word swap
+    changes syllable counts, and so where the groups split.
+    """
+    total = int(duration * fps)
+    # Grouping swaps a word in place; plan on a copy
+    groups = group_words_by_syllables([dict(w) for w in words_data], rng=random.Random(seed))
+    starts = sorted({round(g[0]["start"] * fps) for g in groups})
+    cuts = []
+    for k in range(1, segments):
+        target = round(total * k / segments)
+        candidates = [f for f in starts if (cuts[-1] if cuts else 0) < f < total]
+        cut = min(candidates, key=lambda f: abs(f - target)) if candidates else target
+        # Fall back to the even split when the nearest group is far off
+        if abs(cut - target) > total / segments / 2:
+            cut = target
+        if (cuts[-1] if cuts else 0) < cut < total:
+            cuts.append(cut)
+    bounds = [0, *cuts, None]
+    return list(zip(bounds, bounds[1:]))
+
+def _init_segment_worker(settings):
+    # Spawned processes re-import this module: carry over paths and fonts the
+    # caller may have changed (benchmark_pipeline points them at a workspace)
+    globals().update(settings)
+
+def _render_segment(job):
+    """Builds the same timeline as every other segment and encodes only its frames."""
+    settings = get_profile(job["profile"])
+    fps = settings["fps"]
+    with ResourceMonitor(budget_mb=job["budget_mb"]) as monitor, ExitStack() as stack:
+        final = build_timeline(stack, job["audio_path"], job["title"], job["subreddit"], job["backgrounds"],
+                               job["use_split_videos"], job["hide_title_card"], job["seed"], settings["scale"])
+        # Half a frame past the cut, so float rounding can't drop its last frame
+        end = (job["end"] + 0.5) / fps if job["end"] is not None else None
+        piece = final.subclipped(job["start"] / fps, end).without_audio()
+        monitor.guard(piece)
+        stats = write_with_profile(piece, job["out"], job["profile"], segment=True)
+    stats.update(monitor.report())
+    return stats
+
+def concat_segments(paths, audio_path, out, profile="final"):
+    """Joins encoded segments by stream copy (ffmpeg's concat demuxer) and muxes the voiceover once."""
+    settings = RENDER_PROFILES[profile]
+    list_path = os.path.join(os.path.dirname(paths[0]), "segments.txt")
+    with open(list_path, "w") as f:
+        for path in paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    command = [
+        FFMPEG_BINARY, "-y", "-v", "error",
+        "-f", "concat", "-safe", "0", "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        "-c:v", "copy", "-c:a", "aac",
+        *(["-b:a", settings["audio_bitrate"]] if settings["audio_bitrate"] else []),
+        *split_movflags(settings["ffmpeg_params"])[1],
+        "-f", "mp4",
+    ]
+    with publishing(out) as part:
+        subprocess.run([*command, part], check=True)
+
+def render_segmented(audio_path, title, subreddit, out, backgrounds, use_split_videos, hide_title_card, seed,
+                     segments, profile="final"):
+    """
+    Renders one video as `segments` pieces in parallel processes, each building the
+    same timeline from the same seed and encoding its own frames with identical
+    settings, then joins them without re-encoding. The memory budget is shared
+    out between the pieces.
+    """
+    fps = get_profile(profile)["fps"]
+    with AudioFileClip(audio_path) as audio:
+        duration = audio.duration
+    with open(audio_path.replace(".mp3", ".json")) as jf:
+        words_data = fill_missing_timestamps(json.load(jf))
+    bounds = plan_segments(words_data, duration, segments, fps, seed)
+
+    work_dir = os.path.join(os.path.dirname(out) or ".", f".{os.path.basename(out)}.segments")
+    os.makedirs(work_dir, exist_ok=True)
+    jobs = [{
+        "audio_path": audio_path, "title": title, "subreddit": subreddit, "backgrounds": backgrounds,
+        "use_split_videos": use_split_videos, "hide_title_card": hide_title_card, "seed": seed,
+        "profile": profile, "start": start, "end": end, "budget_mb": MEMORY_BUDGET_MB / len(bounds),
+        "out": os.path.join(work_dir, f"segment_{i:03d}.mp4"),
+    } for i, (start, end) in enumerate(bounds)]
+    settings = {name: globals()[name] for name in ("ROOT_DIR", "SYSTEM_ARIAL", "TITLE_FONT_BOLD", "TITLE_FONT_REGULAR")}
+
+    started = time.perf_counter()
+    try:
+        with ResourceMonitor(budget_mb=float("inf")) as monitor:
+            with ProcessPoolExecutor(max_workers=len(jobs), initializer=_init_segment_worker,
+                                     initargs=(settings,)) as pool:
+                pieces = list(pool.map(_render_segment, jobs))
+            concat_segments([job["out"] for job in jobs], audio_path, out, profile)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    out_bytes = os.path.getsize(out)
+    speed = duration / elapsed if elapsed > 0 else 0.0
+    print(f"[RENDER] {os.path.basename(out)} profile={profile} segments={len(jobs)} "
+          f"{speed:.2f}x realtime ({elapsed:.1f}s for {duration:.1f}s), {out_bytes / 1_000_000:.2f} MB")
+    stats = {"profile": profile, "seconds": elapsed, "speed": speed, "bytes": out_bytes, "segments": len(jobs),
+             "segment_seconds": [round(p["seconds"], 2) for p in pieces]}
+    # Peak memory of this process plus every segment process and its ffmpeg
+    stats.update(monitor.report())
+    return stats
+
+def pick_backgrounds(use_split_videos):
+    """Random background footage: [top, bottom] for split videos, otherwise [single]."""
     if use_split_videos:
         top_dir = os.path.join(VIDEO_DIR, "top")
         bottom_dir = os.path.join(VIDEO_DIR, "bottom")
@@ -302,9 +547,36 @@ def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_vid
         print(f"Randomly chose video at {top_path}")
         bottom_path = os.path.join(bottom_dir, random.choice(bottom_videos))
         print(f"Randomly chose video at {bottom_path}")
+        return [top_path, bottom_path]
+
+    video_files = sorted(f for f in os.listdir(VIDEO_DIR) if f.endswith(".mp4"))
+    return [os.path.join(VIDEO_DIR, random.choice(video_files))]
+
+def build_timeline(stack, audio_path, title, subreddit, backgrounds, use_split_videos=False, hide_title_card=False,
+                   seed=None, scale=1.0):
+    """
+    The full composited video for one voiceover, with every reader opened on
+    `stack`. All random choices (background start times, the word swap) come from
+    `seed`, so processes given the same arguments build identical timelines.
+
+    Everything is built at `scale` (a render profile's "scale") of 1080x1920:
+    backgrounds are decoded and cropped to that size and the title card and
+    captions drawn at it, so a draft never renders full-size frames.
+    """
+    rng = random.Random(seed)
+    frame_width, frame_height = scaled(1080, scale, even=True), scaled(1920, scale, even=True)
+    ts_path = audio_path.replace(".mp3", ".json")
+    audio = stack.enter_context(AudioFileClip(audio_path))
+    audio_duration = audio.duration
 
-        top_raw = VideoFileClip(top_path).resized(width=1080)
-        bottom_raw = VideoFileClip(bottom_path).resized(width=1080)
+    # Backgrounds are opened without their audio track, which the voiceover replaces
+    if use_split_videos:
+        top_path, bottom_path = backgrounds
+
+        # ffmpeg scales to the frame width while decoding, instead of a resize per frame
+        top_raw = stack.enter_context(VideoFileClip(top_path, audio=False, target_resolution=(frame_width, None)))
+        bottom_raw = stack.enter_context(VideoFileClip(bottom_path, audio=False,
+                                                       target_resolution=(frame_width, None)))
 
         speed = 1.18
         required_duration = audio_duration * speed
@@ -312,8 +584,8 @@ def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_vid
         max_start_top = max(0, top_raw.duration - required_duration - 1)
         max_start_bottom = max(0, bottom_raw.duration - required_duration - 1)
 
-        start_top = random.uniform(0, max_start_top) if max_start_top > 0 else 0
-        start_bottom = random.uniform(0, max_start_bottom) if max_start_bottom > 0 else 0
+        start_top = rng.uniform(0, max_start_top) if max_start_top > 0 else 0
+        start_bottom = rng.uniform(0, max_start_bottom) if max_start_bottom > 0 else 0
 
         top_clip = MultiplySpeed(speed).apply(
             top_raw.subclipped(start_top, start_top + required_duration)
@@ -323,23 +595,24 @@ def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_vid
         )
 
         stacked_video = clips_array([[top_clip], [bottom_clip]])
-        stacked_video = center_crop_to_shorts(stacked_video, target_width=1080, target_height=1920)
+        stacked_video = center_crop_to_shorts(stacked_video, target_width=frame_width, target_height=frame_height)
         bg_video = stacked_video.with_audio(audio)
 
     else:
-        video_files = sorted(f for f in os.listdir(VIDEO_DIR) if f.endswith(".mp4"))
-        bg_path = os.path.join(VIDEO_DIR, random.choice(video_files))
-        raw_video = VideoFileClip(bg_path)
+        raw_video = stack.enter_context(VideoFileClip(backgrounds[0], audio=False))
 
         try:
             max_start = max(0, raw_video.duration - audio.duration - 10)
-            start_time = random.uniform(0, max_start) if max_start > 0 else 0
+            start_time = rng.uniform(0, max_start) if max_start > 0 else 0
         except Exception:
             start_time = 0
 
-        bg_video = center_crop_to_shorts(raw_video.subclipped(start_time, start_time + audio.duration))
+        bg_video = center_crop_to_shorts(raw_video.subclipped(start_time, start_time + audio.duration),
+                                         target_width=scaled(886, scale, even=True), target_height=frame_height)
         bg_video = bg_video.with_audio(audio)
 
+    bg_video.profile_kind = "background"
+
     # Load word timing data
     with open(ts_path) as jf:
         words_data = fill_missing_timestamps(json.load(jf))
@@ -353,13 +626,17 @@ def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_vid
             title_text=title,
             words_data=words_data,
             video_size=bg_video.size,
-            bg_image_path=os.path.join(ROOT_DIR, "data", "overlay", "imessage_popup.png")
+            bg_image_path=os.path.join(ROOT_DIR, "data", "overlay", "imessage_popup.png"),
+            scale=scale
         )
+        title_clip.profile_kind, title_clip.profile_label = "title", title
         text_clips.append(title_clip)
     else:
         title_duration = 0
 
-    for group in group_words_by_syllables(words_data):
+    # A fresh rng for the word swap, so plan_segments can group the words exactly
+    # as this render does without replaying the background choices first
+    for group in group_words_by_syllables(words_data, rng=random.Random(seed)):
         group_start = group[0]["start"]
         group_end = group[-1]["end"]
         if group_start > title_duration:
@@ -368,12 +645,51 @@ def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_vid
                 font_path=str(SYSTEM_ARIAL),
                 video_size=bg_video.size,
                 start=group_start,
-                end=group_end
+                end=group_end,
+                scale=scale
             )
             text_clips.extend(clips)
 
-    final = CompositeVideoClip([bg_video, *text_clips]).with_duration(audio_duration)
-    final.write_videofile(out, codec="libx264", audio_codec="aac", fps=30)
+    # Layers blend only while active and only inside their visible pixels; the
+    # compositor keeps cropped copies, so the full-frame clips can go
+    return CaptionCompositor(text_clips, bg_video.size).apply(bg_video).with_duration(audio_duration)
+
+def assemble_video(audio_fn, title, subreddit, out, script_txt, _, use_split_videos=False, hide_title_card=False,
+                   profile="final", profile_frames=False, backgrounds=None, audio_dir=None, segments=1):
+    if segments > 1 and profile_frames:
+        # The frame profiler hooks one in-process compositor; segments render in other processes
+        raise ValueError("profile_frames needs a single-pass render (segments=1)")
+    audio_path = os.path.join(audio_dir or AUDIO_DIR, audio_fn)
+
+    # Select a random video (unless the caller already picked) and starting point
+    scale = get_profile(profile)["scale"]
+    backgrounds = backgrounds or pick_backgrounds(use_split_videos)
+    seed = random.randrange(2 ** 32)
+    if segments > 1:
+        return render_segmented(audio_path, title, subreddit, out, backgrounds, use_split_videos, hide_title_card,
+                                seed, segments, profile)
+
+    # Every reader opened below is closed when this render ends, even on failure,
+    # so ffmpeg subprocesses and frame buffers don't pile up over a long batch
+    with ResourceMonitor() as monitor, ExitStack() as stack:
+        final = build_timeline(stack, audio_path, title, subreddit, backgrounds, use_split_videos, hide_title_card,
+                               seed, scale)
+        monitor.guard(final)
+        if not profile_frames:
+            stats = write_with_profile(final, out, profile)
+        else:
+            # Per-frame breakdown by layer type and encoder, written to data/profiles/
+            profiler = RenderProfiler().attach(final)
+            stats = write_with_profile(final, out, profile)
+            profiler.finish()
+            stats["frame_profile"] = profiler.write(out)
+
+    stats.update(monitor.report())
+    children = stats["peak_children_rss_mb"]
+    print(f"[RESOURCES] {os.path.basename(out)}: peak RSS {stats['peak_rss_mb']:.0f} MB"
+          + (f" (+{children:.0f} MB ffmpeg)" if children is not None else "")
+          + f", open fds {stats['open_fds_before']} → {stats['open_fds_after']}")
+    return stats
 
 def fill_missing_timestamps(words_data):
     for i, word_data in enumerate(words_data):
@@ -393,7 +709,50 @@ def fill_missing_timestamps(words_data):
 
     return words_data
 
-def generate_final_videos(use_split_videos=True):
+def render_variant(entry, variant, out_dir, profile="final", profile_frames=False, backgrounds=None,
+                   audio_dir=None, segments=1):
+    """Renders one of VARIANTS for a script entry to <out_dir>/<variant>/<id>_<variant>.mp4."""
+    pid = entry["id"]
+    out = os.path.join(out_dir, variant, f"{pid}_{variant}.mp4")
+    stats = assemble_video(f"{pid}.mp3", entry["title"], entry["subreddit"], out, entry["script"], None,
+                           profile=profile, profile_frames=profile_frames, backgrounds=backgrounds,
+                           audio_dir=audio_dir, segments=segments, **VARIANTS[variant])
+    # Out here the render's clips are unreachable, so the next one starts from a clean heap
+    release_memory()
+    return stats
+
+def render_variants(entry, out_dir, profile="final", profile_frames=False, segments=1):
+    """Renders the three upload variants of one script entry; returns their render stats."""
+    return [render_variant(entry, variant, out_dir, profile=profile, profile_frames=profile_frames,
+                           segments=segments)
+            for variant in VARIANTS]
+
+def publish_render_jobs(queue, entry, out_dir, profile="final"):
+    """
+    Queues one render job per variant of `entry` for render_worker.py. Backgrounds
+    are picked here so every input is named up front, as paths relative to ROOT_DIR
+    that each node resolves against its own mount of the shared tree.
+    """
+    pid = entry["id"]
+    rel = lambda path: os.path.relpath(path, ROOT_DIR)
+    published = 0
+    for variant, options in VARIANTS.items():
+        payload = {
+            "entry": entry,
+            "variant": variant,
+            "profile": profile,
+            "audio": rel(os.path.join(AUDIO_DIR, f"{pid}.mp3")),
+            "timings": rel(os.path.join(AUDIO_DIR, f"{pid}.json")),
+            "backgrounds": [rel(p) for p in pick_backgrounds(options["use_split_videos"])],
+            "output": rel(os.path.join(out_dir, variant, f"{pid}_{variant}.mp4")),
+        }
+        if queue.publish(f"{pid}_{variant}_{profile}", payload):
+            published += 1
+    return published
+
+def generate_final_videos(profile="final", profile_frames=False, distributed=False, segments=1):
+    if segments > 1 and profile_frames:
+        raise ValueError("--profile-frames needs a single-pass render (--segments=1)")
     scripts_files = sorted(
         (f for f in os.listdir(SCRIPT_DIR) if f.endswith(".json") and f.startswith("scripts_")),
         key=lambda x: x.split("_")[1] + x.split("_")[2].replace(".json", ""),
@@ -413,28 +772,57 @@ def generate_final_videos(use_split_videos=True):
         print("[ERROR] Missing scripts or background videos.")
         return
 
-    bg_path = os.path.join(VIDEO_DIR, videos[0])
     scripts_fp = os.path.join(SCRIPT_DIR, scripts_files[0])
 
     with open(scripts_fp) as f:
         scripts = json.load(f)
 
+    # Drafts are for review only, so keep them out of the folders the uploader scans
+    out_dir = DRAFT_DIR if profile == "draft" else FINAL_DIR
+    stats = []
+
+    # Render farm mode: hand the work to render_worker.py nodes instead of rendering here
+    queue = None
+    if distributed:
+        from render_queue import open_queue
+        queue = open_queue()
+    published = 0
+
     for entry in scripts:
-        pid         = entry["id"]
-        title       = entry["title"]
-        text        = entry["script"]
-        subreddit   = entry["subreddit"]
-        mp3 = f"{pid}.mp3"
-        if os.path.exists(os.path.join(AUDIO_DIR, mp3)):
-            print(f"[PROCESS] {pid}")
-            out = os.path.join(FINAL_DIR, "1", pid + "_1.mp4")
-            assemble_video(mp3, title, subreddit, out, text, bg_path, use_split_videos=True, hide_title_card=False)
-            out = os.path.join(FINAL_DIR, "2", pid + "_2.mp4")
-            assemble_video(mp3, title, subreddit, out, text, bg_path, use_split_videos=True, hide_title_card=True)
-            out = os.path.join(FINAL_DIR, "3", pid + "_3.mp4")
-            assemble_video(mp3, title, subreddit, out, text, bg_path, use_split_videos=False, hide_title_card=False)
-        else:
+        pid = entry["id"]
+        if not os.path.exists(os.path.join(AUDIO_DIR, f"{pid}.mp3")):
             print(f"[SKIP] No audio for {pid}")
+        elif queue is not None:
+            published += publish_render_jobs(queue, entry, out_dir, profile=profile)
+        else:
+            print(f"[PROCESS] {pid}")
+            try:
+                # Stop the batch rather than start a render that can't fit; the rest go next run
+                ensure_memory_budget()
+                stats.extend(render_variants(entry, out_dir, profile=profile,
+                                             profile_frames=profile_frames, segments=segments))
+            except MemoryBudgetExceeded as e:
+                print(f"[ERROR] Memory budget exceeded at {pid}: {e}")
+                break
+
+    if queue is not None:
+        print(f"[QUEUE] Published {published} render jobs, queue now {queue.counts()}")
+
+    if stats:
+        total_seconds = sum(s["seconds"] for s in stats)
+        total_bytes = sum(s["bytes"] for s in stats)
+        mean_speed = sum(s["speed"] for s in stats) / len(stats)
+        print(f"[RENDER] {len(stats)} videos, profile={profile}: {mean_speed:.2f}x realtime on average, "
+              f"{total_seconds:.0f}s encoding, {total_bytes / 1_000_000:.1f} MB total")
+        # Both should stay flat across a batch; growth means something isn't being released
+        print(f"[RESOURCES] peak RSS first/last/max {stats[0]['peak_rss_mb']:.0f}/{stats[-1]['peak_rss_mb']:.0f}/"
+              f"{max(s['peak_rss_mb'] for s in stats):.0f} MB, open fds after first/last video "
+              f"{stats[0]['open_fds_after']}/{stats[-1]['open_fds_after']}")
 
 if __name__ == "__main__":
-    generate_final_videos()
+    import sys
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    # --segments=N renders each video as N pieces in parallel processes (see render_segmented)
+    segments = next((int(a.split("=", 1)[1]) for a in sys.argv if a.startswith("--segments=")), 1)
+    generate_final_videos(profile=args[0] if args else "final", profile_frames="--profile-frames" in sys.argv,
+                          distributed="--distributed" in sys.argv, segments=segments)
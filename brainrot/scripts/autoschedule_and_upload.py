@@ -2,14 +2,27 @@ import os
 import json
 import random
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload, build_http
 from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.credentials import AnonymousCredentials
 from google.auth.transport.requests import Request
 import pickle
 import shutil
 
+from quota_ledger import (INSERT_COST, QuotaExhausted, QuotaLedger, UploadLimitReached, is_quota_error,
+                          is_rate_limit_error, is_upload_limit_error, next_window)
+from schedule_store import ScheduleStore
+from script_index import load_script_index
+
 # ─── Constants ───────────────────────────────────────────────────────────────
 SCOPES = ["https://www.googleapis.com/auth/youtube.upload"]
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -18,45 +31,166 @@ SCRIPTS_DIR = ROOT_DIR / "data" / "processed" / "scripts"
 CREDENTIALS_FILE = ROOT_DIR / "credentials.json"
 TOKEN_FILE = ROOT_DIR / "token.pickle"
 SCHEDULE_JSON = ROOT_DIR / "data" / "schedule.json"
+UPLOAD_SESSIONS_JSON = ROOT_DIR / "data" / "upload_sessions.json"
+QUOTA_JSON = ROOT_DIR / "data" / "quota.json"
+
+UPLOAD_WORKERS = 3                      # Videos uploaded in parallel
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024     # Must be a multiple of 256 KiB
+UPLOAD_RETRIES = 5                      # Consecutive failed chunks tolerated per video
+RETRIABLE_STATUSES = (500, 502, 503, 504)
+SCHEDULE_HORIZON_DAYS = 30              # Leave anything that doesn't fit for a later run
+
+# Send uploads to a local stand-in (see youtube_standin.py) instead of YouTube,
+# e.g. YOUTUBE_UPLOAD_ENDPOINT=http://127.0.0.1:8765. Skips OAuth entirely.
+UPLOAD_ENDPOINT = os.getenv("YOUTUBE_UPLOAD_ENDPOINT")
+
+# Each Google Cloud project has its own OAuth client and daily Data API quota
+PROJECTS = {
+    "default": {"credentials_file": CREDENTIALS_FILE, "daily_quota": 10_000},
+}
+
+# Each channel has its own OAuth token and daily publish hours, and uploads
+# through one of PROJECTS
+CHANNELS = {
+    "default": {"token_file": TOKEN_FILE, "slot_hours": [10, 15, 19], "project": "default"},
+}
 
 # ─── Auth ─────────────────────────────────────────────────────────────────────
-def get_authenticated_service():
+def get_credentials(token_file=TOKEN_FILE, credentials_file=CREDENTIALS_FILE):
+    if UPLOAD_ENDPOINT:
+        return AnonymousCredentials()
+    token_file = Path(token_file)
     creds = None
-    if TOKEN_FILE.exists():
-        with open(TOKEN_FILE, "rb") as token:
+    if token_file.exists():
+        with open(token_file, "rb") as token:
             creds = pickle.load(token)
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
             creds.refresh(Request())
         else:
-            flow = InstalledAppFlow.from_client_secrets_file(str(CREDENTIALS_FILE), SCOPES)
+            flow = InstalledAppFlow.from_client_secrets_file(str(credentials_file), SCOPES)
             creds = flow.run_local_server(port=0)
-        with open(TOKEN_FILE, "wb") as token:
+        with open(token_file, "wb") as token:
             pickle.dump(creds, token)
-    return build("youtube", "v3", credentials=creds)
+    return creds
+
+def get_authenticated_service(creds=None):
+    return build("youtube", "v3", credentials=creds or get_credentials())
+
+# httplib2 connections are not thread-safe, so every upload thread gets its own
+# authorized transport while sharing the one service object and credentials.
+# build_http() matters: a plain httplib2.Http follows YouTube's 308 "resume
+# incomplete" replies as redirects.
+_thread_local = threading.local()
+
+def get_thread_http(creds):
+    if not hasattr(_thread_local, "http"):
+        _thread_local.http = {}
+    if id(creds) not in _thread_local.http:
+        _thread_local.http[id(creds)] = AuthorizedHttp(creds, http=build_http())
+    return _thread_local.http[id(creds)]
+
+# ─── Resumable Sessions ───────────────────────────────────────────────────────
+class UploadSessions:
+    """
+    Persists resumable upload session URIs (keyed by filename) so an interrupted
+    upload continues from the last byte YouTube acknowledged on the next run.
+
+    A session keeps the channel and publishAt it was opened with, so both are
+    stored next to the URI and the resumed upload must be booked at that slot.
+    """
+
+    def __init__(self, path=UPLOAD_SESSIONS_JSON):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.sessions = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.sessions = json.load(f)
+            except json.JSONDecodeError:
+                print(f"[WARN] Could not decode {self.path.name}, starting fresh uploads.")
+
+    def get(self, key, size):
+        with self.lock:
+            session = self.sessions.get(key)
+        # A re-rendered file has a different size, so its old session is useless
+        if session and session.get("size") == size:
+            return session
+        return None
+
+    def save(self, key, uri, size, channel=None, publish_at=None):
+        with self.lock:
+            self.sessions[key] = {
+                "uri": uri,
+                "size": size,
+                "channel": channel,
+                "publish_at": publish_at.isoformat() if publish_at else None,
+                "updated": datetime.datetime.now().isoformat(),
+            }
+            self._write()
+
+    def discard(self, key):
+        with self.lock:
+            if self.sessions.pop(key, None) is not None:
+                self._write()
+
+    def _write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.sessions, f, indent=2)
+        os.replace(tmp_path, self.path)
 
 # ─── Helpers ──────────────────────────────────────────────────────────────────
-def load_schedule():
-    if SCHEDULE_JSON.exists():
-        with open(SCHEDULE_JSON, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_schedule(schedule):
-    with open(SCHEDULE_JSON, "w") as f:
-        json.dump(schedule, f, indent=2)
-
-def get_script_entry(video_id):
-    for script_file in SCRIPTS_DIR.glob("*.json"):
-        with open(script_file) as f:
-            data = json.load(f)
-            for entry in data:
-                if entry["id"] in video_id:
-                    return entry
-    return None
-
-def upload_video_to_youtube(file_path, title, description, scheduled_datetime):
-    youtube = get_authenticated_service()
+def load_schedule_store():
+    return ScheduleStore(SCHEDULE_JSON, channels={name: c["slot_hours"] for name, c in CHANNELS.items()})
+
+def load_quota_ledger():
+    return QuotaLedger(QUOTA_JSON, projects={name: p["daily_quota"] for name, p in PROJECTS.items()})
+
+def project_of(channel):
+    return CHANNELS.get(channel, {}).get("project", "default")
+
+def get_script_entry(filename, index=None):
+    """Looks up the script for '<id>_<variant>.mp4' by exact post id."""
+    # An empty ScriptIndex is falsy (it has __len__), so test for None
+    if index is None:
+        index = load_script_index()
+    return index.get_for_video(filename)
+
+def session_slot(session):
+    """(channel, publish datetime) a saved session was opened with, or None for older entries."""
+    if not session.get("channel") or not session.get("publish_at"):
+        return None
+    return session["channel"], datetime.datetime.fromisoformat(session["publish_at"])
+
+def query_upload_progress(http, uri, size):
+    """
+    Asks the server how much of a resumable upload it already holds: an empty
+    PUT with "Content-Range: bytes */<size>". Returns (bytes received, None),
+    or (size, video resource) if the upload had already completed.
+    """
+    resp, content = http.request(uri, method="PUT", body=b"",
+                                 headers={"Content-Length": "0", "Content-Range": f"bytes */{size}"})
+    if resp.status in (200, 201):
+        return size, json.loads(content)
+    if resp.status != 308:
+        raise HttpError(resp, content, uri=uri)
+    # "Range: bytes=0-<last byte>", absent if nothing arrived yet
+    received = resp.get("range")
+    return (int(received.rpartition("-")[2]) + 1 if received else 0), None
+
+def upload_video_to_youtube(youtube, file_path, title, description, scheduled_datetime, sessions=None, http=None,
+                            channel=None, on_new_session=None):
+    """
+    Uploads file_path as a private video published at scheduled_datetime.
+
+    With `sessions`, a saved session for the file is resumed instead; it keeps
+    the title, channel and publishAt it was opened with. `on_new_session` is
+    called before an expired session is replaced by a fresh insert, e.g. to
+    charge its quota, and may raise to stop the upload.
+    """
     request_body = {
         "snippet": {
             "title": title,
@@ -71,22 +205,80 @@ def upload_video_to_youtube(file_path, title, description, scheduled_datetime):
         }
     }
 
-    media = MediaFileUpload(file_path, chunksize=-1, resumable=True, mimetype='video/*')
+    media = MediaFileUpload(file_path, chunksize=UPLOAD_CHUNK_SIZE, resumable=True, mimetype='video/*')
     request = youtube.videos().insert(
         part="snippet,status",
         body=request_body,
         media_body=media
     )
 
+    if UPLOAD_ENDPOINT:
+        endpoint = urlsplit(UPLOAD_ENDPOINT)
+        uri = urlsplit(request.uri)
+        request.uri = urlunsplit((endpoint.scheme, endpoint.netloc, uri.path, uri.query, uri.fragment))
+
+    key = os.path.basename(file_path)
+    session = sessions.get(key, media.size()) if sessions else None
+    resumed_uri = session["uri"] if session else None
+    if resumed_uri:
+        request.resumable_uri = resumed_uri
+        print(f"[RESUME] {key}: continuing previous upload session")
+
+    saved_uri = resumed_uri
+    query_progress = resumed_uri is not None
+    failures = 0
     response = None
     while response is None:
-        status, response = request.next_chunk()
+        # Retries are done here rather than with next_chunk(num_retries=...), which
+        # re-sends an already consumed file slice. After a failure next_chunk first
+        # asks the server how much it kept, so only the missing bytes go out again.
+        try:
+            if query_progress:
+                request.resumable_progress, response = query_upload_progress(
+                    http or request.http, request.resumable_uri, media.size())
+                query_progress = False
+                status = None
+            else:
+                status, response = request.next_chunk(http=http)
+            failures = 0
+        except HttpError as e:
+            if resumed_uri and e.resp.status in (404, 410):
+                # Session expired on YouTube's side (they last about a week)
+                print(f"[RESUME] {key}: previous session expired, restarting upload")
+                sessions.discard(key)
+                if on_new_session:
+                    on_new_session()
+                return upload_video_to_youtube(youtube, file_path, title, description, scheduled_datetime,
+                                               sessions=sessions, http=http, channel=channel)
+            # rateLimitExceeded only means "slow down", so it is backed off like a 5xx
+            if not (e.resp.status in RETRIABLE_STATUSES or is_rate_limit_error(e)) or failures >= UPLOAD_RETRIES:
+                raise
+            failures += 1
+            status = None
+            print(f"[RETRY] {key}: HTTP {e.resp.status}, attempt {failures}/{UPLOAD_RETRIES}")
+            time.sleep(random.uniform(0, 2 ** failures))
+        except (OSError, httplib2.HttpLib2Error) as e:
+            if failures >= UPLOAD_RETRIES:
+                raise
+            failures += 1
+            status = None
+            print(f"[RETRY] {key}: {e}, attempt {failures}/{UPLOAD_RETRIES}")
+            time.sleep(random.uniform(0, 2 ** failures))
+        finally:
+            # Save as soon as the session exists, even if this chunk failed
+            if sessions and request.resumable_uri and request.resumable_uri != saved_uri:
+                saved_uri = request.resumable_uri
+                sessions.save(key, saved_uri, media.size(), channel=channel, publish_at=scheduled_datetime)
         if status:
             print(f"Uploaded {file_path}: {int(status.progress() * 100)}%")
 
+    if sessions:
+        sessions.discard(key)
+    return response
+
 # ─── Main Logic ───────────────────────────────────────────────────────────────
-def schedule_and_upload():
-    scheduled = load_schedule()
+def schedule_and_upload(parallelism=UPLOAD_WORKERS, horizon_days=SCHEDULE_HORIZON_DAYS):
+    store = load_schedule_store()
 
     folders = ["1", "2", "3"]
     SUCCESS_DIR = FINAL_DIR / "success"
@@ -99,61 +291,141 @@ def schedule_and_upload():
     all_videos = []
     for folder in folders:
         folder_path = FINAL_DIR / folder
+        if not folder_path.exists():
+            continue
         for f in os.listdir(folder_path):
-            if f.endswith(".mp4") and not any(f in val for val in scheduled.values()):
+            if f.endswith(".mp4") and not store.is_scheduled(f):
                 all_videos.append((folder_path / f, f))
 
     if not all_videos:
         print("[INFO] No unscheduled videos found.")
         return
 
-    now = datetime.datetime.now()
-    schedule_slots = []
-    for i in range(7):
-        day = now.date() + datetime.timedelta(days=i)
-        for hour in [10, 15, 19]:
-            dt = datetime.datetime.combine(day, datetime.time(hour, 0))
-            if dt > now and dt.isoformat() not in scheduled:
-                schedule_slots.append(dt)
-            if len(schedule_slots) >= len(all_videos):
-                break
-        if len(schedule_slots) >= len(all_videos):
-            break
-
-    print(f"[INFO] Scheduling {min(len(schedule_slots), len(all_videos))} videos")
     random.shuffle(all_videos)
 
-    uploaded_videos = []
+    script_index = load_script_index()
+    ledger = load_quota_ledger()
+    sessions = UploadSessions()
+    now = datetime.datetime.now()
+    horizon = now + datetime.timedelta(days=horizon_days)
+    description = "#reddit #story #redditstory #storytime #stories"
+
+    # Inserts each project can still afford in this quota window. Reserving only
+    # on channels with quota left fills the soonest slots first and spreads the
+    # uploads over the projects; the rest waits for the next window.
+    budget = {name: ledger.affordable(name) for name in PROJECTS}
+    for name, count in budget.items():
+        print(f"[QUOTA] {name}: {ledger.remaining(name)} units left, room for {count} upload(s)")
+
+    jobs = []
+    deferred = 0
+    for video_path, filename in all_videos:
+        script = get_script_entry(filename, script_index)
+        if not script:
+            print(f"[SKIP] Script not found for {filename}")
+            continue
 
-    try:
-        for dt, (video_path, filename) in zip(schedule_slots, all_videos):
-            video_id = filename.split(".")[0]
-            script = get_script_entry(video_id)
-            if not script:
-                print(f"[SKIP] Script not found for {video_id}")
+        # Resuming a session costs no quota: its insert was paid for when it was
+        # opened. It can only publish on the channel and at the time it was opened
+        # with, so it goes back into that exact slot or is dropped for a fresh insert.
+        session = sessions.get(filename, video_path.stat().st_size)
+        slot = None
+        if session:
+            slot = session_slot(session)
+            if slot and slot[0] in CHANNELS:
+                slot = store.reserve_at(filename, *slot, earliest=now)
+            if slot is None:
+                print(f"[RESUME] {filename}: previous session's slot is gone, starting a fresh upload")
+                sessions.discard(filename)
+        resumed = slot is not None
+
+        if not resumed:
+            channels = [c for c in CHANNELS if budget.get(project_of(c), 0) > 0]
+            if not channels:
+                deferred += 1
+                continue
+            slot = store.reserve(filename, earliest=now, horizon=horizon, channels=channels)
+            if slot is None:
+                print(f"[INFO] No free slot within {horizon_days} days for {filename}, leaving it for a later run")
                 continue
+            budget[project_of(slot[0])] -= 1
+        channel, dt = slot
 
-            title_raw = script["title"]
-            title = (title_raw[:92] + " #reddit #story #redditstory")[:100]
-            description = "#reddit #story #redditstory #storytime #stories"
+        title_raw = script["title"]
+        title = (title_raw[:92] + " #reddit #story #redditstory")[:100]
+        jobs.append((channel, dt, video_path, filename, title, resumed))
 
-            print(f"[UPLOAD] {filename} → {title}")
-            try:
-                upload_video_to_youtube(str(video_path), title, description, dt)
-                print(f"✅ Uploaded: {title}")
+    # Soonest publish slots go first, so if YouTube cuts a project off early the
+    # uploads left over are the ones with the most time to spare
+    jobs.sort(key=lambda job: job[1])
+    print(f"[INFO] Scheduling {len(jobs)} videos")
+    if deferred:
+        print(f"[QUOTA] Deferring {deferred} video(s) to the next quota window ({next_window():%Y-%m-%d %H:%M})")
+
+    # One set of credentials and one discovery client per channel for the whole run
+    clients = {}
+    for channel in sorted({job[0] for job in jobs}):
+        creds = get_credentials(CHANNELS[channel]["token_file"], PROJECTS[project_of(channel)]["credentials_file"])
+        clients[channel] = (creds, get_authenticated_service(creds))
+
+    # Channels that hit their own daily upload cap; their queued uploads are deferred
+    dropped_channels = set()
 
-                uploaded_videos.append((dt.isoformat(), filename))
+    def upload_one(channel, dt, video_path, filename, title, resumed):
+        creds, youtube = clients[channel]
+        project = project_of(channel)
+        if channel in dropped_channels:
+            raise UploadLimitReached(f"channel {channel} reached its upload limit")
 
-                # Move to success folder
-                shutil.move(str(video_path), SUCCESS_DIR / filename)
+        def charge_insert():
+            if not ledger.charge(project, INSERT_COST):
+                raise QuotaExhausted(f"no quota left on project {project}")
 
+        if not resumed:
+            charge_insert()
+        print(f"[UPLOAD] {filename} → {title} ({channel}, {dt:%Y-%m-%d %H:%M})")
+        try:
+            # An expired session is replaced by a new insert, which is charged too
+            upload_video_to_youtube(youtube, str(video_path), title, description, dt,
+                                    sessions=sessions, http=get_thread_http(creds),
+                                    channel=channel, on_new_session=charge_insert)
+        except HttpError as e:
+            if is_upload_limit_error(e):
+                # The channel is capped, not the project; its other channels keep going
+                dropped_channels.add(channel)
+                raise UploadLimitReached(f"YouTube reported channel {channel} at its upload limit") from e
+            if not is_quota_error(e):
+                raise
+            # Don't let the other queued uploads of this project try
+            ledger.exhaust(project)
+            raise QuotaExhausted(f"YouTube reported project {project} out of quota") from e
+        # Record the slot before anything else can fail
+        store.commit(filename)
+        print(f"✅ Uploaded: {title}")
+        # Move to success folder
+        shutil.move(str(video_path), SUCCESS_DIR / filename)
+
+    uploaded = 0
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        futures = {pool.submit(upload_one, *job): job for job in jobs}
+        for future in as_completed(futures):
+            filename = futures[future][3]
+            try:
+                future.result()
+                uploaded += 1
+            except (QuotaExhausted, UploadLimitReached) as e:
+                print(f"[QUOTA] Deferring {filename} to the next quota window: {e}")
+                store.release(filename)
+                deferred += 1
             except Exception as e:
+                # Keep going; the session file lets this one resume next run
                 print(f"[ERROR] Failed to upload {filename}: {e}")
-                break
-    finally:
-        for dt_str, fname in uploaded_videos:
-            scheduled[dt_str] = fname
-        save_schedule(scheduled)
+                store.release(filename)
+                failed.append(filename)
+
+    print(f"[INFO] Uploaded {uploaded} video(s), {len(failed)} failed, {deferred} deferred")
 
 if __name__ == "__main__":
     schedule_and_upload()
@@ -0,0 +1,431 @@
+# scripts/benchmark_pipeline.py
+#
+# Offline end-to-end benchmark. Every network service (Reddit, OpenAI, ElevenLabs,
+# YouTube) is replaced by a local stand-in, fixtures are generated into a throwaway
+# data/ tree, and each stage is timed per item. Results are saved as JSON and can be
+# compared against an earlier run to catch regressions:
+#
+#   python3 scripts/benchmark_pipeline.py --posts 6 --profile draft
+#   python3 scripts/benchmark_pipeline.py --compare data/benchmarks/pipeline_<ts>.json
+
+import os
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import datetime
+import importlib
+import subprocess
+import tempfile
+import types
+import wave
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT_DIR / "data" / "benchmarks"
+STAGES = ["scrape", "script", "voice", "speed", "align", "render", "upload"]
+SCRIPT_LENGTHS = [60, 150, 240]        # words; cycled across posts
+WORDS_PER_SECOND = 2.8                 # synthetic voice pace before atempo
+SAMPLE_RATE = 22050
+BACKGROUND_SECONDS = 100
+REGRESSION_TOLERANCE = 0.10            # 10% slower p50 counts as a regression
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans-Bold.ttf",
+    "/Library/Fonts/Arial Bold.ttf",
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",
+]
+
+VOCAB = ("my roommate neighbor boss sister wedding rent landlord car keys kitchen party money "
+         "text phone lawyer apartment dinner dog garage night week month yelled laughed refused "
+         "paid stole cheated moved called found lied apologized revenge finally actually").split()
+
+
+# ─── Stage timing ──────────────────────────────────────────────────────────────
+class StageTimer:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    @contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        yield
+        self.samples[stage].append(time.perf_counter() - started)
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in self.samples.items() if values}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(values):
+    ordered = sorted(values)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "total_s": round(total, 4),
+        "mean_s": round(total / len(ordered), 4),
+        "p50_s": round(percentile(ordered, 0.50), 4),
+        "p90_s": round(percentile(ordered, 0.90), 4),
+        "p99_s": round(percentile(ordered, 0.99), 4),
+        "items_per_s": round(len(ordered) / total, 3) if total else None,
+    }
+
+
+# ─── Stand-ins for network services ───────────────────────────────────────────
+def sentence(rng, n):
+    words = [rng.choice(VOCAB) for _ in range(n)]
+    return " ".join(words).capitalize() + "."
+
+
+def fake_story(rng, n_words):
+    parts, remaining = [], n_words
+    while remaining > 0:
+        n = min(remaining, rng.randint(6, 14))
+        parts.append(sentence(rng, n))
+        remaining -= n
+    return " ".join(parts)
+
+
+class FakeReddit:
+    """Enough of praw.Reddit for scrape_posts: subreddit(name).top(...) yields submissions."""
+
+    def __init__(self, rng, posts_per_sub=200, **_):
+        self.rng = rng
+        self.posts_per_sub = posts_per_sub
+
+    def subreddit(self, name):
+        rng = self.rng
+
+        def top(time_filter="all", limit=100):
+            for i in range(min(limit, self.posts_per_sub)):
+                yield types.SimpleNamespace(
+                    id=f"{name[:3].lower()}{i:05d}",
+                    title=sentence(rng, rng.randint(6, 12)).rstrip("."),
+                    selftext=fake_story(rng, rng.choice(SCRIPT_LENGTHS) + 60),
+                    score=rng.randint(700, 40000),
+                    stickied=False,
+                    url=f"https://reddit.example/{name}/{i}",
+                    created_utc=1_700_000_000 + i,
+                )
+
+        return types.SimpleNamespace(top=top)
+
+
+class FakeChatCompletions:
+    """Stand-in for openai.chat.completions that returns a well-formed script."""
+
+    def __init__(self, rng, latency=0.0):
+        self.rng = rng
+        self.latency = latency
+        self.calls = 0
+
+    def create(self, model=None, messages=None, max_tokens=None, **_):
+        time.sleep(self.latency)
+        self.calls += 1
+        story = messages[-1]["content"]
+        words = story.split()[:SCRIPT_LENGTHS[self.calls % len(SCRIPT_LENGTHS)]]
+        text = (f"Title: {sentence(self.rng, 8).rstrip('.')}\n"
+                f"Story: {' '.join(words).rstrip('.')}.\n"
+                f"Tags: (revenge), (twist), (roommate drama), (rent), (keys)")
+        usage = types.SimpleNamespace(prompt_tokens=len(story.split()) * 4 // 3 + 400,
+                                      completion_tokens=len(text.split()) * 4 // 3)
+        message = types.SimpleNamespace(content=text)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+def write_tone_wav(path, text, rng, wps=WORDS_PER_SECOND):
+    """
+    Voiceover stand-in: a burst of tone per word with short gaps, and a longer
+    pause after each sentence. Returns the true word timings.
+    """
+    t, timings, chunks = 0.25, [], [np.zeros(int(0.25 * SAMPLE_RATE), dtype=np.float32)]
+    for word in text.split():
+        length = max(0.12, (len(word) / 5.0) / wps * rng.uniform(0.8, 1.2))
+        n = int(length * SAMPLE_RATE)
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(140, 220) * np.arange(n) / SAMPLE_RATE)
+        gap = 0.35 if word.endswith((".", "!", "?")) else 0.06
+        chunks += [tone.astype(np.float32), np.zeros(int(gap * SAMPLE_RATE), dtype=np.float32)]
+        timings.append({"word": word, "start": round(t, 3), "end": round(t + length, 3), "score": 1.0})
+        t += length + gap
+    samples = (np.concatenate(chunks) * 32767).astype(np.int16)
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(samples.tobytes())
+    return timings
+
+
+# ─── Fixtures ──────────────────────────────────────────────────────────────────
+def find_ffmpeg():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return shutil.which("ffmpeg")
+
+
+def find_font(explicit=None):
+    for candidate in [explicit, *FONT_CANDIDATES]:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def make_workspace(base):
+    data = Path(base) / "data"
+    dirs = {
+        "posts": data / "posts",
+        "scripts": data / "scripts",
+        "processed": data / "processed" / "scripts",
+        "audio": data / "audio",
+        "videos": data / "videos",
+        "final": data / "final",
+        "overlay": data / "overlay",
+    }
+    for d in [*dirs.values(), dirs["videos"] / "top", dirs["videos"] / "bottom"]:
+        d.mkdir(parents=True, exist_ok=True)
+    for variant in ("1", "2", "3"):
+        (dirs["final"] / variant).mkdir(exist_ok=True)
+    return dirs
+
+
+def make_backgrounds(ffmpeg, videos_dir, seconds=BACKGROUND_SECONDS):
+    """Generated gameplay stand-ins: moving test patterns, one per background folder."""
+    sources = {
+        videos_dir / "bg_testsrc.mp4": "testsrc2=size=1280x720:rate=30",
+        videos_dir / "top" / "top_mandelbrot.mp4": "mandelbrot=size=1280x720:rate=30",
+        videos_dir / "bottom" / "bottom_life.mp4": "life=size=1280x720:rate=30:mold=10:ratio=0.3",
+    }
+    for path, source in sources.items():
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "lavfi", "-i", source, "-t", str(seconds),
+                        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", str(path)], check=True)
+
+
+def make_overlay(overlay_dir):
+    from PIL import Image
+    Image.new("RGBA", (900, 420), (255, 255, 255, 255)).save(overlay_dir / "imessage_popup.png")
+
+
+def install_stub_module(name, **attrs):
+    """Network clients only: use the real package when it's installed, else an empty shell."""
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        sys.modules[name] = types.SimpleNamespace(**attrs)
+
+
+# ─── Benchmark ─────────────────────────────────────────────────────────────────
+def run(args):
+    rng = random.Random(args.seed)
+    ffmpeg = find_ffmpeg()
+    font = find_font(args.font)
+    if not ffmpeg:
+        sys.exit("[ERROR] ffmpeg not found (install it or imageio-ffmpeg)")
+    if not font:
+        sys.exit("[ERROR] No TrueType font found; pass --font /path/to/font.ttf")
+
+    install_stub_module("praw", Reddit=None)
+    install_stub_module("config", REDDIT_CLIENT_ID="", REDDIT_CLIENT_SECRET="", REDDIT_USER_AGENT="")
+    install_stub_module("openai")
+    install_stub_module("gtts", gTTS=None)
+
+    import scrape_reddit
+    import generate_script
+    import text_to_speech
+    import assemble_video
+    import autoschedule_and_upload as uploader
+    from youtube_standin import YouTubeStandIn
+
+    timer = StageTimer()
+    work = tempfile.mkdtemp(prefix="autotube_bench_")
+    dirs = make_workspace(work)
+    started = time.perf_counter()
+
+    try:
+        print(f"[INFO] Workspace {work}")
+        make_backgrounds(ffmpeg, dirs["videos"])
+        make_overlay(dirs["overlay"])
+
+        # Point every stage at the workspace
+        scrape_reddit.ROOT_DIR = work
+        scrape_reddit.DATA_DIR = str(dirs["posts"])
+        scrape_reddit.TARGET_TOTAL_NEW_POSTS = args.posts
+        scrape_reddit.praw = types.SimpleNamespace(Reddit=lambda **kw: FakeReddit(rng))
+        completions = FakeChatCompletions(rng, latency=args.llm_latency)
+        generate_script.openai = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+        text_to_speech.AUDIO_DIR = str(dirs["audio"])
+        text_to_speech.FFMPEG_BIN = ffmpeg
+        assemble_video.ROOT_DIR = work
+        assemble_video.AUDIO_DIR = str(dirs["audio"])
+        assemble_video.VIDEO_DIR = str(dirs["videos"])
+        assemble_video.SYSTEM_ARIAL = Path(font)
+        assemble_video.TITLE_FONT_BOLD = font
+        assemble_video.TITLE_FONT_REGULAR = font
+
+        # Stage 1: scrape (one run covers every post)
+        with timer.measure("scrape"):
+            scrape_reddit.scrape_posts()
+        posts_file = sorted(dirs["posts"].glob("posts_*.json"))[-1]
+        with open(posts_file) as f:
+            posts = json.load(f)
+
+        # Stage 2: script generation, per post
+        entries = []
+        for post in posts:
+            with timer.measure("script"):
+                result = generate_script.gpt_rewrite_story(post["selftext"])
+                entry = generate_script.parse_script_result(result, post) if result != "False" else None
+            if entry:
+                entries.append(entry)
+
+        # Stages 3-5: voice, atempo, alignment, per script
+        try:
+            import whisperx  # noqa: F401
+            real_alignment = not args.synthetic_alignment
+        except ImportError:
+            real_alignment = False
+        speed_factor = 1.28
+        for entry in entries:
+            text = text_to_speech.compose_voiceover_text(entry["title"], entry["script"])
+            mp3 = os.path.join(dirs["audio"], f"{entry['id']}.mp3")
+            with timer.measure("voice"):
+                # ffmpeg sniffs the container, so a WAV named .mp3 goes through the same path
+                truth = write_tone_wav(mp3, text, rng)
+            with timer.measure("speed"):
+                text_to_speech.speed_up_audio(mp3, speed_factor=speed_factor)
+            with timer.measure("align"):
+                if real_alignment:
+                    text_to_speech.make_subtitle_json(mp3, text)
+                else:
+                    scaled = [{**w, "start": round(w["start"] / speed_factor, 3),
+                               "end": round(w["end"] / speed_factor, 3)} for w in truth]
+                    with open(mp3.replace(".mp3", ".json"), "w") as f:
+                        json.dump(scaled, f, indent=2)
+
+        # Stage 6: render all three variants
+        renders = []
+        for entry in entries:
+            with timer.measure("render"):
+                renders.extend(assemble_video.render_variants(entry, str(dirs["final"]), profile=args.profile))
+
+        # Stage 7: upload every rendered video to the stand-in
+        server = YouTubeStandIn(port=0, latency=args.upload_latency, bandwidth=args.upload_bandwidth).start()
+        try:
+            uploader.UPLOAD_ENDPOINT = server.url
+            creds = uploader.get_credentials()
+            youtube = uploader.get_authenticated_service(creds)
+            publish_at = datetime.datetime.now() + datetime.timedelta(days=1)
+            for video in sorted(dirs["final"].glob("*/*.mp4")):
+                with timer.measure("upload"):
+                    uploader.upload_video_to_youtube(youtube, str(video), video.stem, "benchmark", publish_at,
+                                                     http=uploader.get_thread_http(creds))
+        finally:
+            server.stop()
+    finally:
+        if not args.keep:
+            shutil.rmtree(work, ignore_errors=True)
+
+    wall = time.perf_counter() - started
+    stages = timer.summary()
+    videos = len(renders)
+    # Pipeline time excludes fixture generation (background clips, overlay)
+    pipeline_seconds = sum(s["total_s"] for s in stages.values())
+    return {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "config": vars(args),
+        "alignment": "whisperx" if real_alignment else "synthetic",
+        "posts": len(posts),
+        "scripts": len(entries),
+        "videos": videos,
+        "stages": stages,
+        "render": {
+            "mean_speed_x_realtime": round(sum(r["speed"] for r in renders) / videos, 3) if videos else None,
+            "total_bytes": sum(r["bytes"] for r in renders),
+        },
+        "end_to_end": {
+            "pipeline_seconds": round(pipeline_seconds, 3),
+            "wall_seconds": round(wall, 3),
+            "videos_per_hour": round(videos / pipeline_seconds * 3600, 2) if pipeline_seconds else None,
+        },
+    }
+
+
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Prints p50 deltas per stage; returns the stages that got slower than tolerance allows."""
+    regressions = []
+    print(f"\n{'stage':<8} {'base p50':>10} {'now p50':>10} {'delta':>8}")
+    for stage in STAGES:
+        old = baseline["stages"].get(stage)
+        new = current["stages"].get(stage)
+        if not old or not new or not old["p50_s"]:
+            continue
+        delta = new["p50_s"] / old["p50_s"] - 1
+        flag = " REGRESSION" if delta > tolerance else ""
+        print(f"{stage:<8} {old['p50_s']:>10.4f} {new['p50_s']:>10.4f} {delta:>+8.1%}{flag}")
+        if flag:
+            regressions.append(stage)
+    old_vph = baseline["end_to_end"].get("videos_per_hour")
+    new_vph = current["end_to_end"].get("videos_per_hour")
+    if old_vph and new_vph:
+        print(f"{'videos/h':<8} {old_vph:>10.1f} {new_vph:>10.1f} {new_vph / old_vph - 1:>+8.1%}")
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--posts", type=int, default=6)
+    parser.add_argument("--profile", default="draft", help="render profile (see assemble_video.RENDER_PROFILES)")
+    parser.add_argument("--lengths", default=",".join(map(str, SCRIPT_LENGTHS)),
+                        help="comma-separated script lengths in words, cycled across posts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--font", default=None)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated seconds per OpenAI call")
+    parser.add_argument("--upload-latency", type=float, default=0.0)
+    parser.add_argument("--upload-bandwidth", type=float, default=0, help="bytes/sec, 0 = unlimited")
+    parser.add_argument("--synthetic-alignment", action="store_true",
+                        help="use fixture word timings even when WhisperX is installed")
+    parser.add_argument("--keep", action="store_true", help="keep the fixture workspace")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    SCRIPT_LENGTHS[:] = [int(n) for n in args.lengths.split(",")]
+    results = run(args)
+
+    for stage, s in results["stages"].items():
+        print(f"[BENCH] {stage:<7} n={s['count']:<3} p50={s['p50_s']:.3f}s p90={s['p90_s']:.3f}s "
+              f"p99={s['p99_s']:.3f}s {s['items_per_s'] or 0:.3g}/s")
+    print(f"[BENCH] {results['videos']} videos, {results['end_to_end']['videos_per_hour']} videos/hour "
+          f"({results['alignment']} alignment, profile={args.profile})")
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"pipeline_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Saved] {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            sys.exit(f"[ERROR] Regressions in: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
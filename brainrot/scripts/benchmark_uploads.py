@@ -0,0 +1,165 @@
+# scripts/benchmark_uploads.py
+
+import os
+import json
+import time
+import datetime
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import autoschedule_and_upload as uploader
+from youtube_standin import YouTubeStandIn
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT_DIR / "data" / "benchmarks"
+CHUNK_SIZES = [1 * 1024 * 1024, 4 * 1024 * 1024, 8 * 1024 * 1024, 16 * 1024 * 1024]
+PARALLELISM = [1, 2, 4]
+VIDEO_COUNT = 6
+VIDEO_SIZE_MB = 24
+
+
+def make_fixtures(directory, count=VIDEO_COUNT, size_mb=VIDEO_SIZE_MB):
+    """Random bytes stand in for rendered shorts; the stand-in never decodes them."""
+    paths = []
+    for i in range(count):
+        path = Path(directory) / f"bench{i:03d}_1.mp4"
+        with open(path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        paths.append(path)
+    return paths
+
+
+def upload_batch(paths, parallelism, sessions):
+    creds = uploader.get_credentials()
+    youtube = uploader.get_authenticated_service(creds)
+    publish_at = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    def upload_one(path):
+        uploader.upload_video_to_youtube(youtube, str(path), path.stem, "benchmark", publish_at,
+                                         sessions=sessions, http=uploader.get_thread_http(creds))
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        for future in [pool.submit(upload_one, path) for path in paths]:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] {e}")
+                failed += 1
+    return failed
+
+
+def run_case(server, paths, chunk_size, parallelism, work_dir):
+    uploader.UPLOAD_CHUNK_SIZE = chunk_size
+    sessions = uploader.UploadSessions(Path(work_dir) / f"sessions_{chunk_size}_{parallelism}.json")
+    total_bytes = sum(p.stat().st_size for p in paths)
+    before = dict(server.stats)
+
+    started = time.perf_counter()
+    failed = upload_batch(paths, parallelism, sessions)
+    elapsed = time.perf_counter() - started
+
+    delta = {k: server.stats[k] - before[k] for k in server.stats}
+    return {
+        "chunk_size": chunk_size,
+        "parallelism": parallelism,
+        "uploads": len(paths) - failed,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "uploads_per_minute": round((len(paths) - failed) / elapsed * 60, 2),
+        "bytes_per_second": round(total_bytes / elapsed),
+        "chunks": delta["chunks"],
+        "injected_failures": delta["injected_failures"],
+        "status_queries": delta["status_queries"],
+        # Bytes sent beyond the file sizes, i.e. re-sent after failures
+        "resend_overhead": round(delta["bytes_received"] / total_bytes - 1, 4),
+    }
+
+
+def run_recovery(server, path, chunk_size, work_dir, failure_rate):
+    """
+    Simulates a run that dies mid-upload (no chunk retries) followed by fresh runs
+    that pick the session back up from disk, and reports how much was re-sent.
+    """
+    uploader.UPLOAD_CHUNK_SIZE = chunk_size
+    sessions_path = Path(work_dir) / f"recovery_{chunk_size}.json"
+    saved_retries = uploader.UPLOAD_RETRIES
+    uploader.UPLOAD_RETRIES = 0
+    server.failure_rate = failure_rate
+    before = dict(server.stats)
+    runs = 0
+    try:
+        while runs < 50:
+            runs += 1
+            # A new UploadSessions per attempt is what a fresh process would see
+            if upload_batch([path], 1, uploader.UploadSessions(sessions_path)) == 0:
+                break
+    finally:
+        uploader.UPLOAD_RETRIES = saved_retries
+        server.failure_rate = 0.0
+
+    delta = {k: server.stats[k] - before[k] for k in server.stats}
+    size = path.stat().st_size
+    return {
+        "chunk_size": chunk_size,
+        "failure_rate": failure_rate,
+        "runs_needed": runs,
+        "sessions_opened": delta["sessions"],
+        "injected_failures": delta["injected_failures"],
+        "resend_overhead": round(delta["bytes_received"] / size - 1, 4),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Upload throughput benchmark against the local YouTube stand-in")
+    parser.add_argument("--videos", type=int, default=VIDEO_COUNT)
+    parser.add_argument("--size-mb", type=int, default=VIDEO_SIZE_MB)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=40_000_000, help="bytes/sec across all uploads")
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="chance a chunk fails with 503")
+    parser.add_argument("--out", default=None, help="results JSON path")
+    args = parser.parse_args()
+
+    server = YouTubeStandIn(port=0, latency=args.latency, bandwidth=args.bandwidth,
+                            failure_rate=args.failure_rate, seed=0).start()
+    uploader.UPLOAD_ENDPOINT = server.url
+    print(f"[INFO] Stand-in at {server.url}: latency={args.latency}s bandwidth={args.bandwidth / 1e6:.0f}MB/s "
+          f"failure_rate={args.failure_rate}")
+
+    results = {"config": vars(args), "grid": [], "recovery": []}
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            paths = make_fixtures(work_dir, args.videos, args.size_mb)
+
+            print(f"{'chunk':>8} {'par':>4} {'up/min':>8} {'MB/s':>8} {'fails':>6} {'resent':>7}")
+            for chunk_size in CHUNK_SIZES:
+                for parallelism in PARALLELISM:
+                    row = run_case(server, paths, chunk_size, parallelism, work_dir)
+                    results["grid"].append(row)
+                    print(f"{chunk_size // 1024 // 1024:>6}MB {parallelism:>4} {row['uploads_per_minute']:>8.1f} "
+                          f"{row['bytes_per_second'] / 1e6:>8.2f} {row['injected_failures']:>6} "
+                          f"{row['resend_overhead']:>7.2%}")
+
+            print("\n[INFO] Recovery: upload dies on the first failed chunk, next run resumes from disk")
+            for chunk_size in CHUNK_SIZES:
+                row = run_recovery(server, paths[0], chunk_size, work_dir, max(args.failure_rate, 0.2))
+                results["recovery"].append(row)
+                print(f"{chunk_size // 1024 // 1024:>6}MB runs={row['runs_needed']} "
+                      f"sessions={row['sessions_opened']} resent={row['resend_overhead']:.2%}")
+    finally:
+        server.stop()
+
+    out = Path(args.out) if args.out else RESULTS_DIR / f"uploads_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Saved] {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+# scripts/caption_compositor.py
+#
+# Draws the caption timeline (title card, caption groups, word highlights) over the
+# background. CompositeVideoClip asks every one of the hundreds of layers whether
+# it is playing on every frame, then alpha-composites each active one at full
+# frame size through PIL. Here the layers are static sprites cropped to their
+# visible pixels and kept in an interval index: a frame visits only the layers
+# active at t and blends each inside its bounding box, in place, into a reused
+# frame buffer.
+
+import bisect
+
+import numpy as np
+from moviepy.tools import compute_position
+
+
+class Sprite:
+    """
+    A static overlay cropped to its visible pixels, active for [start, end). (x, y)
+    is where the crop lands on the frame; place() recomputes it for a frame size.
+    """
+
+    __slots__ = ("start", "end", "z", "x", "y", "rgb", "alpha", "kind", "label",
+                 "offset", "clip_size", "pos", "relative_pos")
+
+    def __init__(self, start, end, z, rgb, alpha, offset, clip_size, pos, relative_pos=False,
+                 kind="other", label=None):
+        self.start = start
+        self.end = end
+        self.z = z              # Stacking order: the layer's index in the original clip list
+        self.rgb = rgb          # (h, w, 3) uint8
+        self.alpha = alpha      # (h, w, 1) float32 in [0, 1], or None when fully opaque
+        self.offset = offset    # Top left of the crop inside the clip's image
+        self.clip_size = clip_size
+        self.pos = pos
+        self.relative_pos = relative_pos
+        self.kind = kind
+        self.label = label
+        self.x = self.y = 0
+
+    @property
+    def area(self):
+        return self.rgb.shape[0] * self.rgb.shape[1]
+
+    def place(self, frame_size):
+        x, y = compute_position(self.clip_size, frame_size, self.pos, self.relative_pos)
+        self.x, self.y = x + self.offset[0], y + self.offset[1]
+
+def sprite_from_clip(clip, z):
+    """
+    Sprite for a static clip (an ImageClip with a position, start and duration), or
+    None if nothing of it is visible.
+    """
+    rgb = clip.get_frame(0)
+    h, w = rgb.shape[:2]
+    alpha = clip.mask.get_frame(0) if clip.mask is not None else np.ones((h, w))
+
+    # Trim fully transparent borders
+    visible = alpha > 0
+    rows, cols = np.flatnonzero(visible.any(axis=1)), np.flatnonzero(visible.any(axis=0))
+    if not len(rows):
+        return None
+    y0, y1, x0, x1 = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+
+    crop_alpha = alpha[y0:y1, x0:x1].astype(np.float32)[:, :, None]
+    return Sprite(
+        start=clip.start,
+        end=clip.end if clip.end is not None else float("inf"),
+        z=z,
+        rgb=np.ascontiguousarray(rgb[y0:y1, x0:x1, :3], dtype=np.uint8),
+        alpha=None if np.all(crop_alpha >= 1.0) else crop_alpha,
+        offset=(int(x0), int(y0)),
+        clip_size=(w, h),
+        pos=clip.pos(0),
+        relative_pos=clip.relative_pos,
+        kind=getattr(clip, "profile_kind", "other"),
+        label=getattr(clip, "profile_label", None),
+    )
+
+
+class IntervalIndex:
+    """
+    Sprites sorted by start and by end time. Frames are requested in order while
+    rendering, so at(t) only moves two cursors forward: sprites are added as they
+    start and dropped as they end. Going back in time re-seeks with a bisect.
+    """
+
+    def __init__(self, sprites):
+        self.by_start = sorted(sprites, key=lambda s: s.start)
+        self.by_end = sorted(sprites, key=lambda s: s.end)
+        self.starts = [s.start for s in self.by_start]
+        self.ends = [s.end for s in self.by_end]
+        self.seek(float("-inf"))
+
+    def seek(self, t):
+        self.t = t
+        self.next_start = bisect.bisect_right(self.starts, t)
+        self.next_end = bisect.bisect_right(self.ends, t)
+        self.active = {s.z: s for s in self.by_start[:self.next_start] if s.end > t}
+
+    def at(self, t):
+        """Sprites active at t (start <= t < end, as moviepy's is_playing), bottom first."""
+        if t < self.t:
+            self.seek(t)
+        else:
+            self.t = t
+            while self.next_start < len(self.starts) and self.starts[self.next_start] <= t:
+                sprite = self.by_start[self.next_start]
+                self.active[sprite.z] = sprite
+                self.next_start += 1
+            while self.next_end < len(self.ends) and self.ends[self.next_end] <= t:
+                self.active.pop(self.by_end[self.next_end].z, None)
+                self.next_end += 1
+        return [self.active[z] for z in sorted(self.active)]
+
+
+class CaptionCompositor:
+    """
+    Overlays static clips on a background clip:
+
+        final = CaptionCompositor(text_clips, bg_video.size).apply(bg_video)
+
+    The returned clip keeps the background's audio. Its frames come from one
+    buffer that is overwritten by the next frame, which is fine for writing a
+    video but means callers that keep frames around must copy them.
+    """
+
+    def __init__(self, clips, frame_size):
+        sprites = [sprite_from_clip(clip, z) for z, clip in enumerate(clips)]
+        self.sprites = [s for s in sprites if s is not None]
+        self.index = IntervalIndex(self.sprites)
+        self.place(frame_size)
+        self.frame = None
+        # Big enough for any sprite's blend
+        self.scratch = np.empty((max((s.rgb.shape[0] for s in self.sprites), default=0),
+                                 max((s.rgb.shape[1] for s in self.sprites), default=0), 3), dtype=np.float32)
+
+    def place(self, frame_size):
+        self.frame_size = tuple(frame_size)
+        for sprite in self.sprites:
+            sprite.place(self.frame_size)
+
+    def apply(self, background):
+        final = background.transform(self.composite)
+        final.compositor = self
+        return final
+
+    def composite(self, get_frame, t):
+        frame = self.background_frame(get_frame, t)
+        for sprite in self.active(t):
+            self.blend(frame, sprite)
+        return frame
+
+    def background_frame(self, get_frame, t):
+        """The background at t, copied into the frame buffer (never blended into the reader's own frame)."""
+        source = get_frame(t)
+        if self.frame is None or self.frame.shape != source.shape:
+            self.frame = np.empty(source.shape, dtype=np.uint8)
+        # Positions are relative to the frame the background actually delivers,
+        # as in CompositeVideoClip (rounding in crops and resizes can make it
+        # differ from the clip's nominal size by a few pixels)
+        if (source.shape[1], source.shape[0]) != self.frame_size:
+            self.place((source.shape[1], source.shape[0]))
+        np.copyto(self.frame, source, casting="unsafe")
+        return self.frame
+
+    def active(self, t):
+        return self.index.at(t)
+
+    def blend(self, frame, sprite):
+        h, w = sprite.rgb.shape[:2]
+        # Part of the sprite inside the frame
+        x0, y0 = max(0, -sprite.x), max(0, -sprite.y)
+        x1, y1 = min(w, frame.shape[1] - sprite.x), min(h, frame.shape[0] - sprite.y)
+        if x1 <= x0 or y1 <= y0:
+            return
+        region = frame[sprite.y + y0:sprite.y + y1, sprite.x + x0:sprite.x + x1]
+        rgb = sprite.rgb[y0:y1, x0:x1]
+        if sprite.alpha is None:
+            region[...] = rgb
+            return
+        # region + alpha * (sprite - region), computed in a float32 scratch slice
+        scratch = self.scratch[:y1 - y0, :x1 - x0]
+        np.subtract(rgb, region, out=scratch, dtype=np.float32)
+        scratch *= sprite.alpha[y0:y1, x0:x1]
+        scratch += region
+        np.copyto(region, scratch, casting="unsafe")
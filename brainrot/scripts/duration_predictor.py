@@ -0,0 +1,233 @@
+# scripts/duration_predictor.py
+#
+# Predicts how long a script will run once voiced and sped up, so scripts that
+# would overshoot a Short are trimmed or dropped before ElevenLabs, alignment and
+# rendering are paid for. The model is per voice and learns from every voiceover:
+#
+#   spoken seconds = (syllables * s + sentence breaks * p + c) / atempo
+#
+# s, p and c are fitted to past voiceovers (measured at their original tempo, so
+# changing the atempo factor doesn't invalidate them).
+
+import os
+import re
+import json
+import datetime
+from pathlib import Path
+
+import pyphen
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+CALIBRATION_JSON = ROOT_DIR / "data" / "duration_calibration.json"
+AUDIO_DIR = ROOT_DIR / "data" / "audio"
+
+TARGET_SECONDS = 90          # Matches the "90-second MAXIMUM" the script prompt asks for
+TRIM_LIMIT = 1.6             # Up to this many times too long, ask for a trim; beyond it, reject
+DEFAULT_ATEMPO = 1.28        # speed_up_audio's factor until a voiceover records the real one
+
+# Before any calibration: a typical narration voice, at original tempo
+DEFAULT_SECONDS_PER_SYLLABLE = 0.22
+DEFAULT_SECONDS_PER_BREAK = 0.35
+DEFAULT_LEAD_SECONDS = 0.5
+DEFAULT_MARGIN_SECONDS = 4.0     # Safety margin while the model is uncalibrated
+
+MIN_FIT_SAMPLES = 8          # Fewer than this only rescales the default model
+MAX_SAMPLES = 300            # Kept per voice, newest first
+MARGIN_SIGMA = 1.3           # Margin = this many residual standard deviations (~90%)
+
+dic = pyphen.Pyphen(lang='en')
+_WORD = re.compile(r"[A-Za-z']+|\d+")
+_BREAK = re.compile(r"[.!?;:]+(?:\s|$)|,\s|\n+")
+
+
+def compose_voiceover_text(title, story):
+    """Title + story exactly as it is voiced and aligned."""
+    return f"{title.strip().rstrip('.')}. {story.strip()}"
+
+def text_features(text):
+    """(syllables, sentence/clause breaks) for a voiceover text."""
+    syllables = 0
+    for word in _WORD.findall(text):
+        if word.isdigit():
+            # Spoken numbers are long: "2019" is "twenty nineteen"
+            syllables += 2 * len(word)
+        else:
+            syllables += dic.inserted(word).count('-') + 1
+    return syllables, len(_BREAK.findall(text))
+
+
+# ─── Model ─────────────────────────────────────────────────────────────────────
+class DurationPredictor:
+    def __init__(self, path=CALIBRATION_JSON):
+        self.path = Path(path)
+        self.data = {"voices": {}, "last": {}}
+        if self.path.exists():
+            try:
+                with open(self.path) as f:
+                    self.data = json.load(f)
+            except json.JSONDecodeError:
+                print(f"[WARN] Could not decode {self.path.name}, using default speaking rates.")
+        self._fits = {}
+
+    # ─── Calibration ───────────────────────────────────────────────────────────
+    def observe(self, voice, text, seconds, atempo, post_id=None):
+        """Records one finished voiceover: `seconds` is the final (sped up) audio length."""
+        syllables, breaks = text_features(text)
+        samples = self.data["voices"].setdefault(voice, {"samples": []})["samples"]
+        samples[:] = [s for s in samples if post_id is None or s.get("id") != post_id]
+        samples.insert(0, {
+            "id": post_id,
+            "syllables": syllables,
+            "breaks": breaks,
+            "raw_seconds": round(seconds * atempo, 3),
+            "observed": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
+        del samples[MAX_SAMPLES:]
+        self.data["last"] = {"voice": voice, "atempo": atempo}
+        self._fits.pop(voice, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def fit(self, voice):
+        """(seconds per syllable, seconds per break, lead seconds, residual std or None)."""
+        if voice in self._fits:
+            return self._fits[voice]
+        samples = self.data["voices"].get(voice, {}).get("samples", [])
+        default = (DEFAULT_SECONDS_PER_SYLLABLE, DEFAULT_SECONDS_PER_BREAK, DEFAULT_LEAD_SECONDS)
+
+        if len(samples) >= MIN_FIT_SAMPLES:
+            import numpy as np
+            X = np.array([[s["syllables"], s["breaks"], 1.0] for s in samples])
+            y = np.array([s["raw_seconds"] for s in samples])
+            coef, *_ = np.linalg.lstsq(X, y, rcond=None)
+            if coef[0] > 0:
+                residuals = y - X @ coef
+                fit = (float(coef[0]), max(0.0, float(coef[1])), float(coef[2]),
+                       float(np.sqrt(np.mean(residuals ** 2))))
+            else:
+                fit = (*default, None)   # Degenerate data (e.g. all the same length)
+        elif samples:
+            # Too few to fit three numbers: keep the default shape, correct its speed
+            ratios = sorted(s["raw_seconds"] / self._raw(s["syllables"], s["breaks"], default) for s in samples)
+            scale = ratios[len(ratios) // 2]
+            fit = (default[0] * scale, default[1] * scale, default[2], None)
+        else:
+            fit = (*default, None)
+        self._fits[voice] = fit
+        return fit
+
+    @staticmethod
+    def _raw(syllables, breaks, fit):
+        return syllables * fit[0] + breaks * fit[1] + fit[2]
+
+    # ─── Prediction ────────────────────────────────────────────────────────────
+    def predict(self, text, voice=None, atempo=None):
+        """
+        Returns (predicted seconds, margin seconds). voice and atempo default to the
+        ones the most recent voiceover used.
+        """
+        voice = voice or self.data["last"].get("voice", "default")
+        atempo = atempo or self.data["last"].get("atempo", DEFAULT_ATEMPO)
+        fit = self.fit(voice)
+        syllables, breaks = text_features(text)
+        seconds = self._raw(syllables, breaks, fit) / atempo
+        margin = MARGIN_SIGMA * fit[3] / atempo if fit[3] is not None else DEFAULT_MARGIN_SECONDS
+        return seconds, margin
+
+    def check(self, text, target=TARGET_SECONDS, voice=None, atempo=None):
+        """
+        "ok", "trim" or "reject", plus details. For "trim", max_words is a word budget
+        that should bring the script under target.
+        """
+        seconds, margin = self.predict(text, voice, atempo)
+        words = len(text.split())
+        verdict = {"seconds": round(seconds, 1), "margin": round(margin, 1), "words": words}
+        if seconds + margin <= target:
+            return "ok", verdict
+        if seconds > target * TRIM_LIMIT:
+            return "reject", verdict
+        verdict["max_words"] = int(words * (target - margin) / seconds)
+        return "trim", verdict
+
+    def report(self, voice=None):
+        voice = voice or self.data["last"].get("voice", "default")
+        samples = self.data["voices"].get(voice, {}).get("samples", [])
+        fit = self.fit(voice)
+        errors = [abs(self._raw(s["syllables"], s["breaks"], fit) - s["raw_seconds"]) for s in samples]
+        return {
+            "voice": voice,
+            "samples": len(samples),
+            "seconds_per_syllable": round(fit[0], 4),
+            "seconds_per_break": round(fit[1], 4),
+            "lead_seconds": round(fit[2], 3),
+            "residual_std": round(fit[3], 3) if fit[3] is not None else None,
+            "mean_abs_error": round(sum(errors) / len(errors), 3) if errors else None,
+        }
+
+
+def load_predictor():
+    return DurationPredictor()
+
+
+# ─── Bootstrapping from past voiceovers ────────────────────────────────────────
+def calibrate_from_history(predictor, voice, atempo=DEFAULT_ATEMPO, audio_dir=AUDIO_DIR):
+    """
+    Learns from voiceovers made before the predictor existed: every data/audio/<id>.mp3
+    whose script is still in the script index. Assumes they all used `voice` and
+    `atempo`. Uses the mp3 length, which is what the video length is cut to, or the
+    last aligned word if librosa isn't available.
+    """
+    from script_index import load_script_index
+
+    try:
+        import librosa
+    except ImportError:
+        librosa = None
+
+    index = load_script_index()
+    added = 0
+    for timings_path in sorted(Path(audio_dir).glob("*.json")):
+        entry = index.get(timings_path.stem)
+        mp3 = timings_path.with_suffix(".mp3")
+        if not entry or not mp3.exists():
+            continue
+        if librosa is not None:
+            seconds = librosa.get_duration(path=str(mp3))
+        else:
+            with open(timings_path) as f:
+                words = [w for w in json.load(f) if "end" in w]
+            if not words:
+                continue
+            seconds = words[-1]["end"]
+        predictor.observe(voice, compose_voiceover_text(entry["title"], entry["script"]), seconds, atempo,
+                          post_id=entry["id"])
+        added += 1
+    return added
+
+
+if __name__ == "__main__":
+    import sys
+
+    predictor = load_predictor()
+    command = sys.argv[1] if len(sys.argv) > 1 else "report"
+    if command == "calibrate":
+        if len(sys.argv) > 2:
+            voice = sys.argv[2]
+        else:
+            from text_to_speech import current_voice
+            voice = current_voice()
+        added = calibrate_from_history(predictor, voice)
+        predictor.save()
+        print(f"[INFO] Calibrated '{voice}' from {added} past voiceover(s)")
+        print(predictor.report(voice))
+    elif command == "predict":
+        text = " ".join(sys.argv[2:]) or sys.stdin.read()
+        print(predictor.check(text))
+    else:
+        print(predictor.report())
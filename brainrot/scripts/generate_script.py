@@ -2,22 +2,181 @@
 
 import os
 import json
+import random
+import datetime
 import openai
 import time
 
+from duration_predictor import TARGET_SECONDS, compose_voiceover_text, load_predictor
+
 # ─── Configuration ─────────────────────────────────────────────────────────────
 ROOT_DIR     = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 POSTS_DIR    = os.path.join(ROOT_DIR, "data", 'posts')
 SCRIPTS_DIR  = os.path.join(ROOT_DIR, "data", 'scripts')
 MAX_POSTS    = 50  # Max stories to process per run
+CASCADE_LOG  = os.path.join(ROOT_DIR, "data", "cascade_runs.jsonl")
+
+# Two-tier cascade: a few-token KEEP/REJECT triage call first, and the full
+# rewrite only for stories it keeps. A sample of triage rejects still goes to the
+# full prompt so the log can say how often the two agree.
+USE_CASCADE       = os.getenv("LLM_CASCADE", "1") != "0"
+TRIAGE_MODEL      = os.getenv("TRIAGE_MODEL", "gpt-4o-mini")
+REWRITE_MODEL     = "gpt-4o-mini"
+TRIAGE_MAX_TOKENS = 3
+TRIAGE_AUDIT_RATE = 0.1
+
+# Send completions to a local stand-in (see llm_standin.py) instead of OpenAI,
+# e.g. LLM_ENDPOINT=http://127.0.0.1:8767/v1
+LLM_ENDPOINT = os.getenv("LLM_ENDPOINT")
+if LLM_ENDPOINT:
+    openai.base_url = LLM_ENDPOINT.rstrip("/") + "/"
+    openai.api_key = openai.api_key or "standin"
 
 # openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# ─── Cascade Stats ─────────────────────────────────────────────────────────────
+class CascadeStats:
+    """Calls, latency and tokens per stage, and how often triage agrees with the full prompt."""
+
+    def __init__(self):
+        self.stages = {stage: {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0}
+                       for stage in ("triage", "rewrite")}
+        # What full rewrites that came back "False" cost: what each skipped story would have
+        self.rejects = {"calls": 0, "seconds": 0.0, "tokens": 0}
+        self.kept = self.rejected = self.skipped = 0
+        # Every triage keep is checked by its rewrite, but only the audited share
+        # (TRIAGE_AUDIT_RATE) of rejects is, so the two are counted apart
+        self.keeps_compared = self.keeps_agreed = 0
+        self.rejects_audited = self.false_rejects = 0     # Audited rejects the full prompt would have kept
+
+    def record(self, stage, seconds, usage, rejected=False):
+        totals = self.stages[stage]
+        totals["calls"] += 1
+        totals["seconds"] += seconds
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        if rejected:
+            self.rejects["calls"] += 1
+            self.rejects["seconds"] += seconds
+            self.rejects["tokens"] += prompt_tokens + completion_tokens
+
+    def compare(self, triage_keep, rewrite_keep):
+        if triage_keep:
+            self.keeps_compared += 1
+            self.keeps_agreed += rewrite_keep
+        else:
+            self.rejects_audited += 1
+            self.false_rejects += rewrite_keep
+
+    def agreement(self):
+        """
+        (on keeps, on audited rejects, overall). Overall weights each audited
+        reject by 1 / TRIAGE_AUDIT_RATE, the rejects it stands in for.
+        """
+        on_keeps = self.keeps_agreed / self.keeps_compared if self.keeps_compared else None
+        on_rejects = 1 - self.false_rejects / self.rejects_audited if self.rejects_audited else None
+        weight = 1 / TRIAGE_AUDIT_RATE if TRIAGE_AUDIT_RATE else 0
+        total = self.keeps_compared + self.rejects_audited * weight
+        agreed = self.keeps_agreed + (self.rejects_audited - self.false_rejects) * weight
+        return on_keeps, on_rejects, (agreed / total if total else None)
+
+    def summary(self):
+        triage = self.stages["triage"]
+        # A skipped story would have cost what the full prompt's rejects cost on
+        # average; until one has been seen there is nothing to base savings on
+        sample = self.rejects
+        saved_seconds = saved_tokens = None
+        if sample["calls"]:
+            saved_seconds = round(self.skipped * sample["seconds"] / sample["calls"] - triage["seconds"], 2)
+            saved_tokens = round(self.skipped * sample["tokens"] / sample["calls"]
+                                 - triage["prompt_tokens"] - triage["completion_tokens"])
+        on_keeps, on_rejects, overall = self.agreement()
+        return {
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "triage_model": TRIAGE_MODEL,
+            "rewrite_model": REWRITE_MODEL,
+            "stages": {stage: {**totals, "seconds": round(totals["seconds"], 2)}
+                       for stage, totals in self.stages.items()},
+            "triage_kept": self.kept,
+            "triage_rejected": self.rejected,
+            "skipped_rewrites": self.skipped,
+            "compared": self.keeps_compared + self.rejects_audited,
+            "keeps_compared": self.keeps_compared,
+            "rejects_audited": self.rejects_audited,
+            "keep_agreement": round(on_keeps, 3) if on_keeps is not None else None,
+            "reject_agreement": round(on_rejects, 3) if on_rejects is not None else None,
+            "agreement": round(overall, 3) if overall is not None else None,
+            "false_rejects": self.false_rejects,
+            "saved_seconds": saved_seconds,
+            "saved_tokens": saved_tokens,
+        }
+
+    def log(self, path=CASCADE_LOG):
+        summary = self.summary()
+
+        def percent(key):
+            return f"{summary[key]:.0%}" if summary[key] is not None else "n/a"
+
+        saved = (f"saved ~{summary['saved_seconds']}s and ~{summary['saved_tokens']} tokens"
+                 if summary["saved_seconds"] is not None else "savings n/a (no rejected rewrite seen yet)")
+        print(f"[CASCADE] triage kept {self.kept}, rejected {self.rejected} "
+              f"({self.skipped} rewrites skipped); agreement {percent('agreement')} "
+              f"(keeps {percent('keep_agreement')} over {self.keeps_compared}, "
+              f"rejects {percent('reject_agreement')} over {self.rejects_audited} audited, "
+              f"{self.false_rejects} false rejects); {saved}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+        return summary
+
 # ─── GPT Helper ────────────────────────────────────────────────────────────────
-def gpt_rewrite_story(selftext: str) -> str:
+def _complete(stage, stats, **request):
+    """One chat completion; its latency and token usage go to stats (if given)."""
+    started = time.perf_counter()
+    response = openai.chat.completions.create(**request)
+    result = response.choices[0].message.content.strip()
+    if stats is not None:
+        stats.record(stage, time.perf_counter() - started, getattr(response, "usage", None),
+                     rejected=stage == "rewrite" and result == "False")
+    return result
+
+def gpt_triage_story(selftext: str, stats=None):
+    """True to keep, False to reject, or None if triage failed or answered something else."""
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o-mini",
+        result = _complete(
+            "triage", stats,
+            model=TRIAGE_MODEL,
+            messages=[
+                {"role": "system", "content": (
+                    "You screen Reddit stories for 90-second YouTube Shorts. Keep a story only if it grabs "
+                    "attention within 5 seconds, has escalating drama or tension, and ends in a twist, laugh or "
+                    "emotionally satisfying payoff. Reject slow setups, weak tension (food fails, awkward "
+                    "moments), vents, essays and slice-of-life without payoff. Be ruthless. "
+                    "Answer with exactly one word: KEEP or REJECT."
+                )},
+                {"role": "user", "content": selftext}
+            ],
+            temperature=0,
+            max_tokens=TRIAGE_MAX_TOKENS
+        )
+    except Exception as e:
+        print(f"[ERROR] GPT triage failed: {e}")
+        return None
+    answer = result.upper()
+    if answer.startswith("KEEP"):
+        return True
+    if answer.startswith("REJECT"):
+        return False
+    print(f"[WARN] Unexpected triage answer {result!r}")
+    return None
+
+def gpt_rewrite_story(selftext: str, stats=None) -> str:
+    try:
+        return _complete(
+            "rewrite", stats,
+            model=REWRITE_MODEL,
             messages=[
                 {"role": "system", "content": (
                     "You are a critical editor for a YouTube Shorts script pipeline. You are given Reddit stories and "
@@ -50,90 +209,171 @@ def gpt_rewrite_story(selftext: str) -> str:
             temperature=0.6,
             max_tokens=450
         )
-        result = response.choices[0].message.content.strip()
-        return result
     except Exception as e:
         print(f"[ERROR] GPT call failed: {e}")
         return "False"
 
+def evaluate_story(selftext: str, stats=None) -> str:
+    """
+    The rewrite reply for a story, or "False". With USE_CASCADE, triage answers
+    first and only kept stories get the full rewrite; if triage fails the full
+    prompt decides alone. An audit sample of rejects is rewritten too, but only to
+    measure triage's false rejects: the story stays rejected.
+    """
+    if not USE_CASCADE:
+        return gpt_rewrite_story(selftext, stats)
+
+    keep = gpt_triage_story(selftext, stats)
+    if stats is not None and keep is not None:
+        stats.kept += keep
+        stats.rejected += not keep
+    if keep is False and random.random() >= TRIAGE_AUDIT_RATE:
+        if stats is not None:
+            stats.skipped += 1
+        return "False"
+
+    rewrites = stats.stages["rewrite"]["calls"] if stats is not None else 0
+    result = gpt_rewrite_story(selftext, stats)
+    # Only grade triage against replies that actually came back
+    if stats is not None and keep is not None and stats.stages["rewrite"]["calls"] > rewrites:
+        stats.compare(keep, result != "False")
+    # The audit must not change which stories get produced
+    return "False" if keep is False else result
+
+def gpt_trim_story(story: str, max_words: int) -> str:
+    try:
+        response = openai.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": (
+                    f"You are editing a YouTube Shorts script that runs too long. Cut it to at most {max_words} "
+                    "words. Keep the hook, the escalation and the ending twist or payoff, and keep the author's "
+                    "voice. Cut side details and repetition first. Do not add anything new. Reply with only the "
+                    "shortened story, no title, labels or commentary."
+                )},
+                {"role": "user", "content": story}
+            ],
+            temperature=0.3,
+            max_tokens=450
+        )
+        trimmed = response.choices[0].message.content.strip()
+        if trimmed.lower().startswith("story:"):
+            trimmed = trimmed[len("story:"):].strip()
+        return trimmed
+    except Exception as e:
+        print(f"[ERROR] GPT trim failed: {e}")
+        return None
+
+def parse_script_result(result: str, post: dict):
+    """Turns an accepted 'Title: / Story: / Tags:' reply into a script entry, or None if malformed."""
+    lines = result.splitlines()
+    title_line = next((l for l in lines if l.lower().startswith("title:")), None)
+    tags_line = next((l for l in lines if l.lower().startswith("tags:")), None)
+    # Extract only the story content, excluding the tags
+    if "Story:" in result and "Tags:" in result:
+        story_raw = result.split("Story:", 1)[-1]
+        story = story_raw.split("Tags:", 1)[0].strip()
+    else:
+        story = None
+
+    if not (title_line and story and tags_line):
+        return None
+
+    title = title_line.replace("Title:", "").strip()
+    tags_raw = tags_line.replace("Tags:", "").strip()
+    tags = [t.strip() for t in tags_raw.strip("()").split("), (")]
+
+    return {
+        "id": post["id"],
+        "subreddit": post["subreddit"],
+        "title": title,
+        "script": story,
+        "tags": tags
+    }
+
+def fit_script_to_length(entry, predictor, target=TARGET_SECONDS):
+    """
+    Checks the predicted voiced length of a script entry. Scripts that run a little
+    long are sent back to GPT once for trimming; returns the (possibly trimmed) entry,
+    or None if it still won't fit.
+    """
+    verdict, info = predictor.check(compose_voiceover_text(entry["title"], entry["script"]), target)
+    if verdict == "trim":
+        story_budget = info["max_words"] - len(entry["title"].split())
+        print(f"[TRIM] Predicted {info['seconds']}s (±{info['margin']}s), asking for ≤{story_budget} words")
+        trimmed = gpt_trim_story(entry["script"], story_budget)
+        if trimmed:
+            entry = {**entry, "script": trimmed}
+            verdict, info = predictor.check(compose_voiceover_text(entry["title"], entry["script"]), target)
+
+    if verdict != "ok":
+        print(f"[Skipped] Predicted {info['seconds']}s (±{info['margin']}s), over the {target}s limit.")
+        return None
+    entry["predicted_seconds"] = info["seconds"]
+    return entry
+
 # ─── Main Script Generator ─────────────────────────────────────────────────────
-def generate_scripts():
+def generate_scripts_from_file(filename, max_scripts=MAX_POSTS):
+    """Evaluates every post in one posts_*.json file and writes the matching scripts_*.json."""
     os.makedirs(SCRIPTS_DIR, exist_ok=True)
 
+    with open(os.path.join(POSTS_DIR, filename), 'r') as f:
+        posts = json.load(f)
+
+    predictor = load_predictor()
+    stats = CascadeStats()
     scripts_written = 0
+    output_scripts = []
+    for post in posts:
+        if scripts_written >= max_scripts:
+            break
+
+        story = post.get("selftext", "").strip()
+        if len(story) < 20:
+            continue  # Skip short stories
+
+        print(f"\n[Evaluating] Post {post['id']} from r/{post['subreddit']}...")
+        result = evaluate_story(story, stats)
+
+        if result == "False":
+            print("False")
+            print("[Skipped] Not suitable for Shorts.")
+            continue
+
+        entry = parse_script_result(result, post)
+        if not entry:
+            print("[WARN] Invalid GPT format. Skipping.")
+        else:
+            # Catch scripts that would overrun before anything is paid for voicing them
+            entry = fit_script_to_length(entry, predictor)
+            if entry:
+                output_scripts.append(entry)
+                print(f"[Accepted] Script added (~{entry['predicted_seconds']}s).")
+        scripts_written += 1
+        time.sleep(1.5)  # small delay to avoid rate limits
+
+    stats.log()
 
+    if output_scripts:
+        out_path = os.path.join(SCRIPTS_DIR, filename.replace('posts_', 'scripts_'))
+        with open(out_path, 'w') as f:
+            json.dump(output_scripts, f, indent=4)
+        print(f"[Saved] {len(output_scripts)} script(s) to {out_path}")
+
+    return scripts_written
+
+def generate_scripts():
     post_files = sorted(
         [f for f in os.listdir(POSTS_DIR) if f.startswith('posts_') and f.endswith('.json')],
         reverse=True
     )
 
     # Process only the most recent file
-    if post_files:
-        post_files = [post_files[0]]
-    else:
+    if not post_files:
         print("[ERROR] No post files found.")
         exit()
 
-    for filename in post_files:
-        if not (filename.startswith('posts_') and filename.endswith('.json')):
-            continue
-
-        with open(os.path.join(POSTS_DIR, filename), 'r') as f:
-            posts = json.load(f)
-
-        output_scripts = []
-        for post in posts:
-            if scripts_written >= MAX_POSTS:
-                break
-
-            story = post.get("selftext", "").strip()
-            if len(story) < 20:
-                continue  # Skip short stories
-
-            print(f"\n[Evaluating] Post {post['id']} from r/{post['subreddit']}...")
-            result = gpt_rewrite_story(story)
-
-            if result == "False":
-                print("False")
-                print("[Skipped] Not suitable for Shorts.")
-                continue
-
-            print("[Accepted] Script added.")
-            lines = result.splitlines()
-            title_line = next((l for l in lines if l.lower().startswith("title:")), None)
-            tags_line = next((l for l in lines if l.lower().startswith("tags:")), None)
-            # Extract only the story content, excluding the tags
-            if "Story:" in result and "Tags:" in result:
-                story_raw = result.split("Story:", 1)[-1]
-                story = story_raw.split("Tags:", 1)[0].strip()
-            else:
-                story = None
-
-            if title_line and story and tags_line:
-                title = title_line.replace("Title:", "").strip()
-                tags_raw = tags_line.replace("Tags:", "").strip()
-                tags = [t.strip() for t in tags_raw.strip("()").split("), (")]
-
-                output_scripts.append({
-                    "id": post["id"],
-                    "subreddit": post["subreddit"],
-                    "title": title,
-                    "script": story,
-                    "tags": tags
-                })
-            else:
-                print("[WARN] Invalid GPT format. Skipping.")
-            scripts_written += 1
-            time.sleep(1.5)  # small delay to avoid rate limits
-
-        if output_scripts:
-            out_path = os.path.join(SCRIPTS_DIR, filename.replace('posts_', 'scripts_'))
-            with open(out_path, 'w') as f:
-                json.dump(output_scripts, f, indent=4)
-            print(f"[Saved] {len(output_scripts)} script(s) to {out_path}")
-
-        if scripts_written >= MAX_POSTS:
-            break
+    generate_scripts_from_file(post_files[0])
 
 if __name__ == "__main__":
     generate_scripts()
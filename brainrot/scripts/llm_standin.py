@@ -0,0 +1,174 @@
+# scripts/llm_standin.py
+
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# ─── Defaults ──────────────────────────────────────────────────────────────────
+HOST = "127.0.0.1"
+PORT = 8767        # worker_daemon serves its status page on 8766
+COMPLETIONS_PATH = "/v1/chat/completions"
+CHARS_PER_TOKEN = 4
+STORY_WORDS = 180        # Length of the "rewritten" story in an accepted reply
+
+
+def count_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class LLMStandIn(ThreadingHTTPServer):
+    """
+    Local stand-in for the OpenAI chat completions endpoint, shaped for
+    generate_script's prompts.
+
+    POST  /v1/chat/completions  -> chat.completion with usage
+
+    Each story gets one hidden verdict (keep with probability keep_rate, derived
+    from a hash of its text, so it is the same on every call). The full rewrite
+    prompt answers with that verdict: a Title/Story/Tags script, or "False". The
+    triage prompt (the system prompt asks for KEEP or REJECT) answers KEEP or
+    REJECT, flipped with probability triage_error_rate. The trim prompt gets the
+    story cut to its word budget.
+
+    latency             seconds before the first token
+    seconds_per_token   seconds per output token, so long replies cost time as they do upstream
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host=HOST, port=PORT, keep_rate=0.3, triage_error_rate=0.05, latency=0.0,
+                 seconds_per_token=0.0, seed=None):
+        super().__init__((host, port), _Handler)
+        self.keep_rate = keep_rate
+        self.triage_error_rate = triage_error_rate
+        self.latency = latency
+        self.seconds_per_token = seconds_per_token
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "triage": 0, "rewrite": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, **counts):
+        with self.lock:
+            for key, n in counts.items():
+                self.stats[key] += n
+
+    def keeps(self, story):
+        """The story's hidden verdict."""
+        digest = hashlib.sha256(f"{self.seed}:{story}".encode()).digest()
+        return int.from_bytes(digest[:8], "big") / 2 ** 64 < self.keep_rate
+
+    def triage_errs(self):
+        with self.lock:
+            return self.triage_error_rate > 0 and self.random.random() < self.triage_error_rate
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, message):
+        self._reply(status, {"error": {"message": message, "type": "invalid_request_error", "code": None}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return self._error(400, "Body is not JSON")
+        if urlsplit(self.path).path != COMPLETIONS_PATH:
+            return self._error(404, f"Unknown path {self.path}")
+
+        messages = request.get("messages") or []
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        story = messages[-1]["content"] if messages else ""
+        max_tokens = request.get("max_tokens") or 4096
+        server = self.server
+
+        if "KEEP or REJECT" in system:
+            keep = server.keeps(story) != server.triage_errs()
+            content = "KEEP" if keep else "REJECT"
+            server.count(triage=1)
+        elif (budget := re.search(r"at most (\d+) words", system)):
+            # gpt_trim_story: the first words that fit
+            content = " ".join(story.split()[:int(budget.group(1))])
+            server.count(rewrite=1)
+        else:
+            if server.keeps(story):
+                words = story.split()
+                content = (f"Title: {' '.join(words[:8])}\n"
+                           f"Story: {' '.join(words[:STORY_WORDS])}\n"
+                           f"Tags: (revenge), (twist), (justice served), (neighbours), (keys), (rent)")
+            else:
+                content = "False"
+            server.count(rewrite=1)
+
+        completion_tokens = count_tokens(content)
+        if completion_tokens > max_tokens:
+            content = content[:max_tokens * CHARS_PER_TOKEN]
+            completion_tokens = max_tokens
+        prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+        server.count(requests=1, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        time.sleep(server.latency + completion_tokens * server.seconds_per_token)
+
+        self._reply(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "standin"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                         "finish_reason": "stop" if completion_tokens < max_tokens else "length"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat completions endpoint")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--keep-rate", type=float, default=0.3, help="share of stories the rewrite accepts")
+    parser.add_argument("--triage-error-rate", type=float, default=0.05, help="chance triage gets it wrong")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--seconds-per-token", type=float, default=0.01, help="seconds per output token")
+    args = parser.parse_args()
+
+    server = LLMStandIn(port=args.port, keep_rate=args.keep_rate, triage_error_rate=args.triage_error_rate,
+                        latency=args.latency, seconds_per_token=args.seconds_per_token)
+    print(f"[INFO] LLM stand-in listening on {server.url}")
+    print(f"[INFO] Point generate_script at it with LLM_ENDPOINT={server.url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,332 @@
+# scripts/onnx_alignment.py
+#
+# CPU alignment backend. WhisperX runs its wav2vec2 alignment model through torch
+# in float32, which on the GPU-less render boxes is the slowest part of the TTS
+# stage. Here the same model is exported once to ONNX with its matrix multiplies
+# quantized to int8, and run under onnxruntime with thread counts split between
+# the chunks aligned at once. The CTC forced alignment on its emissions is done in
+# numpy, so a box that aligns this way needs neither torch nor WhisperX. Output is
+# the same word list WhisperX produces: [{"word", "start", "end", "score"}, ...].
+
+import os
+import sys
+import json
+import time
+import tempfile
+import importlib.util
+from pathlib import Path
+
+import numpy as np
+
+from alignment import ALIGN_WORKERS, AUDIO_DIR, SAMPLE_RATE, _wav_for, chunked_alignment
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODEL_DIR = ROOT_DIR / "data" / "models"
+RESULTS_DIR = ROOT_DIR / "data" / "benchmarks"
+MODEL_NAME = "wav2vec2_align"
+LANGUAGE = "en"
+OPSET = 17
+
+# Each of the ALIGN_WORKERS chunks in flight gets an equal share of the cores. Idle
+# onnxruntime threads spin waiting for work by default, which only pays off when
+# one session has the machine to itself.
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0")) or max(1, (os.cpu_count() or 1) // ALIGN_WORKERS)
+ONNX_SPIN = ALIGN_WORKERS == 1
+
+
+def model_paths(model_dir=MODEL_DIR, quantized=True):
+    """(model .onnx, metadata .json) paths for the exported alignment model."""
+    model_dir = Path(model_dir)
+    suffix = ".int8.onnx" if quantized else ".onnx"
+    return model_dir / f"{MODEL_NAME}{suffix}", model_dir / f"{MODEL_NAME}.json"
+
+def onnx_available(model_dir=MODEL_DIR):
+    """True if the int8 model has been exported and onnxruntime is installed."""
+    model_path, meta_path = model_paths(model_dir)
+    return model_path.exists() and meta_path.exists() and importlib.util.find_spec("onnxruntime") is not None
+
+
+# ─── Export ────────────────────────────────────────────────────────────────────
+def export_model(model_dir=MODEL_DIR, language=LANGUAGE):
+    """
+    Exports WhisperX's alignment model for `language` to ONNX (float32 and int8).
+    Needs torch, WhisperX and onnxruntime, but only on the machine that exports.
+
+    Only MatMul/Gemm are quantized: they are nearly all of the transformer's cost,
+    while int8 convolutions in the feature extractor blur the frame boundaries the
+    word timings come from.
+    """
+    import torch
+    import whisperx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path, meta_path = model_paths(model_dir, quantized=False)
+    int8_path, _ = model_paths(model_dir)
+
+    model, metadata = whisperx.load_align_model(language_code=language, device="cpu")
+
+    class Emissions(torch.nn.Module):
+        """Waveform (1, samples) -> logits (1, frames, vocab), for torchaudio and HF models alike."""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, waveform):
+            out = self.model(waveform)
+            return out.logits if hasattr(out, "logits") else out[0]
+
+    with torch.inference_mode():
+        torch.onnx.export(Emissions(model).eval(), torch.zeros(1, SAMPLE_RATE * 2), str(fp32_path),
+                          input_names=["waveform"], output_names=["logits"],
+                          dynamic_axes={"waveform": {1: "samples"}, "logits": {1: "frames"}},
+                          opset_version=OPSET)
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8,
+                     op_types_to_quantize=["MatMul", "Gemm"])
+
+    dictionary = metadata["dictionary"]
+    # Same rule as whisperx.align: HF vocabularies name their blank, torchaudio's is 0
+    blank_id = next((code for char, code in dictionary.items() if char in ("[pad]", "<pad>")), 0)
+    with open(meta_path, "w") as f:
+        json.dump({"language": language, "type": metadata.get("type"), "blank_id": blank_id,
+                   "dictionary": dictionary}, f, indent=2)
+
+    print(f"[Saved] {fp32_path.name} ({fp32_path.stat().st_size / 1e6:.0f} MB), "
+          f"{int8_path.name} ({int8_path.stat().st_size / 1e6:.0f} MB)")
+    return int8_path
+
+
+# ─── Forced alignment ──────────────────────────────────────────────────────────
+def log_softmax(logits):
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=-1, keepdims=True))
+
+def tokenize(text, dictionary):
+    """
+    (words, tokens, spans): the text's words, the token ids of their characters with
+    "|" between words, and each word's [first, last) range in tokens. Characters the
+    model has no token for (digits, most punctuation) are left out, as in WhisperX.
+    """
+    separator = dictionary.get("|")
+    words, tokens, spans = text.split(), [], []
+    for word in words:
+        if separator is not None and tokens and tokens[-1] != separator:
+            tokens.append(separator)
+        first = len(tokens)
+        tokens.extend(dictionary[c] for c in word.lower() if c in dictionary)
+        spans.append((first, len(tokens)))
+    return words, tokens, spans
+
+def force_align(emission, tokens, blank_id):
+    """
+    Viterbi path of `tokens` through the (frames, vocab) log-probabilities. Every
+    frame either moves on to the next token or holds the current one, as a blank or
+    a repeat. Returns (first frame, last frame, mean probability) per token, or
+    None if the tokens don't fit in the frames.
+    """
+    frames, n = len(emission), len(tokens)
+    if n == 0 or frames < n:
+        return None
+    emit = emission[:, tokens]                               # (frames, n)
+    blank = emission[:, blank_id]
+    hold = np.concatenate([blank[:, None], np.maximum(blank[:, None], emit)], axis=1)
+
+    # score[j]: best path so far with tokens[:j] emitted
+    score = np.full(n + 1, -np.inf)
+    score[0] = 0.0
+    moved = np.zeros((frames, n + 1), dtype=bool)
+    move = np.full(n + 1, -np.inf)
+    for t in range(frames):
+        stay = score + hold[t]
+        move[1:] = score[:-1] + emit[t]
+        moved[t] = move > stay
+        score = np.where(moved[t], move, stay)
+    if not np.isfinite(score[n]):
+        return None
+
+    first = np.zeros(n, dtype=int)
+    last = np.full(n, -1)
+    prob_sum = np.zeros(n)
+    prob_count = np.zeros(n)
+    j = n
+    for t in range(frames - 1, -1, -1):
+        if j == 0:
+            break
+        k = j - 1
+        emitted = moved[t, j] or emit[t, k] > blank[t]
+        if emitted:
+            if last[k] < 0:
+                last[k] = t
+            prob_sum[k] += np.exp(emit[t, k])
+            prob_count[k] += 1
+        if moved[t, j]:
+            first[k] = t
+            j -= 1
+    return first, last, prob_sum / np.maximum(prob_count, 1)
+
+
+# ─── Runtime ───────────────────────────────────────────────────────────────────
+class OnnxAligner:
+    """An onnxruntime session for the exported model plus its character dictionary."""
+
+    def __init__(self, model_dir=MODEL_DIR, quantized=True, threads=ONNX_THREADS, spin=ONNX_SPIN):
+        import onnxruntime as ort
+
+        model_path, meta_path = model_paths(model_dir, quantized)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.dictionary = meta["dictionary"]
+        self.blank_id = meta["blank_id"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.add_session_config_entry("session.intra_op.allow_spinning", "1" if spin else "0")
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.name = model_path.name
+
+    def emissions(self, waveform):
+        logits = self.session.run(None, {"waveform": waveform[None, :].astype(np.float32)})[0][0]
+        return log_softmax(logits)
+
+    def align_segment(self, segment, samples):
+        """WhisperX-style word segments for one {"text", "start", "end"} window of samples."""
+        start, end = segment["start"], segment["end"]
+        waveform = samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        words, tokens, spans = tokenize(segment["text"], self.dictionary)
+        emission = self.emissions(waveform)
+        path = force_align(emission, tokens, self.blank_id)
+        if path is None:
+            return [{"word": w} for w in words]
+
+        first, last, probs = path
+        ratio = (len(waveform) / SAMPLE_RATE) / len(emission)
+        out = []
+        for word, (lo, hi) in zip(words, spans):
+            if lo == hi:
+                out.append({"word": word})
+                continue
+            out.append({"word": word,
+                        "start": round(start + first[lo] * ratio, 3),
+                        "end": round(start + (last[hi - 1] + 1) * ratio, 3),
+                        "score": round(float(probs[lo:hi].mean()), 3)})
+        return out
+
+    def align(self, wav_path, text, workers=ALIGN_WORKERS):
+        return chunked_alignment(wav_path, text, self.align_segment, workers=workers)
+
+
+# One session per model file: loading it costs more than aligning a short
+_SESSIONS = {}
+
+def get_onnx_aligner(model_dir=MODEL_DIR, quantized=True):
+    key = (str(model_dir), quantized)
+    if key not in _SESSIONS:
+        _SESSIONS[key] = OnnxAligner(model_dir, quantized)
+    return _SESSIONS[key]
+
+def onnx_alignment(wav_path, original_text):
+    """Int8 ONNX forced alignment of the known text, sentence by sentence (see alignment.py)."""
+    aligner = get_onnx_aligner()
+    print(f"[INFO] ONNX aligning using WAV: {wav_path} ({aligner.name}, {ONNX_THREADS} thread(s) per chunk)")
+    return aligner.align(wav_path, original_text)
+
+
+# ─── Accuracy / speed comparison ───────────────────────────────────────────────
+def _start_errors(reference, estimate):
+    return [abs(ref["start"] - est["start"]) for ref, est in zip(reference, estimate)
+            if "start" in ref and "start" in est]
+
+def _summary(errors, seconds, items, words):
+    if not items:
+        return {"items": 0}
+    errors = np.array(errors) if errors else np.zeros(0)
+    summary = {"items": items, "ms_per_item": round(seconds / items * 1000, 1),
+               "timed_words": round(len(errors) / max(words, 1), 3)}
+    if len(errors):
+        summary.update({
+            "mean_start_error_ms": round(float(errors.mean()) * 1000, 1),
+            "median_start_error_ms": round(float(np.median(errors)) * 1000, 1),
+            "p90_start_error_ms": round(float(np.percentile(errors, 90)) * 1000, 1),
+            "within_50ms": round(float((errors <= 0.05).mean()), 3),
+            "within_100ms": round(float((errors <= 0.1).mean()), 3),
+        })
+    return summary
+
+def compare_backends(audio_dir=None, limit=None, model_dir=MODEL_DIR):
+    """
+    Aligns every WhisperX-timed voiceover in audio_dir (the fixture set: <id>.mp3 plus
+    the <id>.json WhisperX wrote for it) with the float32 and int8 ONNX models and,
+    if it is installed, with WhisperX itself on CPU. Word starts are graded against
+    the live WhisperX run, or against the stored JSON when WhisperX isn't installed.
+    """
+    backends = {}
+    if importlib.util.find_spec("whisperx") is not None:
+        import whisperx
+
+        model, metadata = whisperx.load_align_model(language_code=LANGUAGE, device="cpu")
+        backends["whisperx_cpu_fp32"] = lambda wav, text: chunked_alignment(
+            wav, text, lambda seg, samples: whisperx.align([seg], model, metadata, samples, "cpu")
+            .get("word_segments", []))
+    for label, quantized in (("onnx_fp32", False), ("onnx_int8", True)):
+        if model_paths(model_dir, quantized)[0].exists():
+            backends[label] = get_onnx_aligner(model_dir, quantized).align
+    if not any(label.startswith("onnx") for label in backends):
+        raise FileNotFoundError(f"No exported model in {model_dir}: run `python3 onnx_alignment.py export` first")
+
+    totals = {label: {"errors": [], "seconds": 0.0, "items": 0, "words": 0} for label in backends}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for json_path in sorted(Path(audio_dir or AUDIO_DIR).glob("*.json"))[:limit]:
+            mp3_path = json_path.with_suffix(".mp3")
+            with open(json_path) as f:
+                stored = json.load(f)
+            # Heuristic output has no scores and is no reference
+            if not mp3_path.exists() or not any("score" in w for w in stored):
+                continue
+            text = " ".join(w["word"] for w in stored)
+            wav_path = _wav_for(mp3_path, tmp_dir)
+
+            outputs = {}
+            for label, align in backends.items():
+                started = time.perf_counter()
+                outputs[label] = align(wav_path, text)
+                totals[label]["seconds"] += time.perf_counter() - started
+            reference = outputs.get("whisperx_cpu_fp32", stored)
+            for label, words in outputs.items():
+                totals[label]["items"] += 1
+                totals[label]["words"] += len(words)
+                if words is not reference:
+                    totals[label]["errors"].extend(_start_errors(reference, words))
+
+    results = {label: _summary(**t) for label, t in totals.items()}
+    baseline = results.get("whisperx_cpu_fp32", {}).get("ms_per_item")
+    for summary in results.values():
+        if baseline and summary.get("ms_per_item"):
+            summary["speedup"] = round(baseline / summary["ms_per_item"], 2)
+    return {"reference": "whisperx_cpu_fp32" if "whisperx_cpu_fp32" in backends else "stored_json",
+            "threads": ONNX_THREADS, "workers": ALIGN_WORKERS, "backends": results}
+
+
+if __name__ == "__main__":
+    # python3 onnx_alignment.py export
+    # python3 onnx_alignment.py compare [audio_dir] [limit]
+    command = sys.argv[1] if len(sys.argv) > 1 else "compare"
+    if command == "export":
+        export_model()
+    elif command == "compare":
+        audio_dir = sys.argv[2] if len(sys.argv) > 2 else None
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        results = compare_backends(audio_dir, limit)
+        print(json.dumps(results, indent=2))
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        out = RESULTS_DIR / f"alignment_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        with open(out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"[Saved] {out}")
+    else:
+        print(f"[ERROR] Unknown command '{command}', expected export or compare")
@@ -0,0 +1,142 @@
+# scripts/quota_ledger.py
+
+import os
+import json
+import datetime
+import threading
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+# ─── Defaults ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+QUOTA_JSON = ROOT_DIR / "data" / "quota.json"
+DEFAULT_PROJECT = "default"
+DEFAULT_DAILY_QUOTA = 10_000     # Units per Google Cloud project per day
+INSERT_COST = 1_600              # videos.insert, whatever the file size
+KEEP_DAYS = 7                    # Days of history kept in quota.json
+
+# The Data API quota resets at midnight Pacific time
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+# Reasons YouTube gives (HTTP 403) when the project is out of quota for the day
+QUOTA_ERROR_REASONS = ("quotaExceeded", "dailyLimitExceeded")
+# Too many requests too fast; goes away after a backoff
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# The channel (not the project) has hit its own daily upload cap
+UPLOAD_LIMIT_REASONS = ("uploadLimitExceeded",)
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+class UploadLimitReached(Exception):
+    pass
+
+
+def quota_day(now=None):
+    """The quota window (Pacific date) that `now` (default: current time) falls in."""
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    if now.tzinfo is None:
+        now = now.astimezone()
+    return now.astimezone(QUOTA_TZ).date()
+
+def next_window(now=None):
+    """Local naive datetime at which the next quota window opens."""
+    midnight = datetime.datetime.combine(quota_day(now) + datetime.timedelta(days=1), datetime.time(), QUOTA_TZ)
+    return midnight.astimezone().replace(tzinfo=None)
+
+def error_reasons(error):
+    """The "reason" strings of a 403/429 HttpError, or an empty set for anything else."""
+    if getattr(error, "resp", None) is None or error.resp.status not in (403, 429):
+        return set()
+    try:
+        details = json.loads(error.content.decode())["error"]["errors"]
+    except (AttributeError, ValueError, KeyError, TypeError):
+        return set()
+    return {d.get("reason") for d in details}
+
+def is_quota_error(error):
+    """True if an HttpError means the project's daily quota is spent."""
+    return bool(error_reasons(error) & set(QUOTA_ERROR_REASONS))
+
+def is_rate_limit_error(error):
+    """True if an HttpError only asks to slow down."""
+    return bool(error_reasons(error) & set(RATE_LIMIT_REASONS))
+
+def is_upload_limit_error(error):
+    """True if an HttpError means the channel can't upload any more today."""
+    return bool(error_reasons(error) & set(UPLOAD_LIMIT_REASONS))
+
+
+class QuotaLedger:
+    """
+    Data API units spent per project and quota day.
+
+    Spending is recorded before the request goes out (YouTube charges for the
+    attempt, not the success) and written through to quota.json, so separate
+    runs on the same day see each other's spend. A quota error from YouTube
+    marks the project exhausted for the rest of the day, whatever the ledger
+    thought was left, e.g. because something else used the same project.
+    """
+
+    def __init__(self, path=QUOTA_JSON, projects=None):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.limits = dict(projects or {DEFAULT_PROJECT: DEFAULT_DAILY_QUOTA})
+        self.spent = {}          # project -> {iso day: units}
+        self._load()
+
+    # ─── Persistence ───────────────────────────────────────────────────────────
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path) as f:
+                self.spent = json.load(f).get("spent", {})
+        except json.JSONDecodeError:
+            print(f"[WARN] Could not decode {self.path.name}, assuming no quota spent.")
+
+    def _write(self):
+        oldest = (quota_day() - datetime.timedelta(days=KEEP_DAYS)).isoformat()
+        for days in self.spent.values():
+            for day in [d for d in days if d < oldest]:
+                del days[day]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"spent": self.spent}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # ─── Queries ───────────────────────────────────────────────────────────────
+    def used(self, project, now=None):
+        return self.spent.get(project, {}).get(quota_day(now).isoformat(), 0)
+
+    def remaining(self, project, now=None):
+        return max(0, self.limits.get(project, DEFAULT_DAILY_QUOTA) - self.used(project, now))
+
+    def affordable(self, project, cost=INSERT_COST, now=None):
+        """How many requests of `cost` units still fit in today's window."""
+        return self.remaining(project, now) // cost if cost else float("inf")
+
+    # ─── Spending ──────────────────────────────────────────────────────────────
+    def charge(self, project, units, now=None):
+        """
+        Records `units` against today's window. Returns False, recording nothing,
+        if they don't fit in what's left.
+        """
+        with self.lock:
+            if units > self.remaining(project, now):
+                return False
+            days = self.spent.setdefault(project, {})
+            day = quota_day(now).isoformat()
+            days[day] = days.get(day, 0) + units
+            self._write()
+            return True
+
+    def exhaust(self, project, now=None):
+        """Marks the rest of today's window as spent after YouTube reported a quota error."""
+        with self.lock:
+            self.spent.setdefault(project, {})[quota_day(now).isoformat()] = \
+                self.limits.get(project, DEFAULT_DAILY_QUOTA)
+            self._write()
@@ -0,0 +1,188 @@
+# scripts/render_profiler.py
+
+import os
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PROFILE_DIR = ROOT_DIR / "data" / "profiles"
+SEGMENT_SECONDS = 1.0      # Timeline bucket size for the slowest-segment report
+TOP_N = 10
+
+
+class RenderProfiler:
+    """
+    Per-frame timing for a render built by CaptionCompositor.apply().
+
+    Layers are tagged with `profile_kind` ("background", "title", "caption",
+    "highlight") and optionally `profile_label` by assemble_video. attach() wraps
+    the compositor in place, so the render itself runs unchanged:
+
+      - background read      -> "background.frame"  (decode, resize, speed change...)
+      - sprite blend         -> "<kind>.blend"      (alpha compositing)
+      - time between frames  -> "encoder"           (piping to ffmpeg + x264)
+    """
+
+    def __init__(self, segment_seconds=SEGMENT_SECONDS):
+        self.segment_seconds = segment_seconds
+        self.frames = {}               # t -> {"layers": n, "total": s, "<kind>.<part>": s, ...}
+        self.layer_costs = defaultdict(float)
+        self.layer_info = {}
+        self.current = None
+        self.work_ended = None
+        self.started = None
+        self.finished = None
+
+    # ─── Instrumentation ───────────────────────────────────────────────────────
+    def attach(self, final):
+        compositor = getattr(final, "compositor", None)
+        if compositor is None:
+            raise ValueError("RenderProfiler needs a clip built by CaptionCompositor.apply()")
+        self._wrap_compositor(compositor)
+        self._wrap_frame_source(final, "total")
+        return self
+
+    def _record(self, key, seconds):
+        if self.current is not None:
+            self.current[key] = self.current.get(key, 0.0) + seconds
+
+    def _wrap_compositor(self, compositor):
+        for sprite in compositor.sprites:
+            self.layer_info[id(sprite)] = {
+                "kind": sprite.kind,
+                "label": sprite.label,
+                "start": round(sprite.start, 3),
+                "end": round(sprite.end, 3),
+            }
+        background_frame = compositor.background_frame
+        active = compositor.active
+        blend = compositor.blend
+
+        def timed_background_frame(get_frame, t):
+            started = time.perf_counter()
+            frame = background_frame(get_frame, t)
+            self._record("background.frame", time.perf_counter() - started)
+            return frame
+
+        def counted_active(t):
+            sprites = active(t)
+            if self.current is not None:
+                self.current["layers"] = len(sprites) + 1
+            return sprites
+
+        def timed_blend(frame, sprite):
+            started = time.perf_counter()
+            blend(frame, sprite)
+            elapsed = time.perf_counter() - started
+            self._record(f"{sprite.kind}.blend", elapsed)
+            self.layer_costs[id(sprite)] += elapsed
+
+        compositor.background_frame = timed_background_frame
+        compositor.active = counted_active
+        compositor.blend = timed_blend
+
+    def _wrap_frame_source(self, clip, key):
+        frame_function = clip.frame_function
+
+        def timed(t):
+            self._begin_frame(t)
+            started = time.perf_counter()
+            frame = frame_function(t)
+            self._record(key, time.perf_counter() - started)
+            self.work_ended = time.perf_counter()
+            return frame
+
+        clip.frame_function = timed
+
+    def _begin_frame(self, t):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        # Whatever happened since the previous frame's work finished was the writer
+        if self.current is not None and self.work_ended is not None:
+            self.current["encoder"] = self.current.get("encoder", 0.0) + now - self.work_ended
+        self.current = self.frames.setdefault(round(t, 4), {"layers": 0})
+
+    def finish(self):
+        now = time.perf_counter()
+        if self.current is not None and self.work_ended is not None:
+            self.current["encoder"] = self.current.get("encoder", 0.0) + now - self.work_ended
+        self.finished = now
+        self.current = None
+
+    # ─── Reporting ─────────────────────────────────────────────────────────────
+    def summary(self):
+        frames = sorted(self.frames.items())
+        for _, record in frames:
+            record["total_with_encoder"] = record.get("total", 0.0) + record.get("encoder", 0.0)
+
+        by_part = defaultdict(float)
+        for _, record in frames:
+            for key, value in record.items():
+                if "." in key or key == "encoder":
+                    by_part[key] += value
+
+        segments = defaultdict(lambda: {"seconds": 0.0, "frames": 0, "max_layers": 0})
+        for t, record in frames:
+            start = int(t // self.segment_seconds) * self.segment_seconds
+            segment = segments[start]
+            segment["seconds"] += record["total_with_encoder"]
+            segment["frames"] += 1
+            segment["max_layers"] = max(segment["max_layers"], record["layers"])
+
+        slowest_segments = []
+        for start, segment in sorted(segments.items(), key=lambda kv: kv[1]["seconds"], reverse=True)[:TOP_N]:
+            end = start + self.segment_seconds
+            active = [info["label"] for info in self.layer_info.values()
+                      if info["label"] and info["start"] < end and (info["end"] is None or info["end"] > start)]
+            slowest_segments.append({
+                "start": round(start, 3),
+                "end": round(end, 3),
+                "seconds": round(segment["seconds"], 4),
+                "ms_per_frame": round(segment["seconds"] / segment["frames"] * 1000, 2),
+                "max_layers": segment["max_layers"],
+                "captions": active,
+            })
+
+        costliest_layers = []
+        for layer_id, seconds in sorted(self.layer_costs.items(), key=lambda kv: kv[1], reverse=True)[:TOP_N]:
+            costliest_layers.append({**self.layer_info[layer_id], "seconds": round(seconds, 4)})
+
+        layer_counts = [record["layers"] for _, record in frames]
+        wall = (self.finished or time.perf_counter()) - (self.started or time.perf_counter())
+        return {
+            "frames": len(frames),
+            "wall_seconds": round(wall, 3),
+            "ms_per_frame": round(wall / len(frames) * 1000, 2) if frames else None,
+            "seconds_by_part": {k: round(v, 4) for k, v in sorted(by_part.items(), key=lambda kv: -kv[1])},
+            "active_layers": {
+                "mean": round(sum(layer_counts) / len(layer_counts), 2) if layer_counts else 0,
+                "max": max(layer_counts, default=0),
+                "total_layers": len(self.layer_info),
+            },
+            "slowest_segments": slowest_segments,
+            "costliest_layers": costliest_layers,
+        }
+
+    def write(self, video_path, out_dir=PROFILE_DIR):
+        os.makedirs(out_dir, exist_ok=True)
+        out = os.path.join(out_dir, Path(video_path).stem + ".json")
+        summary = self.summary()
+        frames = [{"t": t, **{k: round(v, 5) if isinstance(v, float) else v for k, v in record.items()}}
+                  for t, record in sorted(self.frames.items())]
+        with open(out, "w") as f:
+            json.dump({"video": str(video_path), "summary": summary, "frames": frames}, f, indent=2)
+
+        print(f"[PROFILE] {Path(video_path).name}: {summary['frames']} frames, {summary['ms_per_frame']} ms/frame, "
+              f"{summary['active_layers']['mean']} active layers on average")
+        for part, seconds in list(summary["seconds_by_part"].items())[:6]:
+            print(f"[PROFILE]   {part:<20} {seconds:8.2f}s")
+        if summary["slowest_segments"]:
+            worst = summary["slowest_segments"][0]
+            print(f"[PROFILE]   slowest segment {worst['start']:.0f}-{worst['end']:.0f}s: "
+                  f"{worst['ms_per_frame']} ms/frame, up to {worst['max_layers']} layers")
+        print(f"[Saved] Render profile → {out}")
+        return out
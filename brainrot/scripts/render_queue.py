@@ -0,0 +1,355 @@
+# scripts/render_queue.py
+#
+# Shared job queue for render farm mode. generate_final_videos(distributed=True)
+# publishes one job per (post, variant); render_worker.py on any number of nodes
+# claims jobs under a lease, renews it while rendering, and completes or fails it.
+# A job whose lease runs out (worker died, node lost power) goes back to pending
+# for the next claim.
+#
+# Two interchangeable backends:
+#   FileQueue   - a directory on a shared filesystem (NFS, SMB...), no server needed
+#   RedisQueue  - any Redis-compatible store (pip install redis), for nodes that
+#                 don't share a filesystem lock-safely
+#
+# RENDER_QUEUE_URL picks one: unset or a path -> FileQueue, redis://... -> RedisQueue.
+
+import os
+import json
+import time
+import uuid
+from pathlib import Path
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+QUEUE_DIR = ROOT_DIR / "data" / "render_queue"
+RENDER_QUEUE_URL = os.getenv("RENDER_QUEUE_URL")
+
+LEASE_SECONDS = 300        # A worker that misses renewals this long is presumed dead
+MAX_ATTEMPTS = 3           # Failed or abandoned runs before a job is parked in failed/
+
+
+class Lease:
+    """A claimed job. `token` identifies this particular claim, not the worker."""
+
+    def __init__(self, job_id, token, job):
+        self.job_id = job_id
+        self.token = token
+        self.job = job
+
+    @property
+    def payload(self):
+        return self.job["payload"]
+
+    @property
+    def attempts(self):
+        return self.job.get("attempts", 0)
+
+    def __repr__(self):
+        return f"Lease({self.job_id}, attempt {self.attempts + 1})"
+
+
+def _new_job(job_id, payload):
+    return {"id": job_id, "payload": payload, "attempts": 0, "published": time.time(), "errors": []}
+
+
+# ─── Shared filesystem ─────────────────────────────────────────────────────────
+class FileQueue:
+    """
+    One JSON file per job, moved between state directories with rename(), which is
+    atomic on a single filesystem (including NFS), so exactly one node wins each
+    claim, completion or reclaim:
+
+      pending/<id>.json            waiting, claimed oldest first
+      leased/<id>.<token>.json     claimed; mtime is the last heartbeat
+      done/<id>.json               finished, with the worker's result
+      failed/<id>.json             gave up after MAX_ATTEMPTS
+      tmp/                         in-between writes and moves
+
+    Lease expiry compares file mtimes with the local clock, so nodes need roughly
+    synchronised clocks (NTP) and LEASE_SECONDS well above any drift.
+    """
+
+    STATES = ("pending", "leased", "done", "failed", "tmp")
+
+    def __init__(self, root=QUEUE_DIR, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        for state in self.STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, state, name):
+        return self.root / state / name
+
+    def _write(self, state, name, job):
+        tmp_path = self._path("tmp", f"{name}.{uuid.uuid4().hex}.part")
+        with open(tmp_path, "w") as f:
+            json.dump(job, f, indent=2)
+        os.replace(tmp_path, self._path(state, name))
+
+    def _read(self, path):
+        with open(path) as f:
+            return json.load(f)
+
+    def _take(self, path):
+        """Atomically moves `path` into tmp/ so nobody else can act on it. None if we lost the race."""
+        taken = self._path("tmp", f"{path.name}.{uuid.uuid4().hex}.taken")
+        try:
+            # Fresh mtime, so the stale-file sweep below leaves it alone while we work
+            os.utime(path)
+            os.rename(path, taken)
+        except FileNotFoundError:
+            return None
+        return taken
+
+    def _leased_files(self, job_id=None):
+        prefix = f"{job_id}." if job_id else ""
+        return [p for p in self._path("leased", "").iterdir() if p.name.startswith(prefix) and p.suffix == ".json"]
+
+    # ─── Producer ──────────────────────────────────────────────────────────────
+    def publish(self, job_id, payload, force=False):
+        """Adds a job; returns False if it is already pending, leased or done (unless force)."""
+        name = f"{job_id}.json"
+        if not force and (self._path("pending", name).exists() or self._path("done", name).exists()
+                          or self._leased_files(job_id)):
+            return False
+        for state in ("done", "failed"):
+            self._path(state, name).unlink(missing_ok=True)
+        self._write("pending", name, _new_job(job_id, payload))
+        return True
+
+    # ─── Worker ────────────────────────────────────────────────────────────────
+    def claim(self):
+        self.reclaim_expired()
+        pending = sorted(os.scandir(self._path("pending", "")), key=lambda e: e.stat().st_mtime)
+        for entry in pending:
+            path = Path(entry.path)
+            token = uuid.uuid4().hex[:12]
+            leased = self._path("leased", f"{path.stem}.{token}.json")
+            try:
+                # Touch first: rename keeps the mtime, and an old one would look expired
+                os.utime(path)
+                os.rename(path, leased)
+            except FileNotFoundError:
+                continue    # Another worker got it
+            return Lease(path.stem, token, self._read(leased))
+        return None
+
+    def renew(self, lease):
+        try:
+            os.utime(self._path("leased", f"{lease.job_id}.{lease.token}.json"))
+            return True
+        except FileNotFoundError:
+            return False    # Reclaimed: our lease had expired
+
+    def complete(self, lease, result=None):
+        taken = self._take(self._path("leased", f"{lease.job_id}.{lease.token}.json"))
+        if taken is None:
+            return False
+        job = self._read(taken)
+        job.update(result=result, finished=time.time())
+        self._write("done", f"{lease.job_id}.json", job)
+        taken.unlink()
+        return True
+
+    def fail(self, lease, error):
+        taken = self._take(self._path("leased", f"{lease.job_id}.{lease.token}.json"))
+        if taken is None:
+            return False
+        self._retry_or_park(taken, str(error))
+        return True
+
+    def _retry_or_park(self, taken, error):
+        job = self._read(taken)
+        job["attempts"] = job.get("attempts", 0) + 1
+        job["errors"] = (job.get("errors", []) + [error])[-self.max_attempts:]
+        state = "failed" if job["attempts"] >= self.max_attempts else "pending"
+        self._write(state, f"{job['id']}.json", job)
+        taken.unlink()
+        return state
+
+    # ─── Housekeeping ──────────────────────────────────────────────────────────
+    def reclaim_expired(self):
+        """Returns jobs whose lease ran out to pending. Safe to call from every node."""
+        now = time.time()
+        reclaimed = 0
+        for path in self._leased_files():
+            try:
+                expired = now - path.stat().st_mtime > self.lease_seconds
+            except FileNotFoundError:
+                continue
+            if not expired:
+                continue
+            taken = self._take(path)
+            if taken is None:
+                continue
+            state = self._retry_or_park(taken, f"lease expired after {self.lease_seconds}s")
+            print(f"[RECLAIM] {path.name.split('.')[0]} → {state}")
+            reclaimed += 1
+
+        # A node that died halfway through a move leaves its file in tmp/
+        for path in self._path("tmp", "").glob("*.taken"):
+            try:
+                stale = now - path.stat().st_mtime > self.lease_seconds
+            except FileNotFoundError:
+                continue
+            if not stale:
+                continue
+            taken = self._take(path)
+            if taken is None:
+                continue
+            job_id = path.name.split(".")[0]
+            if self._path("done", f"{job_id}.json").exists():
+                taken.unlink()
+            else:
+                self._retry_or_park(taken, "interrupted during a queue move")
+                reclaimed += 1
+        return reclaimed
+
+    def counts(self):
+        return {
+            "pending": len(list(self._path("pending", "").glob("*.json"))),
+            "leased": len(self._leased_files()),
+            "done": len(list(self._path("done", "").glob("*.json"))),
+            "failed": len(list(self._path("failed", "").glob("*.json"))),
+        }
+
+    def failed_jobs(self):
+        return [self._read(p) for p in sorted(self._path("failed", "").glob("*.json"))]
+
+
+# ─── Redis-compatible store ────────────────────────────────────────────────────
+# Every state change is a small Lua script, so it is atomic on the server and lease
+# times come from the server clock rather than each node's.
+_NOW = "local t = redis.call('TIME') local now = tonumber(t[1]) + tonumber(t[2]) / 1e6 "
+
+_CLAIM = _NOW + """
+local id = redis.call('RPOP', KEYS[1])
+if not id then return nil end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), id .. '|' .. ARGV[2])
+return id
+"""
+
+_RENEW = _NOW + """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[1])
+return 1
+"""
+
+_COMPLETE = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+redis.call('HSET', KEYS[2], ARGV[2], ARGV[3])
+return 1
+"""
+
+# KEYS: leases, attempts, errors, pending, failed   ARGV: member, id, error, max_attempts
+_FAIL = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then return 0 end
+local n = redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+redis.call('HSET', KEYS[3], ARGV[2], ARGV[3])
+if n >= tonumber(ARGV[4]) then
+  redis.call('HSET', KEYS[5], ARGV[2], ARGV[3])
+else
+  redis.call('LPUSH', KEYS[4], ARGV[2])
+end
+return 1
+"""
+
+_EXPIRED = _NOW + "return redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)"
+
+
+class RedisQueue:
+    """
+    Same interface as FileQueue on top of a Redis-compatible server. Keys under
+    `prefix`: jobs (hash id -> job json), pending (list), leases (sorted set of
+    'id|token' by expiry), attempts, errors, done and failed (hashes).
+    """
+
+    def __init__(self, client, prefix="autotube:render", lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.client = client
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.keys = {name: f"{prefix}:{name}"
+                     for name in ("jobs", "pending", "leases", "attempts", "errors", "done", "failed")}
+        self._claim = client.register_script(_CLAIM)
+        self._renew = client.register_script(_RENEW)
+        self._complete = client.register_script(_COMPLETE)
+        self._fail = client.register_script(_FAIL)
+        self._expired = client.register_script(_EXPIRED)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    def publish(self, job_id, payload, force=False):
+        k = self.keys
+        if not force and self.client.hexists(k["jobs"], job_id) and not self.client.hexists(k["failed"], job_id):
+            return False
+        pipe = self.client.pipeline()
+        pipe.hset(k["jobs"], job_id, json.dumps(_new_job(job_id, payload)))
+        pipe.hdel(k["attempts"], job_id)
+        pipe.hdel(k["errors"], job_id)
+        pipe.hdel(k["done"], job_id)
+        pipe.hdel(k["failed"], job_id)
+        pipe.lpush(k["pending"], job_id)
+        pipe.execute()
+        return True
+
+    def claim(self):
+        self.reclaim_expired()
+        token = uuid.uuid4().hex[:12]
+        job_id = self._claim(keys=[self.keys["pending"], self.keys["leases"]], args=[self.lease_seconds, token])
+        if job_id is None:
+            return None
+        job = json.loads(self.client.hget(self.keys["jobs"], job_id))
+        job["attempts"] = int(self.client.hget(self.keys["attempts"], job_id) or 0)
+        return Lease(job_id, token, job)
+
+    def renew(self, lease):
+        return bool(self._renew(keys=[self.keys["leases"]], args=[f"{lease.job_id}|{lease.token}", self.lease_seconds]))
+
+    def complete(self, lease, result=None):
+        k = self.keys
+        return bool(self._complete(keys=[k["leases"], k["done"]],
+                                   args=[f"{lease.job_id}|{lease.token}", lease.job_id,
+                                         json.dumps({"result": result, "finished": time.time()})]))
+
+    def fail(self, lease, error, member=None):
+        k = self.keys
+        return bool(self._fail(keys=[k["leases"], k["attempts"], k["errors"], k["pending"], k["failed"]],
+                               args=[member or f"{lease.job_id}|{lease.token}", lease.job_id, str(error),
+                                     self.max_attempts]))
+
+    def reclaim_expired(self):
+        reclaimed = 0
+        for member in self._expired(keys=[self.keys["leases"]]):
+            job_id = member.rsplit("|", 1)[0]
+            # _FAIL only acts if the lease is still there, so concurrent reclaims are harmless
+            if self.fail(Lease(job_id, None, None), f"lease expired after {self.lease_seconds}s", member=member):
+                print(f"[RECLAIM] {job_id}")
+                reclaimed += 1
+        return reclaimed
+
+    def counts(self):
+        k = self.keys
+        return {
+            "pending": self.client.llen(k["pending"]),
+            "leased": self.client.zcard(k["leases"]),
+            "done": self.client.hlen(k["done"]),
+            "failed": self.client.hlen(k["failed"]),
+        }
+
+    def failed_jobs(self):
+        k = self.keys
+        return [{**json.loads(self.client.hget(k["jobs"], job_id)), "errors": [error]}
+                for job_id, error in sorted(self.client.hgetall(k["failed"]).items())]
+
+
+def open_queue(url=RENDER_QUEUE_URL, **kwargs):
+    """RENDER_QUEUE_URL (or `url`): unset -> data/render_queue, redis://... -> RedisQueue, else a directory."""
+    if url and url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQueue.from_url(url, **kwargs)
+    if url and url.startswith("file://"):
+        url = url[len("file://"):]
+    return FileQueue(url or QUEUE_DIR, **kwargs)
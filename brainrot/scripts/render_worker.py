@@ -0,0 +1,151 @@
+# scripts/render_worker.py
+#
+# Render farm node. Run one per machine (or per few cores) against the same queue:
+#
+#   RENDER_QUEUE_URL=/mnt/autotube/data/render_queue \
+#   AUTOTUBE_SHARED_ROOT=/mnt/autotube python3 render_worker.py
+#
+# Each job names its audio, word timings and background footage relative to the
+# shared project root. The worker copies them to local disk (backgrounds stay
+# cached between jobs), renders locally, and moves the finished mp4 into the
+# shared data/final/<variant>/ folder before completing the job.
+
+import os
+import time
+import shutil
+import socket
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+
+import assemble_video
+from render_queue import open_queue
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SHARED_ROOT = Path(os.getenv("AUTOTUBE_SHARED_ROOT", ROOT_DIR))
+CACHE_DIR = Path(os.getenv("AUTOTUBE_RENDER_CACHE", Path(tempfile.gettempdir()) / "autotube_render"))
+IDLE_SECONDS = 10          # Wait between polls when the queue is empty
+
+
+# ─── Files ─────────────────────────────────────────────────────────────────────
+def fetch(rel_path, cache_dir=None):
+    """Copies a shared file to the local cache unless an identical copy is already there."""
+    src = SHARED_ROOT / rel_path
+    dst = (cache_dir or CACHE_DIR) / rel_path
+    src_stat = src.stat()
+    if dst.exists():
+        dst_stat = dst.stat()
+        if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime >= src_stat.st_mtime:
+            return dst
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    part = dst.with_name(dst.name + ".part")
+    shutil.copyfile(src, part)
+    os.replace(part, dst)
+    return dst
+
+def publish_output(local_path, rel_path):
+    """Moves a finished render into the shared tree; the uploader never sees a partial file."""
+    dst = SHARED_ROOT / rel_path
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    part = dst.with_name(f".{dst.name}.part")
+    shutil.copyfile(local_path, part)
+    os.replace(part, dst)
+    return dst
+
+
+class Heartbeat(threading.Thread):
+    """Renews a lease every third of its length until stopped; `lost` is set if it was taken away."""
+
+    def __init__(self, queue, lease):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.lease = lease
+        self.interval = max(1.0, queue.lease_seconds / 3)
+        self.stopped = threading.Event()
+        self.lost = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.queue.renew(self.lease):
+                print(f"[WARN] Lost lease on {self.lease.job_id}, another worker will redo it")
+                self.lost.set()
+                return
+
+    def stop(self):
+        self.stopped.set()
+
+
+# ─── Jobs ──────────────────────────────────────────────────────────────────────
+def run_job(queue, lease, worker_id):
+    payload = lease.payload
+    entry = payload["entry"]
+    job_dir = CACHE_DIR / "jobs" / f"{lease.job_id}.{lease.token}"
+
+    heartbeat = Heartbeat(queue, lease)
+    heartbeat.start()
+    try:
+        audio = fetch(payload["audio"])
+        fetch(payload["timings"])
+        backgrounds = [str(fetch(p)) for p in payload["backgrounds"]]
+
+        stats = assemble_video.render_variant(entry, payload["variant"], str(job_dir),
+                                              profile=payload["profile"], backgrounds=backgrounds,
+                                              audio_dir=str(audio.parent))
+        if heartbeat.lost.is_set():
+            return False
+        local_out = job_dir / payload["variant"] / Path(payload["output"]).name
+        publish_output(local_out, payload["output"])
+    finally:
+        heartbeat.stop()
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    return queue.complete(lease, {**stats, "worker": worker_id})
+
+def work(queue, worker_id, once=False):
+    print(f"[INFO] Render worker {worker_id} started, shared root {SHARED_ROOT}")
+    rendered = 0
+    while True:
+        lease = queue.claim()
+        if lease is None:
+            if once:
+                break
+            time.sleep(IDLE_SECONDS)
+            continue
+
+        print(f"[CLAIM] {lease.job_id} (attempt {lease.attempts + 1})")
+        try:
+            if run_job(queue, lease, worker_id):
+                rendered += 1
+                print(f"[DONE] {lease.job_id}")
+        except Exception as e:
+            traceback.print_exc()
+            queue.fail(lease, f"{worker_id}: {type(e).__name__}: {e}")
+            print(f"[ERROR] {lease.job_id} failed: {e}")
+
+    print(f"[INFO] Queue empty, rendered {rendered} video(s)")
+    return rendered
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Claim and render jobs from the shared render queue")
+    parser.add_argument("--queue", default=None, help="queue directory or redis:// URL (default: RENDER_QUEUE_URL)")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    parser.add_argument("--status", action="store_true", help="print queue counts and failed jobs, then exit")
+    args = parser.parse_args()
+
+    queue = open_queue(args.queue) if args.queue else open_queue()
+    if args.status:
+        print(queue.counts())
+        for job in queue.failed_jobs():
+            print(f"[FAILED] {job['id']}: {job.get('errors', [])[-1:]}")
+    else:
+        try:
+            work(queue, args.worker_id, once=args.once)
+        except KeyboardInterrupt:
+            # Our lease simply expires and another worker picks the job up
+            print("\n[INFO] Render worker stopped.")
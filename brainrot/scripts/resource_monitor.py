@@ -0,0 +1,150 @@
+# scripts/resource_monitor.py
+
+import os
+import gc
+import sys
+import threading
+import resource
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+MEMORY_BUDGET_MB = int(os.getenv("RENDER_MEMORY_BUDGET_MB", "4096"))
+SAMPLE_SECONDS = 0.25
+MB = 1024 * 1024
+
+
+class MemoryBudgetExceeded(MemoryError):
+    pass
+
+
+# ─── Measurements ──────────────────────────────────────────────────────────────
+def _process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+def rss_bytes():
+    """
+    (this process, its child processes) resident memory in bytes. Children are the
+    ffmpeg readers and writer moviepy spawns; they need psutil (pip install psutil)
+    and are None without it.
+    """
+    proc = _process()
+    if proc is not None:
+        children = 0
+        for child in proc.children(recursive=True):
+            try:
+                children += child.memory_info().rss
+            except Exception:
+                pass    # Exited between listing and reading
+        return proc.memory_info().rss, children
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"), None
+    except OSError:
+        # macOS without psutil: only the lifetime peak is available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024, None
+
+def open_fds():
+    """Number of open file descriptors, or None where /dev/fd doesn't exist (Windows)."""
+    try:
+        # listdir's own handle on the directory shows up in the listing
+        return len(os.listdir("/dev/fd")) - 1
+    except OSError:
+        return None
+
+def release_memory():
+    """
+    Collects moviepy's clip reference cycles, then on glibc hands freed heap back
+    to the OS, so RSS between renders reflects what is actually still alive.
+    """
+    gc.collect()
+    if sys.platform.startswith("linux"):
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass    # musl and friends don't have it
+
+def ensure_memory_budget(budget_mb=MEMORY_BUDGET_MB):
+    """Releases what it can, then raises MemoryBudgetExceeded if we are still over budget."""
+    release_memory()
+    rss, children = rss_bytes()
+    if (rss + (children or 0)) / MB > budget_mb:
+        raise MemoryBudgetExceeded(f"{(rss + (children or 0)) / MB:.0f} MB in use before starting a render, "
+                                   f"budget is {budget_mb} MB")
+
+
+# ─── Per-render monitor ────────────────────────────────────────────────────────
+class ResourceMonitor:
+    """
+    Samples resident memory (ours plus ffmpeg children) in the background while a
+    render runs and records open file descriptors before and after. Renders whose
+    clip is passed to guard() stop at the next frame once the budget is exceeded.
+
+        with ResourceMonitor() as monitor:
+            monitor.guard(final)
+            write_with_profile(final, out)
+        monitor.report()
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB, interval=SAMPLE_SECONDS):
+        self.budget_mb = budget_mb
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children_rss = None
+        self.peak_total = 0
+        self.fds_before = None
+        self.fds_after = None
+        self.exceeded = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def __enter__(self):
+        self.fds_before = open_fds()
+        self.sample()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        self.fds_after = open_fds()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss, children = rss_bytes()
+        self.peak_rss = max(self.peak_rss, rss)
+        if children is not None:
+            self.peak_children_rss = max(self.peak_children_rss or 0, children)
+        self.peak_total = max(self.peak_total, rss + (children or 0))
+        if self.peak_total / MB > self.budget_mb:
+            self.exceeded.set()
+
+    def guard(self, clip):
+        # frame_function rather than get_frame: resized() and friends copy the clip,
+        # and a copied get_frame would bypass the copy's own transform
+        frame_function = clip.frame_function
+
+        def checked(t):
+            if self.exceeded.is_set():
+                raise MemoryBudgetExceeded(f"{self.peak_total / MB:.0f} MB in use, budget is {self.budget_mb} MB")
+            return frame_function(t)
+
+        clip.frame_function = checked
+        return clip
+
+    def report(self):
+        return {
+            "peak_rss_mb": round(self.peak_rss / MB, 1),
+            "peak_children_rss_mb": round(self.peak_children_rss / MB, 1) if self.peak_children_rss is not None else None,
+            "open_fds_before": self.fds_before,
+            "open_fds_after": self.fds_after,
+        }
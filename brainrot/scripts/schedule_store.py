@@ -0,0 +1,294 @@
+# scripts/schedule_store.py
+
+import os
+import json
+import bisect
+import datetime
+import threading
+from pathlib import Path
+
+# ─── Defaults ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SCHEDULE_JSON = ROOT_DIR / "data" / "schedule.json"
+DEFAULT_CHANNEL = "default"
+DEFAULT_SLOT_HOURS = [10, 15, 19]
+
+# Minimum hours between two publishes of the same variant on one channel
+VARIANT_SPACING_HOURS = {"1": 0, "2": 0, "3": 0}
+# Minimum hours between two variants of the same post on one channel. Off by
+# default, which keeps the original back-to-back order; set e.g. 48 (or pass
+# post_spacing to ScheduleStore) so the same story doesn't go out twice in a row
+POST_SPACING_HOURS = 0
+
+
+def split_video_name(filename):
+    """'1ehlrdd_2.mp4' -> ('1ehlrdd', '2')."""
+    stem = Path(filename).stem
+    post_id, sep, variant = stem.rpartition("_")
+    if not sep:
+        return stem, ""
+    return post_id, variant
+
+
+def first_free(occupied, start):
+    """
+    Smallest slot index >= start that is not in the sorted list `occupied`.
+
+    occupied[k] - k never decreases, and it stays constant across a run of
+    back-to-back taken slots, so the end of the run holding `start` can be
+    binary searched: O(log n) however full the schedule is.
+    """
+    k0 = bisect.bisect_left(occupied, start)
+    if k0 == len(occupied) or occupied[k0] != start:
+        return start
+    offset = start - k0
+    lo, hi = k0, len(occupied) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if occupied[mid] - mid == offset:
+            lo = mid
+        else:
+            hi = mid - 1
+    return occupied[lo] + 1
+
+
+class _Channel:
+    """Slot grid and indexes for one channel. Slot n is hour slot_hours[n % k] of day n // k."""
+
+    def __init__(self, name, slot_hours):
+        self.name = name
+        self.slot_hours = sorted(slot_hours)
+        self.slots = {}          # slot index -> filename
+        self.occupied = []       # sorted slot indexes
+        self.by_variant = {}     # variant -> sorted slot indexes
+        self.by_post = {}        # post id -> sorted slot indexes
+
+    def to_datetime(self, slot):
+        day, pos = divmod(slot, len(self.slot_hours))
+        return datetime.datetime.combine(datetime.date.fromordinal(day), datetime.time(self.slot_hours[pos], 0))
+
+    def slot_at_or_after(self, dt):
+        """First slot whose publish time is >= dt."""
+        past_hour = 0.5 if (dt.minute or dt.second or dt.microsecond) else 0
+        pos = bisect.bisect_left(self.slot_hours, dt.hour + past_hour)
+        return dt.date().toordinal() * len(self.slot_hours) + pos
+
+    def slot_of(self, dt):
+        """Exact slot for dt, or None if dt isn't on this channel's grid."""
+        if dt.minute or dt.second or dt.microsecond or dt.hour not in self.slot_hours:
+            return None
+        return dt.date().toordinal() * len(self.slot_hours) + self.slot_hours.index(dt.hour)
+
+    def add(self, slot, filename):
+        post_id, variant = split_video_name(filename)
+        self.slots[slot] = filename
+        bisect.insort(self.occupied, slot)
+        bisect.insort(self.by_variant.setdefault(variant, []), slot)
+        bisect.insort(self.by_post.setdefault(post_id, []), slot)
+
+    def remove(self, slot):
+        filename = self.slots.pop(slot)
+        post_id, variant = split_video_name(filename)
+        for sorted_slots in (self.occupied, self.by_variant[variant], self.by_post[post_id]):
+            del sorted_slots[bisect.bisect_left(sorted_slots, slot)]
+
+    def _spacing_conflict(self, slot, neighbours, gap):
+        """Returns a later slot to retry from if `slot` is within `gap` of a neighbour, else None."""
+        if not gap or not neighbours:
+            return None
+        dt = self.to_datetime(slot)
+        i = bisect.bisect_left(neighbours, slot)
+        if i > 0 and dt - self.to_datetime(neighbours[i - 1]) < gap:
+            return self.slot_at_or_after(self.to_datetime(neighbours[i - 1]) + gap)
+        if i < len(neighbours) and self.to_datetime(neighbours[i]) - dt < gap:
+            return self.slot_at_or_after(self.to_datetime(neighbours[i]) + gap)
+        return None
+
+    def find_slot(self, filename, start, variant_spacing, post_spacing):
+        post_id, variant = split_video_name(filename)
+        variant_gap = datetime.timedelta(hours=variant_spacing.get(variant, 0))
+        post_gap = datetime.timedelta(hours=post_spacing)
+
+        slot = first_free(self.occupied, start)
+        while True:
+            retry = (self._spacing_conflict(slot, self.by_variant.get(variant), variant_gap)
+                     or self._spacing_conflict(slot, self.by_post.get(post_id), post_gap))
+            if retry is None:
+                return slot
+            slot = first_free(self.occupied, retry)
+
+
+class ScheduleStore:
+    """
+    Publish schedule indexed by slot (per channel) and by filename.
+
+    schedule.json holds a snapshot; every commit is appended to a journal next to
+    it and fsynced, so an upload is recorded the moment it succeeds without
+    rewriting the whole schedule. The journal is folded back into the snapshot
+    the next time the store is opened.
+
+    Slots handed out by `reserve` are held in memory only until `commit` or
+    `release`, so concurrent uploads never get the same slot.
+    """
+
+    def __init__(self, path=SCHEDULE_JSON, channels=None,
+                 variant_spacing=None, post_spacing=POST_SPACING_HOURS):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix(".journal.jsonl")
+        self.variant_spacing = VARIANT_SPACING_HOURS if variant_spacing is None else variant_spacing
+        self.post_spacing = post_spacing
+        self.lock = threading.Lock()
+        self.channels = {}
+        for name, slot_hours in (channels or {DEFAULT_CHANNEL: DEFAULT_SLOT_HOURS}).items():
+            self.channels[name] = _Channel(name, slot_hours)
+        self.configured = list(self.channels)
+        self.by_filename = {}    # filename -> (channel name, publish datetime)
+        self.pending = set()     # reserved but not yet committed filenames
+        self._load()
+
+    # ─── Persistence ───────────────────────────────────────────────────────────
+    def _load(self):
+        snapshot = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                snapshot = json.load(f)
+        # Old schedule.json files are a flat {iso datetime: filename} map
+        if snapshot and "channels" not in snapshot:
+            snapshot = {"channels": {DEFAULT_CHANNEL: snapshot}}
+        for channel, entries in snapshot.get("channels", {}).items():
+            for dt_str, filename in entries.items():
+                self._insert(channel, datetime.datetime.fromisoformat(dt_str), filename)
+
+        replayed = 0
+        if self.journal_path.exists():
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn final line from a crash mid-append
+                    self._insert(record["channel"], datetime.datetime.fromisoformat(record["slot"]),
+                                 record["filename"])
+                    replayed += 1
+        if replayed:
+            self.compact()
+
+    def _channel(self, name):
+        if name not in self.channels:
+            # Channel removed from the config but still has history; keep its slots
+            self.channels[name] = _Channel(name, DEFAULT_SLOT_HOURS)
+        return self.channels[name]
+
+    def _insert(self, channel_name, dt, filename):
+        if filename in self.by_filename:
+            return
+        channel = self._channel(channel_name)
+        slot = channel.slot_of(dt)
+        if slot is not None:
+            if slot in channel.slots:
+                return
+            channel.add(slot, filename)
+        self.by_filename[filename] = (channel_name, dt)
+
+    def snapshot(self):
+        channels = {}
+        for filename, (channel, dt) in self.by_filename.items():
+            if filename not in self.pending:
+                channels.setdefault(channel, {})[dt.isoformat()] = filename
+        for entries in channels.values():
+            entries_sorted = dict(sorted(entries.items()))
+            entries.clear()
+            entries.update(entries_sorted)
+        return {"channels": channels}
+
+    def compact(self):
+        """Writes the snapshot atomically and drops the journal."""
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.snapshot(), f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            if self.journal_path.exists():
+                self.journal_path.unlink()
+
+    # ─── Queries ───────────────────────────────────────────────────────────────
+    def is_scheduled(self, filename):
+        return filename in self.by_filename
+
+    def get(self, filename):
+        return self.by_filename.get(filename)
+
+    # ─── Allocation ────────────────────────────────────────────────────────────
+    def reserve(self, filename, earliest=None, horizon=None, channels=None):
+        """
+        Reserves the earliest slot after `earliest` (default: now) on whichever of
+        `channels` (default: all) has one soonest, honouring the spacing rules.
+        Returns (channel, datetime), or None if no slot is free before `horizon`.
+        """
+        earliest = earliest or datetime.datetime.now()
+        with self.lock:
+            if filename in self.by_filename:
+                raise ValueError(f"{filename} is already scheduled")
+            best = None
+            for name in channels or self.configured:
+                channel = self._channel(name)
+                # Strictly after `earliest`; publish times in the past are rejected
+                start = channel.slot_at_or_after(earliest + datetime.timedelta(microseconds=1))
+                slot = channel.find_slot(filename, start, self.variant_spacing, self.post_spacing)
+                dt = channel.to_datetime(slot)
+                if (horizon is None or dt <= horizon) and (best is None or dt < best[2]):
+                    best = (channel, slot, dt)
+            if best is None:
+                return None
+            channel, slot, dt = best
+            channel.add(slot, filename)
+            self.by_filename[filename] = (channel.name, dt)
+            self.pending.add(filename)
+            return channel.name, dt
+
+    def reserve_at(self, filename, channel_name, dt, earliest=None):
+        """
+        Reserves exactly `dt` on `channel_name`, e.g. for an upload session that
+        was opened with that publish time. Returns (channel, datetime), or None
+        if the slot is in the past, taken, or breaks the spacing rules.
+        """
+        earliest = earliest or datetime.datetime.now()
+        with self.lock:
+            if filename in self.by_filename:
+                raise ValueError(f"{filename} is already scheduled")
+            if channel_name not in self.configured or dt <= earliest:
+                return None
+            channel = self._channel(channel_name)
+            slot = channel.slot_of(dt)
+            if slot is None or channel.find_slot(filename, slot, self.variant_spacing, self.post_spacing) != slot:
+                return None
+            channel.add(slot, filename)
+            self.by_filename[filename] = (channel_name, dt)
+            self.pending.add(filename)
+            return channel_name, dt
+
+    def release(self, filename):
+        """Gives back a reserved slot whose upload failed."""
+        with self.lock:
+            if filename not in self.pending:
+                return
+            self.pending.discard(filename)
+            channel_name, dt = self.by_filename.pop(filename)
+            channel = self.channels[channel_name]
+            channel.remove(channel.slot_of(dt))
+
+    def commit(self, filename):
+        """Durably records a reserved slot once its upload has succeeded."""
+        with self.lock:
+            if filename not in self.pending:
+                raise ValueError(f"{filename} has no reserved slot")
+            channel_name, dt = self.by_filename[filename]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "a") as f:
+                f.write(json.dumps({"channel": channel_name, "slot": dt.isoformat(), "filename": filename}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending.discard(filename)
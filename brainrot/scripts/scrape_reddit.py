@@ -6,6 +6,7 @@ import os
 from datetime import datetime
 import random
 import config
+from story_index import StoryIndex
 
 # Settings
 # subs to try = ["unpopularopinions", "AmIOverreacting", "Bridezillas", "badroommates", "RPGhorrorstories", "IDontWorkHereLady",
@@ -46,15 +47,21 @@ def load_existing_post_ids():
     return existing_ids
 
 
-def scrape_posts():
-    reddit = praw.Reddit(
+def get_reddit_client():
+    return praw.Reddit(
         client_id=config.REDDIT_CLIENT_ID,
         client_secret=config.REDDIT_CLIENT_SECRET,
         user_agent=config.REDDIT_USER_AGENT
     )
 
+def scrape_posts(reddit=None):
+    reddit = reddit or get_reddit_client()
+
     existing_ids = load_existing_post_ids()
     print(f"Loaded {len(existing_ids)} existing post IDs.")
+    # Reposts of stories we already have come back under new ids
+    stories = StoryIndex(os.path.join(ROOT_DIR, "data")).refresh()
+    print(f"Loaded {len(stories)} indexed stories.")
 
     new_posts = []
     total_new = 0
@@ -81,6 +88,13 @@ def scrape_posts():
             if not post.selftext or len(post.selftext.strip()) < 10:
                 continue
 
+            duplicate = stories.find_duplicate(post.selftext)
+            if duplicate:
+                duplicate_id, score = duplicate
+                print(f"repost of {duplicate_id} from r/{stories.subreddit_of(duplicate_id)} ({score:.0%} similar)")
+                existing_ids.add(post.id)
+                continue
+
             post_data = {
                 "subreddit": subreddit_name,
                 "title": post.title.strip(),
@@ -92,6 +106,7 @@ def scrape_posts():
             }
             new_posts.append(post_data)
             existing_ids.add(post.id)
+            stories.add(post.id, post_data["selftext"], subreddit_name)
             total_new = total_new + 1
             found_in_this_round = True
             print(f"Added post {post.id} from r/{subreddit_name} (total: {total_new}/{TARGET_TOTAL_NEW_POSTS})")
@@ -109,6 +124,7 @@ def scrape_posts():
         json.dump(new_posts, f, indent=4)
 
     print(f"Saved {len(new_posts)} posts to {output_path}")
+    stories.save()
 
 if __name__ == "__main__":
     scrape_posts()
@@ -0,0 +1,147 @@
+# scripts/script_index.py
+
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+# ─── Paths ─────────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+PROCESSED_SCRIPTS_DIR = ROOT_DIR / "data" / "processed" / "scripts"
+INDEX_JSON = ROOT_DIR / "data" / "processed" / "script_index.json"
+
+
+def parse_post_id(filename):
+    """'1ehlrdd_2.mp4' -> '1ehlrdd'. Reddit ids never contain underscores."""
+    stem = Path(filename).stem
+    post_id, sep, variant = stem.rpartition("_")
+    return post_id if sep and variant.isdigit() else stem
+
+
+class ScriptIndex:
+    """
+    Post id → script entry index over data/processed/scripts.
+
+    The index is persisted next to the scripts along with each file's mtime, so a
+    refresh only re-parses script files that are new or have changed since the
+    last run instead of every file for every video.
+
+    One index can be shared between threads (the worker daemon's voice and
+    render stages do); every method takes the same reentrant lock.
+    """
+
+    def __init__(self, scripts_dir=PROCESSED_SCRIPTS_DIR, index_path=INDEX_JSON):
+        self.scripts_dir = Path(scripts_dir)
+        self.index_path = Path(index_path)
+        self.files = {}      # script filename -> {"mtime": float, "ids": [post ids]}
+        self.entries = {}    # post id -> script entry
+        self.owners = {}     # post id -> script filename the entry came from
+        self.dirty = False
+        self.lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.entries = data.get("entries", {})
+        except json.JSONDecodeError:
+            print(f"[WARN] Could not decode {self.index_path.name}, rebuilding script index.")
+            self.files, self.entries = {}, {}
+        # `files` is saved in indexing order, so the last file listing an id owns it
+        for name, info in self.files.items():
+            for post_id in info["ids"]:
+                self.owners[post_id] = name
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp name, so another process saving the same index can't
+            # rename our half-written file into place
+            with tempfile.NamedTemporaryFile("w", dir=self.index_path.parent, prefix=f".{self.index_path.name}.",
+                                             suffix=".tmp", delete=False) as f:
+                tmp_path = f.name
+                json.dump({"files": self.files, "entries": self.entries}, f)
+            try:
+                os.replace(tmp_path, self.index_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            self.dirty = False
+
+    def update_file(self, script_path):
+        """(Re)index a single scripts_*.json file."""
+        script_path = Path(script_path)
+        with self.lock:
+            self._drop_file(script_path.name)
+            try:
+                with open(script_path) as f:
+                    data = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"[WARN] Could not index {script_path.name}: {e}")
+                return
+
+            ids = []
+            for entry in data:
+                if "id" in entry:
+                    self.entries[entry["id"]] = entry
+                    self.owners[entry["id"]] = script_path.name
+                    ids.append(entry["id"])
+            self.files[script_path.name] = {"mtime": script_path.stat().st_mtime, "ids": ids}
+            self.dirty = True
+
+    def _drop_file(self, name):
+        with self.lock:
+            old = self.files.pop(name, None)
+            if old:
+                for post_id in old["ids"]:
+                    # A later file may have re-scripted the same post; its entry stays
+                    if self.owners.get(post_id) == name:
+                        del self.owners[post_id]
+                        self.entries.pop(post_id, None)
+                self.dirty = True
+
+    def refresh(self):
+        """Pick up added, changed and removed script files."""
+        current = {}
+        if self.scripts_dir.exists():
+            for script_file in self.scripts_dir.glob("*.json"):
+                current[script_file.name] = script_file
+
+        with self.lock:
+            for name in list(self.files):
+                if name not in current:
+                    self._drop_file(name)
+
+            for name, script_file in sorted(current.items()):
+                known = self.files.get(name)
+                if not known or known["mtime"] != script_file.stat().st_mtime:
+                    self.update_file(script_file)
+            self.save()
+        return self
+
+    def get(self, post_id):
+        with self.lock:
+            return self.entries.get(post_id)
+
+    def get_for_video(self, filename):
+        return self.get(parse_post_id(filename))
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+
+def load_script_index():
+    return ScriptIndex().refresh()
+
+
+if __name__ == "__main__":
+    index = load_script_index()
+    print(f"[INFO] Indexed {len(index)} script entries from {len(index.files)} file(s)")
@@ -0,0 +1,213 @@
+# scripts/story_index.py
+#
+# Near-duplicate index for Reddit stories. The same story is reposted across
+# subreddits under new ids, so deduping by id lets us pay GPT, TTS and rendering
+# for it again. Every story seen is reduced to a MinHash signature over word
+# shingles of its normalized text, and the signatures are banded into an LSH
+# table: a lookup only compares against stories that share at least one band with
+# it, so it stays fast however long the history gets.
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import base64
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT_DIR / "data"
+
+SHINGLE_WORDS = 3              # Word n-grams compared between stories
+NUM_PERM = 128                 # MinHash signature length
+BANDS = 32                     # 32 bands of 4 rows: ~50% similar stories share a band ~87% of the time
+DUPLICATE_SIMILARITY = 0.5     # Estimated Jaccard similarity from which a story counts as a repost
+MIN_WORDS = 20                 # Shorter texts say too little to compare
+SEED = 1
+
+_PRIME = (1 << 31) - 1         # a * crc32 + b stays below 2**63, so uint64 never overflows
+_PERMUTATIONS = np.random.RandomState(SEED).randint(1, _PRIME, size=(2, NUM_PERM)).astype(np.uint64)
+_PARAMS = {"shingle_words": SHINGLE_WORDS, "num_perm": NUM_PERM, "bands": BANDS, "seed": SEED}
+
+_URL = re.compile(r"https?://\S+|www\.\S+")
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+# ─── Signatures ────────────────────────────────────────────────────────────────
+def normalize(text):
+    """Lowercased words without links, markdown or punctuation."""
+    text = _URL.sub(" ", text.lower().replace("’", "'"))
+    return [w.strip("'") for w in _WORD.findall(text) if w.strip("'")]
+
+def minhash(text):
+    """uint32 MinHash signature of the text's word shingles, or None if it is too short."""
+    words = normalize(text)
+    if len(words) < MIN_WORDS:
+        return None
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _PERMUTATIONS
+    return ((hashes[:, None] * a + b) % _PRIME).min(axis=0).astype(np.uint32)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two stories' shingle sets."""
+    return float(np.mean(sig_a == sig_b))
+
+def _band_keys(signature):
+    rows = NUM_PERM // BANDS
+    return [bytes([band]) + signature[band * rows:(band + 1) * rows].tobytes() for band in range(BANDS)]
+
+
+# ─── Index ─────────────────────────────────────────────────────────────────────
+class StoryIndex:
+    """
+    Post id → MinHash signature for every story scraped (data/posts) or scripted
+    (data/processed/scripts), plus the LSH band table built from them.
+
+    Persisted like ScriptIndex, with the mtime of each file already read, so a
+    refresh only reads new or changed files. Stories stay indexed after their
+    files are cleaned up: a repost is still a repost.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        data_dir = Path(data_dir)
+        # (directory, field holding the story text)
+        self.sources = [(data_dir / "posts", "selftext"), (data_dir / "processed" / "scripts", "script")]
+        self.index_path = data_dir / "story_index.json"
+        self.files = {}         # "<dir>/<file>" -> mtime
+        self.stories = {}       # post id -> {"signature": uint32 array, "subreddit": str}
+        self.buckets = defaultdict(set)
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path) as f:
+                data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"[WARN] Could not decode {self.index_path.name}, rebuilding story index.")
+            return
+        if data.get("params") != _PARAMS:
+            print("[INFO] Story index settings changed, rebuilding it.")
+            return
+        self.files = data.get("files", {})
+        for post_id, story in data.get("stories", {}).items():
+            signature = np.frombuffer(base64.b64decode(story["signature"]), dtype=np.uint32)
+            self._insert(post_id, signature, story.get("subreddit"))
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        stories = {post_id: {"signature": base64.b64encode(story["signature"].tobytes()).decode(),
+                             "subreddit": story["subreddit"]}
+                   for post_id, story in self.stories.items()}
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"params": _PARAMS, "files": self.files, "stories": stories}, f)
+        os.replace(tmp_path, self.index_path)
+        self.dirty = False
+
+    def _insert(self, post_id, signature, subreddit=None):
+        old = self.stories.get(post_id)
+        if old is not None:
+            if np.array_equal(old["signature"], signature):
+                return
+            for key in _band_keys(old["signature"]):
+                self.buckets[key].discard(post_id)
+        self.stories[post_id] = {"signature": signature, "subreddit": subreddit}
+        for key in _band_keys(signature):
+            self.buckets[key].add(post_id)
+
+    def add(self, post_id, text, subreddit=None):
+        """Indexes one story; returns False if it is too short to index."""
+        signature = minhash(text)
+        if signature is None:
+            return False
+        self._insert(post_id, signature, subreddit)
+        self.dirty = True
+        return True
+
+    def refresh(self):
+        """Indexes stories from post and script files that are new or changed since the last run."""
+        for directory, field in self.sources:
+            if not directory.exists():
+                continue
+            for path in sorted(directory.glob("*.json")):
+                key = f"{directory.name}/{path.name}"
+                mtime = path.stat().st_mtime
+                if self.files.get(key) == mtime:
+                    continue
+                try:
+                    with open(path) as f:
+                        entries = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"[WARN] Could not index {path.name}: {e}")
+                    continue
+                for entry in entries:
+                    if "id" not in entry or not entry.get(field):
+                        continue
+                    # A script is GPT's rewrite: only index it when the original post is gone
+                    if field == "script" and entry["id"] in self.stories:
+                        continue
+                    self.add(entry["id"], entry[field], entry.get("subreddit"))
+                self.files[key] = mtime
+                self.dirty = True
+        self.save()
+        return self
+
+    def find_duplicate(self, text, exclude_id=None, threshold=DUPLICATE_SIMILARITY):
+        """(post id, similarity) of the closest indexed story at least `threshold` similar, or None."""
+        signature = minhash(text)
+        if signature is None:
+            return None
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude_id)
+
+        best = None
+        for post_id in candidates:
+            score = similarity(signature, self.stories[post_id]["signature"])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (post_id, score)
+        return best
+
+    def subreddit_of(self, post_id):
+        story = self.stories.get(post_id)
+        return story["subreddit"] if story else None
+
+    def __len__(self):
+        return len(self.stories)
+
+
+def load_story_index(data_dir=DATA_DIR):
+    return StoryIndex(data_dir).refresh()
+
+
+if __name__ == "__main__":
+    index = load_story_index()
+    print(f"[INFO] Indexed {len(index)} stories from {len(index.files)} file(s)")
+
+    if len(sys.argv) > 1 and sys.argv[1] == "dupes":
+        # Every indexed story that has an earlier near-duplicate
+        started = time.perf_counter()
+        seen = set()
+        for post_id in index.stories:
+            candidates = set()
+            for key in _band_keys(index.stories[post_id]["signature"]):
+                candidates |= index.buckets[key]
+            for other in candidates & seen:
+                score = similarity(index.stories[post_id]["signature"], index.stories[other]["signature"])
+                if score >= DUPLICATE_SIMILARITY:
+                    print(f"[DUPE] {post_id} (r/{index.subreddit_of(post_id)}) ~ {other} "
+                          f"(r/{index.subreddit_of(other)}): {score:.0%}")
+            seen.add(post_id)
+        print(f"[INFO] Checked {len(index)} stories in {time.perf_counter() - started:.2f}s")
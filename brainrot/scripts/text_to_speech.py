@@ -9,6 +9,11 @@ import shutil
 import subprocess
 import librosa
 
+from alignment import ALIGN_WORKERS, chunked_alignment, heuristic_alignment
+from duration_predictor import compose_voiceover_text, load_predictor
+from onnx_alignment import onnx_alignment, onnx_available
+from script_index import ScriptIndex
+
 
 os.environ["PATH"] = "/opt/homebrew/bin:" + os.environ["PATH"]
 
@@ -19,6 +24,16 @@ AUDIO_DIR = os.path.join(ROOT_DIR, 'data', 'audio')
 MAX_VOICES = 50  # Number of scripts to process per run
 USE_ELEVENLABS = True  # Toggle between ElevenLabs and gTTS
 
+FFMPEG_BIN = "/opt/homebrew/bin/ffmpeg"  # OR whatever `which ffmpeg` gives you
+SPEED_FACTOR = 1.28  # atempo applied to every voiceover
+
+# Word timing: "whisperx" (forced alignment, needs torch), "onnx" (the same model
+# exported to int8 ONNX for CPU, see onnx_alignment.py), "fast" (pauses + syllables,
+# milliseconds, fine for drafts) or "auto" (ONNX if the model has been exported,
+# else WhisperX, falling back to fast when neither is available or both fail)
+ALIGN_MODES = ("whisperx", "onnx", "fast", "auto")
+ALIGN_MODE = os.getenv("ALIGN_MODE", "auto")
+
 # ElevenLabs settings
 ELEVENLABS_VOICE_ID = "pNInz6obpgDQGcFmaJgB"  # 'Adam' voice (default ID for Adam)
 
@@ -60,12 +75,11 @@ def generate_voice_gtts(text, filename):
     except Exception as e:
         print(f"[ERROR] gTTS failed: {e}")
 
-def speed_up_audio(filepath, speed_factor=1.28):
+def speed_up_audio(filepath, speed_factor=SPEED_FACTOR):
     temp_path = filepath.replace(".mp3", "_temp.mp3")
-    ffmpeg_path = "/opt/homebrew/bin/ffmpeg"  # OR whatever `which ffmpeg` gives you
 
     command = [
-        ffmpeg_path,
+        FFMPEG_BIN,
         "-i", filepath,
         "-filter:a", f"atempo={speed_factor}",
         "-y",
@@ -101,15 +115,42 @@ def convert_to_wav(mp3_path: str) -> str:
         return None
 
 
-def make_subtitle_json(audio_path, original_text):
-    """
-    Aligns spoken audio to text using WhisperX and saves word-level timing JSON
-    next to the MP3 file (e.g., 1ehlrdd.json for 1ehlrdd.mp3)
-    """
+# Loading wav2vec2 takes longer than aligning a short, so keep one per device
+_ALIGN_MODELS = {}
+
+def get_align_model(device):
+    import whisperx
+
+    if device not in _ALIGN_MODELS:
+        _ALIGN_MODELS[device] = whisperx.load_align_model(language_code="en", device=device)
+    return _ALIGN_MODELS[device]
+
+def whisperx_alignment(wav_path, original_text):
+    """WhisperX forced alignment of the known text, sentence by sentence (see alignment.py)."""
     import whisperx
     import torch
 
     device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"[INFO] WhisperX aligning using WAV: {wav_path}")
+    # Only the alignment model is needed: the text is already known, so there's
+    # nothing to transcribe
+    align_model, metadata = get_align_model(device)
+
+    def align_segment(segment, samples):
+        return whisperx.align([segment], align_model, metadata, samples, device).get("word_segments", [])
+
+    return chunked_alignment(wav_path, original_text, align_segment,
+                             workers=1 if device == "cuda" else ALIGN_WORKERS)
+
+def make_subtitle_json(audio_path, original_text, mode=None):
+    """
+    Aligns spoken audio to text and saves word-level timing JSON next to the MP3
+    file (e.g., 1ehlrdd.json for 1ehlrdd.mp3). mode is one of ALIGN_MODES.
+    """
+    mode = mode or ALIGN_MODE
+    if mode not in ALIGN_MODES:
+        print(f"[ERROR] Unknown ALIGN_MODE '{mode}', expected one of {', '.join(ALIGN_MODES)}")
+        return False
 
     try:
         # Convert MP3 to clean WAV first
@@ -117,18 +158,27 @@ def make_subtitle_json(audio_path, original_text):
         if not wav_path:
             return False
 
-        print(f"[INFO] WhisperX aligning using WAV: {wav_path}")
-        # Load ASR and alignment models
-        asr_model = whisperx.load_model("large-v3", device=device, compute_type="float32")
-        align_model, metadata = whisperx.load_align_model(language_code="en", device=device)
-
-        # Dummy segmentation to force alignment of full text
-        duration = librosa.get_duration(path=wav_path)
-        segments = [{"text": original_text, "start": 0, "end": duration}]
-        alignment = whisperx.align(segments, align_model, metadata, wav_path, device)
+        word_data = None
+        if mode == "onnx" or (mode == "auto" and onnx_available()):
+            try:
+                word_data = onnx_alignment(wav_path, original_text)
+            except Exception as e:
+                if mode == "onnx":
+                    raise
+                print(f"[WARN] ONNX alignment failed: {e}, falling back to WhisperX")
+        if word_data is None and mode in ("whisperx", "auto"):
+            try:
+                word_data = whisperx_alignment(wav_path, original_text)
+            except Exception as e:
+                if mode == "whisperx":
+                    raise
+                reason = "WhisperX is not installed" if isinstance(e, ImportError) else f"WhisperX failed: {e}"
+                print(f"[WARN] {reason}, falling back to fast alignment")
+        if word_data is None:
+            word_data = heuristic_alignment(wav_path, original_text)
+            print(f"[INFO] Fast-aligned {len(word_data)} word(s)")
 
         # Save word-level timestamp JSON
-        word_data = alignment.get("word_segments", [])
         json_path = audio_path.replace(".mp3", ".json")
         with open(json_path, "w") as f:
             json.dump(word_data, f, indent=2)
@@ -137,73 +187,101 @@ def make_subtitle_json(audio_path, original_text):
         return True
 
     except Exception as e:
-        print(f"[ERROR] WhisperX alignment failed: {e}")
+        print(f"[ERROR] Alignment failed: {e}")
         return False
 
+def current_voice():
+    """Name the duration predictor keeps calibration under."""
+    return ELEVENLABS_VOICE_ID if USE_ELEVENLABS else "gtts"
+
 # ─── Main voiceover generator ────────────────────────────────────────────────────
-def generate_voiceovers():
-    scripts_files = sorted(
-        [f for f in os.listdir(SCRIPTS_DIR) if f.startswith('scripts_') and f.endswith('.json')],
-        reverse=True
-    )
+def generate_voiceovers_for_file(filename, max_voices=MAX_VOICES):
+    """Voices and aligns every script in one scripts_*.json, then moves it to processed/."""
+    input_path = os.path.join(SCRIPTS_DIR, filename)
+    with open(input_path, 'r') as f:
+        scripts = json.load(f)
 
-    if not scripts_files:
-        print("[ERROR] No scripts found to process.")
-        return
+    print(f"\n[Processing] {filename} with {len(scripts)} script(s)...")
+
+    predictor = load_predictor()
+    voice = current_voice()
+
+    count = 0
+    for item in scripts:
+        if count >= max_voices:
+            break
+
+        story = item.get("script", "").strip()
+        title = item.get("title", "").strip()
+        post_id = item.get("id", "unknown")
+        audio_filename = f"{post_id}.mp3"
 
-    # Only process the first available scripts_*.json
-    for filename in scripts_files:
-        if filename.startswith('scripts_') and filename.endswith('.json'):
-            input_path = os.path.join(SCRIPTS_DIR, filename)
-            with open(input_path, 'r') as f:
-                scripts = json.load(f)
+        if not story or not title:
+            print(f"[Skipping] Missing title or script for post {post_id}")
+            continue
 
-            print(f"\n[Processing] {filename} with {len(scripts)} script(s)...")
+        # Combine title + story
+        full_text = compose_voiceover_text(title, story)
 
-            count = 0
-            for item in scripts:
-                if count >= MAX_VOICES:
-                    break
+        # Last check before paying for synthesis: the script may have been edited, or
+        # the voice recalibrated, since generate_script let it through
+        verdict, info = predictor.check(full_text, voice=voice, atempo=SPEED_FACTOR)
+        if verdict != "ok":
+            print(f"[Skipping] {post_id}: predicted {info['seconds']}s (±{info['margin']}s) is too long")
+            continue
 
-                story = item.get("script", "").strip()
-                title = item.get("title", "").strip()
-                post_id = item.get("id", "unknown")
-                audio_filename = f"{post_id}.mp3"
+        if USE_ELEVENLABS:
+            generate_voice_elevenlabs(full_text, audio_filename)
+        else:
+            generate_voice_gtts(full_text, audio_filename)
 
-                if not story or not title:
-                    print(f"[Skipping] Missing title or script for post {post_id}")
-                    continue
+        count += 1
+        speed_up_audio(os.path.join(AUDIO_DIR, audio_filename))
 
-                # Combine title + story
-                full_text = f"{title.strip().rstrip('.')}. {story.strip()}"
+        try:
+            aligned = make_subtitle_json(os.path.join(AUDIO_DIR, audio_filename), full_text)
+        except Exception as e:
+            aligned = False
+            print(f"Booboo {e}")
 
-                if USE_ELEVENLABS:
-                    generate_voice_elevenlabs(full_text, audio_filename)
-                else:
-                    generate_voice_gtts(full_text, audio_filename)
+        if aligned:
+            # Every finished voiceover sharpens the next prediction
+            seconds = librosa.get_duration(path=os.path.join(AUDIO_DIR, audio_filename))
+            print(f"[DURATION] {post_id}: predicted {info['seconds']}s, actual {seconds:.1f}s")
+            predictor.observe(voice, full_text, seconds, SPEED_FACTOR, post_id=post_id)
+            predictor.save()
 
-                count += 1
-                speed_up_audio(os.path.join(AUDIO_DIR, audio_filename))
+        time.sleep(1.5)
 
-                try:
-                    make_subtitle_json(os.path.join(AUDIO_DIR, audio_filename), full_text)
-                except Exception as e:
-                    print(f"Booboo {e}")
+    print(f"\n[Completed] {count} voiceovers generated.\n")
 
-                time.sleep(1.5)
+    # Move processed JSON into /processed/scripts/
+    processed_dir = os.path.join(ROOT_DIR, 'data', 'processed', 'scripts')
+    os.makedirs(processed_dir, exist_ok=True)
 
-            print(f"\n[Completed] {count} voiceovers generated.\n")
+    dest_path = os.path.join(processed_dir, filename)
+    shutil.move(input_path, dest_path)
 
-            # Move processed JSON into /processed/scripts/
-            processed_dir = os.path.join(ROOT_DIR, 'data', 'processed', 'scripts')
-            os.makedirs(processed_dir, exist_ok=True)
+    print(f"[Moved] {filename} to {processed_dir}")
 
-            dest_path = os.path.join(processed_dir, filename)
-            shutil.move(input_path, dest_path)
+    # Keep the uploader's post id index current without a full rescan
+    index = ScriptIndex()
+    index.update_file(dest_path)
+    index.save()
+    return count
 
-            print(f"[Moved] {filename} to {processed_dir}")
+def generate_voiceovers():
+    scripts_files = sorted(
+        [f for f in os.listdir(SCRIPTS_DIR) if f.startswith('scripts_') and f.endswith('.json')],
+        reverse=True
+    )
+
+    if not scripts_files:
+        print("[ERROR] No scripts found to process.")
+        return
 
-            break  # Process only one JSON per run
+    # Process only one JSON per run
+    generate_voiceovers_for_file(scripts_files[0])
 
 if __name__ == "__main__":
     generate_voiceovers()
@@ -0,0 +1,394 @@
+# scripts/worker_daemon.py
+#
+# Long-running alternative to run_pipeline.py. Models, clients, fonts and the
+# title card overlay are loaded once, and each stage reacts to files appearing in
+# the stage before it:
+#
+#   data/posts/posts_*.json      -> script    (generate_script)
+#   data/scripts/scripts_*.json  -> voice     (text_to_speech)
+#   data/audio/<id>.json         -> render    (assemble_video, all three variants)
+#   data/final/{1,2,3}/*.mp4     -> upload    (autoschedule_and_upload, batched)
+#
+# Queue depths and per-stage latencies are served on http://127.0.0.1:8766/status
+# (JSON) and /metrics (plain text).
+
+import os
+import json
+import time
+import queue
+import threading
+import traceback
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import generate_script
+import text_to_speech
+import onnx_alignment
+import assemble_video
+import autoschedule_and_upload as uploader
+from script_index import ScriptIndex
+
+# ─── Settings ──────────────────────────────────────────────────────────────────
+ROOT_DIR = Path(__file__).resolve().parent.parent
+POSTS_DIR = ROOT_DIR / "data" / "posts"
+SCRIPTS_DIR = ROOT_DIR / "data" / "scripts"
+AUDIO_DIR = ROOT_DIR / "data" / "audio"
+FINAL_DIR = ROOT_DIR / "data" / "final"
+VARIANT_DIRS = ["1", "2", "3"]
+
+STATUS_HOST = "127.0.0.1"
+STATUS_PORT = 8766
+POLL_SECONDS = 5               # Only used when inotify isn't available
+UPLOAD_BATCH_SECONDS = 60      # Wait for renders to go quiet before an upload run
+LATENCY_WINDOW = 200           # Recent items kept per stage for percentiles
+
+
+# ─── Stages ────────────────────────────────────────────────────────────────────
+class Stage:
+    """
+    A queue plus worker thread(s) for one pipeline stage. Items already queued or
+    in flight are ignored, so duplicate file events are harmless. With
+    batch_seconds set, the worker waits until no new item has arrived for that
+    long and then hands the whole batch to the handler at once.
+    """
+
+    def __init__(self, name, handler, workers=1, batch_seconds=None):
+        self.name = name
+        self.handler = handler
+        self.batch_seconds = batch_seconds
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = set()
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.threads = [threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+                        for i in range(workers)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def submit(self, item):
+        with self.lock:
+            if item in self.pending:
+                return
+            self.pending.add(item)
+        self.queue.put(item)
+        print(f"[QUEUE] {self.name} ← {item}")
+
+    def _next_batch(self):
+        items = [self.queue.get()]
+        if self.batch_seconds:
+            while True:
+                try:
+                    items.append(self.queue.get(timeout=self.batch_seconds))
+                except queue.Empty:
+                    break
+        return items
+
+    def _work(self):
+        while True:
+            items = self._next_batch()
+            with self.lock:
+                self.in_flight += len(items)
+            started = time.perf_counter()
+            try:
+                if self.batch_seconds:
+                    self.handler(items)
+                else:
+                    self.handler(items[0])
+                elapsed = time.perf_counter() - started
+                with self.lock:
+                    self.processed += len(items)
+                    self.latencies.append(elapsed)
+                print(f"[DONE] {self.name} {items[0] if len(items) == 1 else f'{len(items)} items'} in {elapsed:.1f}s")
+            except Exception as e:
+                with self.lock:
+                    self.failed += len(items)
+                    self.last_error = f"{type(e).__name__}: {e}"
+                print(f"[ERROR] {self.name} failed on {items}: {e}")
+                traceback.print_exc()
+            finally:
+                with self.lock:
+                    self.in_flight -= len(items)
+                    for item in items:
+                        self.pending.discard(item)
+
+    def status(self):
+        with self.lock:
+            ordered = sorted(self.latencies)
+            return {
+                "queued": self.queue.qsize(),
+                "in_flight": self.in_flight,
+                "processed": self.processed,
+                "failed": self.failed,
+                "last_error": self.last_error,
+                "latency_s": {
+                    "p50": _percentile(ordered, 0.50),
+                    "p90": _percentile(ordered, 0.90),
+                    "max": round(ordered[-1], 3) if ordered else None,
+                },
+            }
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+# ─── Directory watching ────────────────────────────────────────────────────────
+class DirectoryWatcher:
+    """
+    Calls on_file(path) once a file in one of `directories` has been fully written
+    or moved in. Uses inotify (pip install inotify_simple) when available, and
+    otherwise falls back to polling for files whose size has stopped changing.
+    """
+
+    def __init__(self, directories, on_file, poll_seconds=POLL_SECONDS):
+        self.directories = [Path(d) for d in directories]
+        self.on_file = on_file
+        self.poll_seconds = poll_seconds
+        for directory in self.directories:
+            directory.mkdir(parents=True, exist_ok=True)
+
+    def run(self):
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            print(f"[WARN] inotify_simple not installed, polling every {self.poll_seconds}s instead")
+            return self._poll()
+        return self._inotify(INotify, flags)
+
+    def _inotify(self, INotify, flags):
+        inotify = INotify()
+        watches = {}
+        for directory in self.directories:
+            watches[inotify.add_watch(str(directory), flags.CLOSE_WRITE | flags.MOVED_TO)] = directory
+        print(f"[INFO] Watching {len(watches)} directories with inotify")
+        while True:
+            for event in inotify.read(timeout=1000):
+                directory = watches.get(event.wd)
+                if directory is not None and event.name:
+                    self._dispatch(directory / event.name)
+
+    def _poll(self):
+        seen = {}
+        first_pass = True
+        while True:
+            sizes = {}
+            for directory in self.directories:
+                for entry in os.scandir(directory):
+                    if entry.is_file():
+                        sizes[Path(entry.path)] = entry.stat().st_size
+            for path, size in sizes.items():
+                previous = seen.get(path)
+                # Report a file once its size held still for a whole poll
+                if not first_pass and previous is not None and previous[0] == size and not previous[1]:
+                    self._dispatch(path)
+                    sizes[path] = size
+                    seen[path] = (size, True)
+                elif previous is None or previous[0] != size:
+                    seen[path] = (size, first_pass)
+            for path in list(seen):
+                if path not in sizes:
+                    del seen[path]
+            first_pass = False
+            time.sleep(self.poll_seconds)
+
+    def _dispatch(self, path):
+        try:
+            self.on_file(path)
+        except Exception as e:
+            print(f"[ERROR] Could not route {path}: {e}")
+
+
+# ─── Daemon ────────────────────────────────────────────────────────────────────
+class WorkerDaemon:
+    def __init__(self, scrape_every_hours=None):
+        self.started = time.time()
+        self.scrape_every_hours = scrape_every_hours
+        self.script_index = ScriptIndex().refresh()
+        self.reddit = None
+        self.stages = {
+            "script": Stage("script", self.handle_posts_file),
+            "voice": Stage("voice", self.handle_scripts_file),
+            "render": Stage("render", self.handle_aligned_audio),
+            "upload": Stage("upload", self.handle_final_videos, batch_seconds=UPLOAD_BATCH_SECONDS),
+        }
+
+    # ─── Warm resources ────────────────────────────────────────────────────────
+    def warm_up(self):
+        started = time.perf_counter()
+        mode = text_to_speech.ALIGN_MODE
+        if mode == "onnx" or (mode == "auto" and onnx_alignment.onnx_available()):
+            try:
+                aligner = onnx_alignment.get_onnx_aligner()
+                print(f"[WARM] ONNX align model ({aligner.name}, {onnx_alignment.ONNX_THREADS} thread(s))")
+            except Exception as e:
+                print(f"[WARN] Could not load ONNX align model: {e}")
+        elif mode != "fast":
+            try:
+                import torch
+                device = "cuda" if torch.cuda.is_available() else "cpu"
+                text_to_speech.get_align_model(device)
+                print(f"[WARM] WhisperX align model ({device})")
+            except ImportError:
+                if text_to_speech.ALIGN_MODE == "whisperx":
+                    print("[WARN] WhisperX not installed, alignment will fail until it is")
+                else:
+                    print("[INFO] WhisperX not installed, using fast alignment")
+        # Same (path, size) keys assemble_video asks for, so the lru_cache hits
+        for font_path, size in [(str(assemble_video.SYSTEM_ARIAL), 120),
+                                (assemble_video.TITLE_FONT_BOLD, 48), (assemble_video.TITLE_FONT_REGULAR, 32)]:
+            try:
+                assemble_video.load_font(font_path, size)
+            except OSError as e:
+                print(f"[WARN] Could not preload font {font_path}: {e}")
+        overlay = os.path.join(ROOT_DIR, "data", "overlay", "imessage_popup.png")
+        if os.path.exists(overlay):
+            # Backgrounds are 1080 wide; the title card is 80% of that
+            assemble_video.load_overlay(overlay, int(1080 * 0.8))
+        if self.scrape_every_hours:
+            import scrape_reddit
+            self.reddit = scrape_reddit.get_reddit_client()
+            print("[WARM] Reddit client")
+        print(f"[WARM] Ready in {time.perf_counter() - started:.1f}s")
+
+    # ─── Handlers ──────────────────────────────────────────────────────────────
+    def handle_posts_file(self, name):
+        generate_script.generate_scripts_from_file(name)
+
+    def handle_scripts_file(self, name):
+        text_to_speech.generate_voiceovers_for_file(name)
+        self.script_index.refresh()
+
+    def find_script_entry(self, post_id):
+        entry = self.script_index.get(post_id) or self.script_index.refresh().get(post_id)
+        if entry:
+            return entry
+        # Alignment finishes per item, before its scripts file is moved to processed/
+        for script_file in SCRIPTS_DIR.glob("scripts_*.json"):
+            with open(script_file) as f:
+                for candidate in json.load(f):
+                    if candidate.get("id") == post_id:
+                        return candidate
+        return None
+
+    def handle_aligned_audio(self, post_id):
+        entry = self.find_script_entry(post_id)
+        if not entry:
+            raise LookupError(f"No script entry for {post_id}")
+        assemble_video.render_variants(entry, str(FINAL_DIR))
+
+    def handle_final_videos(self, names):
+        print(f"[INFO] Upload run for {len(names)} new video(s)")
+        uploader.schedule_and_upload()
+
+    # ─── Routing ───────────────────────────────────────────────────────────────
+    def route(self, path):
+        path = Path(path)
+        parent = path.parent
+        if parent == POSTS_DIR and path.name.startswith("posts_") and path.suffix == ".json":
+            self.stages["script"].submit(path.name)
+        elif parent == SCRIPTS_DIR and path.name.startswith("scripts_") and path.suffix == ".json":
+            self.stages["voice"].submit(path.name)
+        elif parent == AUDIO_DIR and path.suffix == ".json":
+            self.stages["render"].submit(path.stem)
+        elif parent.parent == FINAL_DIR and parent.name in VARIANT_DIRS and path.suffix == ".mp4":
+            self.stages["upload"].submit(path.name)
+
+    def catch_up(self):
+        """
+        Queues work that is unambiguously pending from before the daemon started:
+        unvoiced scripts files and rendered videos that were never scheduled. Old
+        posts and audio are left alone, since they may already have been used.
+        """
+        for script_file in sorted(SCRIPTS_DIR.glob("scripts_*.json")):
+            self.route(script_file)
+        store = uploader.load_schedule_store()
+        for variant in VARIANT_DIRS:
+            for video in sorted((FINAL_DIR / variant).glob("*.mp4")):
+                if not store.is_scheduled(video.name):
+                    self.route(video)
+
+    def scrape_loop(self):
+        import scrape_reddit
+        while True:
+            try:
+                scrape_reddit.scrape_posts(self.reddit)
+            except Exception as e:
+                print(f"[ERROR] Scrape failed: {e}")
+            time.sleep(self.scrape_every_hours * 3600)
+
+    # ─── Status ────────────────────────────────────────────────────────────────
+    def status(self):
+        return {
+            "uptime_s": round(time.time() - self.started),
+            "stages": {name: stage.status() for name, stage in self.stages.items()},
+        }
+
+    def serve_status(self, host=STATUS_HOST, port=STATUS_PORT):
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                status = daemon.status()
+                if self.path.startswith("/metrics"):
+                    lines = [f"autotube_uptime_seconds {status['uptime_s']}"]
+                    for name, s in status["stages"].items():
+                        for key in ("queued", "in_flight", "processed", "failed"):
+                            lines.append(f'autotube_stage_{key}{{stage="{name}"}} {s[key]}')
+                        for q, value in s["latency_s"].items():
+                            if value is not None:
+                                lines.append(f'autotube_stage_latency_seconds{{stage="{name}",q="{q}"}} {value}')
+                    body, content_type = ("\n".join(lines) + "\n").encode(), "text/plain"
+                elif self.path.startswith("/status") or self.path == "/":
+                    body, content_type = json.dumps(status, indent=2).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), StatusHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[INFO] Status on http://{host}:{port}/status")
+        return server
+
+    def run(self, port=STATUS_PORT):
+        self.warm_up()
+        for stage in self.stages.values():
+            stage.start()
+        self.serve_status(port=port)
+        if self.scrape_every_hours:
+            threading.Thread(target=self.scrape_loop, daemon=True).start()
+        self.catch_up()
+        watched = [POSTS_DIR, SCRIPTS_DIR, AUDIO_DIR, *[FINAL_DIR / v for v in VARIANT_DIRS]]
+        DirectoryWatcher(watched, self.route).run()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Warm pipeline worker that reacts to new files")
+    parser.add_argument("--port", type=int, default=STATUS_PORT, help="status/metrics port")
+    parser.add_argument("--scrape-every", type=float, default=None, metavar="HOURS",
+                        help="also scrape Reddit on this interval")
+    args = parser.parse_args()
+
+    try:
+        WorkerDaemon(scrape_every_hours=args.scrape_every).run(port=args.port)
+    except KeyboardInterrupt:
+        print("\n[INFO] Worker daemon stopped.")
@@ -0,0 +1,238 @@
+# scripts/youtube_standin.py
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# ─── Defaults ──────────────────────────────────────────────────────────────────
+HOST = "127.0.0.1"
+PORT = 8765
+UPLOAD_PATH = "/upload/youtube/v3/videos"
+READ_BLOCK = 64 * 1024
+
+
+class TokenBucket:
+    """Shared uplink cap: every connection draws from the same bytes/sec budget."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.lock = threading.Lock()
+        self.available = 0.0
+        self.updated = time.monotonic()
+
+    def consume(self, n):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            # Burst is capped at one read block so idle time can't be banked
+            self.available = min(READ_BLOCK, self.available + (now - self.updated) * self.rate) - n
+            self.updated = now
+            wait = -self.available / self.rate if self.available < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class YouTubeStandIn(ThreadingHTTPServer):
+    """
+    Local stand-in for the resumable videos.insert protocol.
+
+    POST  /upload/youtube/v3/videos?uploadType=resumable   -> 200 + Location (session URI)
+    PUT   <session>  Content-Range: bytes a-b/total       -> 308 + Range, or 200 + video resource
+    PUT   <session>  Content-Range: bytes */total         -> status query, same replies
+
+    latency         seconds added to every request
+    bandwidth       total upload bytes/sec across all connections (0 = unlimited)
+    failure_rate    chance a chunk PUT fails with 503 after reading part of the body
+    session_ttl     seconds a session stays valid before 404 (0 = forever)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host=HOST, port=PORT, latency=0.0, bandwidth=0, failure_rate=0.0, session_ttl=0, seed=None):
+        super().__init__((host, port), _Handler)
+        self.latency = latency
+        self.bucket = TokenBucket(bandwidth)
+        self.failure_rate = failure_rate
+        self.session_ttl = session_ttl
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sessions = {}      # upload id -> {"received": int, "total": int|None, "metadata": dict, ...}
+        self.stats = {"sessions": 0, "completed": 0, "chunks": 0, "status_queries": 0,
+                      "injected_failures": 0, "bytes_received": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, n=1):
+        with self.lock:
+            self.stats[key] += n
+
+    def should_fail(self):
+        with self.lock:
+            return self.failure_rate > 0 and self.random.random() < self.failure_rate
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if payload:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _error(self, status, reason):
+        self._reply(status, {"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}})
+
+    def _read_body(self, length, limit=None):
+        """Reads the request body through the bandwidth cap, keeping at most `limit` bytes."""
+        kept = bytearray()
+        remaining = length
+        while remaining > 0:
+            block = self.rfile.read(min(READ_BLOCK, remaining))
+            if not block:
+                break
+            self.server.bucket.consume(len(block))
+            remaining -= len(block)
+            if limit is None or len(kept) < limit:
+                kept.extend(block[:None if limit is None else limit - len(kept)])
+        return bytes(kept)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self._read_body(length)
+
+        if url.path != UPLOAD_PATH or query.get("uploadType") != ["resumable"]:
+            return self._error(400, "badRequest")
+
+        upload_id = uuid.uuid4().hex
+        total = self.headers.get("X-Upload-Content-Length")
+        with self.server.lock:
+            self.server.sessions[upload_id] = {
+                "received": 0,
+                "total": int(total) if total else None,
+                "metadata": json.loads(body or b"{}"),
+                "created": time.monotonic(),
+            }
+        self.server.count("sessions")
+        location = f"{self.server.url}{UPLOAD_PATH}?uploadType=resumable&upload_id={upload_id}"
+        self._reply(200, headers={"Location": location})
+
+    def do_PUT(self):
+        time.sleep(self.server.latency)
+        query = parse_qs(urlsplit(self.path).query)
+        upload_id = (query.get("upload_id") or [None])[0]
+        length = int(self.headers.get("Content-Length") or 0)
+
+        with self.server.lock:
+            session = self.server.sessions.get(upload_id)
+        expired = session and self.server.session_ttl and \
+            time.monotonic() - session["created"] > self.server.session_ttl
+        if not session or expired:
+            self._read_body(length)
+            return self._error(404, "notFound")
+
+        content_range = self.headers.get("Content-Range", "")
+        unit, _, spec = content_range.partition(" ")
+        span, _, total = spec.partition("/")
+        if unit != "bytes" or not total:
+            self._read_body(length)
+            return self._error(400, "badContentRange")
+        if total != "*":
+            session["total"] = int(total)
+
+        if span == "*":
+            # Status query: report what we have
+            self.server.count("status_queries")
+            self._read_body(length)
+            return self._progress(upload_id, session)
+
+        start, _, end = span.partition("-")
+        start, end = int(start), int(end)
+        if start > session["received"]:
+            self._read_body(length)
+            return self._error(400, "badContentRange")
+
+        self.server.count("chunks")
+        if self.server.should_fail():
+            # Keep only part of the chunk, like a connection dropping mid-transfer
+            kept = self._read_body(length, limit=length // 2)
+            self._accept(session, start, len(kept))
+            self.server.count("injected_failures")
+            return self._error(503, "backendError")
+
+        data = self._read_body(length)
+        self._accept(session, start, len(data))
+        if end + 1 != start + len(data):
+            return self._error(400, "badContentRange")
+        self._progress(upload_id, session)
+
+    def _accept(self, session, start, n):
+        with self.server.lock:
+            # Overlapping bytes the client re-sent after a failure don't count twice
+            session["received"] = max(session["received"], start + n)
+            self.server.stats["bytes_received"] += n
+
+    def _progress(self, upload_id, session):
+        if session["total"] is not None and session["received"] >= session["total"]:
+            with self.server.lock:
+                first = not session.get("done")
+                session["done"] = True
+            if first:
+                self.server.count("completed")
+            metadata = session["metadata"]
+            return self._reply(200, {
+                "kind": "youtube#video",
+                "id": upload_id[:11],
+                "snippet": metadata.get("snippet", {}),
+                "status": {**metadata.get("status", {}), "uploadStatus": "uploaded"},
+            })
+        headers = {"Range": f"bytes=0-{session['received'] - 1}"} if session["received"] else {}
+        self._reply(308, headers=headers)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local stand-in for YouTube resumable uploads")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="upload cap in bytes/sec (0 = unlimited)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="chance a chunk fails with 503")
+    args = parser.parse_args()
+
+    server = YouTubeStandIn(port=args.port, latency=args.latency, bandwidth=args.bandwidth,
+                            failure_rate=args.failure_rate)
+    print(f"[INFO] YouTube stand-in listening on {server.url}")
+    print(f"[INFO] Point the uploader at it with YOUTUBE_UPLOAD_ENDPOINT={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass